@@ -1,8 +1,25 @@
-from math import log, sqrt, exp
+import numpy
+from math import log, sqrt, exp, ceil, floor
 from scipy.stats import norm
-from model import Model, ModelType
+from scipy.special import ndtr, log_ndtr, exprel
+from model import Model, ModelType, TreeMethod, AmericanApproximation
 from option_enum import OptionType, PutOrCall, BarrierTypeInOrOut, BarrierTypeUpOrDown
 from option import Option
+from util import enum_mask, GridResult, GreeksResult, bivariate_normal_cdf
+
+
+# Lattice nodes (time steps x options) priced at once by gbm_binomial_tree_batch, sized so a chunk stays in cache
+_TREE_BATCH_CHUNK_NODES = 2 ** 16
+
+# Newton iteration cap and relative tolerance for the Barone-Adesi-Whaley critical prices
+_BAW_MAX_ITERATIONS = 50
+_BAW_TOLERANCE = 1e-8
+
+# Bjerksund-Stensland (2002) splits each option life at t1 = _BS2002_SPLIT * T (the golden section)
+_BS2002_SPLIT = (sqrt(5.0) - 1) / 2
+
+# barrier_trinomial_tree refines its time steps at most this many times over to put a node layer on a near barrier
+_BARRIER_TREE_MAX_REFINEMENT = 4
 
 
 # Black-Scholes-Merton formula for a European option
@@ -37,13 +54,451 @@ def euro_black_scholes_merton(model: Model, option: Option):
     return final_option_price
 
 
+# Black-Scholes-Merton formula for arrays of European options, priced in one vectorized pass
+# Inputs are array-likes (or scalars) that broadcast against each other
+# put_or_call holds PutOrCall members or their values (so a boolean array of "is call" also works)
+def euro_black_scholes_merton_batch(spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, sigma, put_or_call):
+    spot_price = numpy.asarray(spot_price, dtype=float)
+    strike = numpy.asarray(strike, dtype=float)
+    time_to_expiration = numpy.asarray(time_to_expiration, dtype=float)
+    risk_free_rate = numpy.asarray(risk_free_rate, dtype=float)
+    yield_rate = numpy.asarray(yield_rate, dtype=float)
+    sigma = numpy.asarray(sigma, dtype=float)
+    is_call = enum_mask(put_or_call, PutOrCall.CALL)
+    assert numpy.all(spot_price > 0), 'Error: in euro_black_scholes_merton_batch, spot_price should be positive.'
+    assert numpy.all(strike > 0), 'Error: in euro_black_scholes_merton_batch, strike should be positive.'
+
+    # phi is +1 for calls and -1 for puts, so both share one formula
+    phi = numpy.where(is_call, 1.0, -1.0)
+    sig_sqrt_t = sigma * numpy.sqrt(time_to_expiration)
+    d1 = numpy.log(spot_price/strike) + (risk_free_rate-yield_rate+sigma*sigma/2)*time_to_expiration
+    d1 /= sig_sqrt_t
+    d2 = d1 - sig_sqrt_t
+
+    spot_term = spot_price * numpy.exp(-yield_rate*time_to_expiration) * ndtr(phi*d1)
+    strike_term = strike * numpy.exp(-risk_free_rate*time_to_expiration) * ndtr(phi*d2)
+    final_option_prices = phi * (spot_term - strike_term)
+
+    return final_option_prices
+
+
+# Black-Scholes-Merton price and Greeks for a European option
+def euro_black_scholes_merton_greeks(model: Model, option: Option):
+    model_type = model.model_type
+    assert model_type == ModelType.GBM, f'Error: in euro_black_scholes_merton_greeks, model_type={model_type} should be ModelType.GBM.'
+
+    greeks = euro_black_scholes_merton_greeks_batch(option.spot_value, option.strike, option.time_to_expiration,
+        model.risk_free_rate, model.yield_rate, model.sigma, option.put_or_call)
+
+    return _greeks_to_float(greeks)
+
+
+# Black-Scholes-Merton price and Greeks for arrays of European options, in one vectorized pass
+# Inputs broadcast as in euro_black_scholes_merton_batch; d1, d2 and the discounted spot and strike terms are
+#   shared by the price and every Greek
+def euro_black_scholes_merton_greeks_batch(spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, sigma, put_or_call):
+    spot_price = numpy.asarray(spot_price, dtype=float)
+    strike = numpy.asarray(strike, dtype=float)
+    time_to_expiration = numpy.asarray(time_to_expiration, dtype=float)
+    risk_free_rate = numpy.asarray(risk_free_rate, dtype=float)
+    yield_rate = numpy.asarray(yield_rate, dtype=float)
+    sigma = numpy.asarray(sigma, dtype=float)
+    is_call = enum_mask(put_or_call, PutOrCall.CALL)
+    assert numpy.all(spot_price > 0), 'Error: in euro_black_scholes_merton_greeks_batch, spot_price should be positive.'
+    assert numpy.all(strike > 0), 'Error: in euro_black_scholes_merton_greeks_batch, strike should be positive.'
+
+    phi = numpy.where(is_call, 1.0, -1.0)
+    sqrt_t = numpy.sqrt(time_to_expiration)
+    sig_sqrt_t = sigma * sqrt_t
+    d1 = numpy.log(spot_price/strike) + (risk_free_rate-yield_rate+sigma*sigma/2)*time_to_expiration
+    d1 /= sig_sqrt_t
+    d2 = d1 - sig_sqrt_t
+
+    spot_term = spot_price * numpy.exp(-yield_rate*time_to_expiration)
+    strike_term = strike * numpy.exp(-risk_free_rate*time_to_expiration)
+    spot_cdf = phi * ndtr(phi*d1)
+    strike_cdf = phi * ndtr(phi*d2)
+    spot_pdf = spot_term * norm.pdf(d1)
+
+    price = spot_term*spot_cdf - strike_term*strike_cdf
+    delta = spot_term/spot_price * spot_cdf
+    gamma = spot_pdf / (spot_price*spot_price*sig_sqrt_t)
+    vega = spot_pdf * sqrt_t
+    theta = -spot_pdf*sigma/(2*sqrt_t) + yield_rate*spot_term*spot_cdf - risk_free_rate*strike_term*strike_cdf
+    rho = time_to_expiration * strike_term * strike_cdf
+    dividend_rho = -time_to_expiration * spot_term * spot_cdf
+
+    return GreeksResult(price, delta, gamma, vega, theta, rho, dividend_rho)
+
+
+# GreeksResult of Python floats, for the single-option wrappers
+def _greeks_to_float(greeks: GreeksResult):
+    return GreeksResult(*(float(value) for value in (greeks.price, greeks.delta, greeks.gamma, greeks.vega,
+        greeks.theta, greeks.rho, greeks.dividend_rho)))
+
+
+# Closed-form approximation of an American option, for screens that need prices much faster than a lattice
+# model.american_approximation selects Bjerksund-Stensland (2002) or Barone-Adesi-Whaley (1987)
+def american_closed_form(model: Model, option: Option):
+    american_approximation = model.american_approximation
+    if american_approximation == AmericanApproximation.BARONE_ADESI_WHALEY:
+        return american_barone_adesi_whaley(model, option)
+    assert american_approximation == AmericanApproximation.BJERKSUND_STENSLAND, \
+        f'Error: in american_closed_form, american_approximation={american_approximation} is not supported.'
+    return american_bjerksund_stensland(model, option)
+
+
+# Bjerksund-Stensland (2002) approximation for an American option
+def american_bjerksund_stensland(model: Model, option: Option):
+    model_type = model.model_type
+    assert model_type == ModelType.GBM, f'Error: in american_bjerksund_stensland, model_type={model_type} should be ModelType.GBM.'
+
+    final_option_price = american_bjerksund_stensland_batch(option.spot_value, option.strike, option.time_to_expiration,
+        model.risk_free_rate, model.yield_rate, model.sigma, option.put_or_call)
+
+    return float(final_option_price)
+
+
+# Bjerksund-Stensland (2002) approximation for arrays of American options, priced in one vectorized pass
+# Inputs broadcast as in euro_black_scholes_merton_batch
+# The exercise boundary is flat on each of two sub-periods split at t1 = _BS2002_SPLIT * T; puts are priced as calls
+#   through the put-call transformation P(S, K, r, q) = C(K, S, q, r)
+def american_bjerksund_stensland_batch(spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, sigma, put_or_call):
+    spot_price = numpy.asarray(spot_price, dtype=float)
+    strike = numpy.asarray(strike, dtype=float)
+    time_to_expiration = numpy.asarray(time_to_expiration, dtype=float)
+    risk_free_rate = numpy.asarray(risk_free_rate, dtype=float)
+    yield_rate = numpy.asarray(yield_rate, dtype=float)
+    sigma = numpy.asarray(sigma, dtype=float)
+    is_call = enum_mask(put_or_call, PutOrCall.CALL)
+    assert numpy.all(spot_price > 0), 'Error: in american_bjerksund_stensland_batch, spot_price should be positive.'
+    assert numpy.all(strike > 0), 'Error: in american_bjerksund_stensland_batch, strike should be positive.'
+    assert numpy.all(time_to_expiration > 0), 'Error: in american_bjerksund_stensland_batch, time_to_expiration should be positive.'
+
+    call_spot = numpy.where(is_call, spot_price, strike)
+    call_strike = numpy.where(is_call, strike, spot_price)
+    call_rate = numpy.where(is_call, risk_free_rate, yield_rate)
+    call_yield = numpy.where(is_call, yield_rate, risk_free_rate)
+    call_spot, call_strike, time_to_expiration, call_rate, call_yield, sigma = numpy.broadcast_arrays(
+        call_spot, call_strike, time_to_expiration, call_rate, call_yield, sigma)
+    european_prices = numpy.asarray(euro_black_scholes_merton_batch(call_spot, call_strike, time_to_expiration, call_rate, call_yield, sigma, True))
+
+    # A call on a non-positive yield is never exercised early (and the formula divides by the yield)
+    # Otherwise the formula values one exercise policy, as do holding to expiration and exercising now, so the
+    #   largest of the three is the best lower bound (the flat boundaries can be poor at long, high-volatility terms)
+    american = call_yield > 0
+    final_option_prices = european_prices.copy()
+    final_option_prices[american] = numpy.maximum(_bjerksund_stensland_call(call_spot[american], call_strike[american],
+        time_to_expiration[american], call_rate[american], call_yield[american], sigma[american]),
+        numpy.maximum(european_prices[american], call_spot[american] - call_strike[american]))
+
+    return final_option_prices[()]
+
+
+# Bjerksund-Stensland (2002) call price with cost of carry b = r - q, for a positive yield q
+def _bjerksund_stensland_call(spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, sigma):
+    carry = risk_free_rate - yield_rate
+    variance = sigma * sigma
+    t1 = _BS2002_SPLIT * time_to_expiration
+    beta = 0.5 - carry/variance + numpy.sqrt((carry/variance - 0.5)**2 + 2*risk_free_rate/variance)
+    boundary_zero = numpy.maximum(strike, risk_free_rate / yield_rate * strike)
+    boundary_infinity = numpy.maximum(beta / (beta - 1) * strike, boundary_zero)
+
+    # Flat exercise boundaries I1 on [0, t1] and I2 on [t1, T], kept between the boundaries at expiration and at
+    #   infinite maturity (at low volatility with a negative carry the formula for h turns positive, and it
+    #   degenerates when the two boundaries round together)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        boundary_scale = strike * strike / ((boundary_infinity - boundary_zero) * boundary_zero)
+        h1 = numpy.fmin(-(carry*t1 + 2*sigma*numpy.sqrt(t1)) * boundary_scale, 0)
+        h2 = numpy.fmin(-(carry*time_to_expiration + 2*sigma*numpy.sqrt(time_to_expiration)) * boundary_scale, 0)
+    i1 = boundary_zero - (boundary_infinity - boundary_zero) * numpy.expm1(h1)
+    i2 = boundary_zero - (boundary_infinity - boundary_zero) * numpy.expm1(h2)
+
+    # alpha * S^beta terms are carried as (I - K) * (S/I)^beta, since S^beta alone overflows at low volatility
+    log_i1 = numpy.log(i1)
+    log_i2 = numpy.log(i2)
+    rates = (risk_free_rate, carry, sigma)
+    phi = lambda gamma, h, i, log_scale=0.0: _bjerksund_stensland_phi(spot_price, t1, gamma, h, i, *rates, log_scale)
+    psi = lambda gamma, h, log_scale=0.0: _bjerksund_stensland_psi(spot_price, time_to_expiration, gamma, h, i2, i1, t1, *rates, log_scale)
+    # Contracts already past I2 are exercised, and their (discarded) terms may overflow
+    with numpy.errstate(over='ignore', invalid='ignore'):
+        call_prices = (i2 - strike) * (numpy.exp(beta*(numpy.log(spot_price) - log_i2)) - phi(beta, i2, i2, log_i2)) \
+            + phi(1, i2, i2) - phi(1, i1, i2) - strike * phi(0, i2, i2) + strike * phi(0, i1, i2) \
+            + (i1 - strike) * (phi(beta, i1, i2, log_i1) - psi(beta, i1, log_i1)) \
+            + psi(1, i1) - psi(1, strike) - strike * psi(0, i1) + strike * psi(0, strike)
+
+    return numpy.where(spot_price >= i2, spot_price - strike, call_prices)
+
+
+# The phi function of Bjerksund-Stensland: value of (S/e^log_scale)^gamma paid at time_to_expiration if S ends
+#   below h, knocked out when S reaches the flat barrier i
+# Each term is summed in log space, as the powers and the normal tails can each be far out of range on their own
+def _bjerksund_stensland_phi(spot_price, time_to_expiration, gamma, h, i, risk_free_rate, carry, sigma, log_scale=0.0):
+    variance = sigma * sigma
+    sig_sqrt_t = sigma * numpy.sqrt(time_to_expiration)
+    growth = (-risk_free_rate + gamma*carry + gamma*(gamma-1)*variance/2) * time_to_expiration
+    kappa = 2*carry/variance + 2*gamma - 1
+    d = (numpy.log(spot_price/h) + (carry + (gamma-0.5)*variance)*time_to_expiration) / sig_sqrt_t
+    log_ratio = numpy.log(i/spot_price)
+    log_weight = growth + gamma*(numpy.log(spot_price) - log_scale)
+
+    return numpy.exp(log_weight + log_ndtr(-d)) - numpy.exp(log_weight + kappa*log_ratio + log_ndtr(-d - 2*log_ratio/sig_sqrt_t))
+
+
+# The psi function of Bjerksund-Stensland: the two-period analogue of phi, with barrier i2 until t1 and i1 after
+def _bjerksund_stensland_psi(spot_price, time_to_expiration, gamma, h, i2, i1, t1, risk_free_rate, carry, sigma, log_scale=0.0):
+    variance = sigma * sigma
+    drift = carry + (gamma-0.5)*variance
+    sig_sqrt_t1 = sigma * numpy.sqrt(t1)
+    sig_sqrt_t = sigma * numpy.sqrt(time_to_expiration)
+    growth = (-risk_free_rate + gamma*carry + gamma*(gamma-1)*variance/2) * time_to_expiration
+    kappa = 2*carry/variance + 2*gamma - 1
+    rho = sqrt(_BS2002_SPLIT)  # t1/T is the same for every contract, so one scalar correlation
+    log_weight = growth + gamma*(numpy.log(spot_price) - log_scale)
+
+    e1 = (numpy.log(spot_price/i1) + drift*t1) / sig_sqrt_t1
+    e2 = (numpy.log(i2*i2/(spot_price*i1)) + drift*t1) / sig_sqrt_t1
+    e3 = (numpy.log(spot_price/i1) - drift*t1) / sig_sqrt_t1
+    e4 = (numpy.log(i2*i2/(spot_price*i1)) - drift*t1) / sig_sqrt_t1
+    f1 = (numpy.log(spot_price/h) + drift*time_to_expiration) / sig_sqrt_t
+    f2 = (numpy.log(i2*i2/(spot_price*h)) + drift*time_to_expiration) / sig_sqrt_t
+    f3 = (numpy.log(i1*i1/(spot_price*h)) + drift*time_to_expiration) / sig_sqrt_t
+    f4 = (numpy.log(spot_price*i1*i1/(h*i2*i2)) + drift*time_to_expiration) / sig_sqrt_t
+
+    # A bivariate probability that rounds to zero zeroes its term (log of zero is -inf)
+    with numpy.errstate(divide='ignore'):
+        log_m1 = numpy.log(numpy.maximum(bivariate_normal_cdf(-e1, -f1, rho), 0))
+        log_m2 = numpy.log(numpy.maximum(bivariate_normal_cdf(-e2, -f2, rho), 0))
+        log_m3 = numpy.log(numpy.maximum(bivariate_normal_cdf(-e3, -f3, -rho), 0))
+        log_m4 = numpy.log(numpy.maximum(bivariate_normal_cdf(-e4, -f4, -rho), 0))
+
+    return numpy.exp(log_weight + log_m1) - numpy.exp(log_weight + kappa*numpy.log(i2/spot_price) + log_m2) \
+        - numpy.exp(log_weight + kappa*numpy.log(i1/spot_price) + log_m3) + numpy.exp(log_weight + kappa*numpy.log(i1/i2) + log_m4)
+
+
+# Barone-Adesi-Whaley (1987) quadratic approximation for an American option
+def american_barone_adesi_whaley(model: Model, option: Option):
+    model_type = model.model_type
+    assert model_type == ModelType.GBM, f'Error: in american_barone_adesi_whaley, model_type={model_type} should be ModelType.GBM.'
+
+    final_option_price = american_barone_adesi_whaley_batch(option.spot_value, option.strike, option.time_to_expiration,
+        model.risk_free_rate, model.yield_rate, model.sigma, option.put_or_call)
+
+    return float(final_option_price)
+
+
+# Barone-Adesi-Whaley (1987) quadratic approximation for arrays of American options, priced in one vectorized pass
+# Inputs broadcast as in euro_black_scholes_merton_batch
+# The critical prices are found together by Newton iterations from the Barone-Adesi-Whaley seed, stopping once
+#   every contract has converged
+def american_barone_adesi_whaley_batch(spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, sigma, put_or_call):
+    spot_price = numpy.asarray(spot_price, dtype=float)
+    strike = numpy.asarray(strike, dtype=float)
+    time_to_expiration = numpy.asarray(time_to_expiration, dtype=float)
+    risk_free_rate = numpy.asarray(risk_free_rate, dtype=float)
+    yield_rate = numpy.asarray(yield_rate, dtype=float)
+    sigma = numpy.asarray(sigma, dtype=float)
+    is_call = enum_mask(put_or_call, PutOrCall.CALL)
+    assert numpy.all(spot_price > 0), 'Error: in american_barone_adesi_whaley_batch, spot_price should be positive.'
+    assert numpy.all(strike > 0), 'Error: in american_barone_adesi_whaley_batch, strike should be positive.'
+    assert numpy.all(time_to_expiration > 0), 'Error: in american_barone_adesi_whaley_batch, time_to_expiration should be positive.'
+
+    spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, sigma, is_call = numpy.broadcast_arrays(
+        spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, sigma, is_call)
+    european_prices = numpy.asarray(euro_black_scholes_merton_batch(spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, sigma, is_call))
+
+    # Calls on a non-positive yield and puts at a non-positive rate are never exercised early
+    european = numpy.where(is_call, yield_rate <= 0, risk_free_rate <= 0)
+    if numpy.all(european):
+        return european_prices
+    american = ~european
+    spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, sigma, is_call = (
+        array[american] for array in (spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, sigma, is_call))
+
+    phi = numpy.where(is_call, 1.0, -1.0)
+    variance = sigma * sigma
+    sig_sqrt_t = sigma * numpy.sqrt(time_to_expiration)
+    yield_discount = numpy.exp(-yield_rate*time_to_expiration)
+    n = 2*(risk_free_rate - yield_rate)/variance
+    m = 2*risk_free_rate/variance
+    k = 2 / (variance*time_to_expiration*exprel(-risk_free_rate*time_to_expiration))
+    exponent = (1 - n + phi*numpy.sqrt((n-1)**2 + 4*k)) / 2
+
+    # Seed from the perpetual critical price, then Newton on
+    #   phi*(S* - K) = V(S*) + phi*(1 - e^(-qT) N(phi*d1(S*))) * S*/exponent
+    critical_infinity = strike / (1 - 2/(1 - n + phi*numpy.sqrt((n-1)**2 + 4*m)))
+    h = numpy.minimum(-((risk_free_rate - yield_rate)*time_to_expiration + 2*phi*sig_sqrt_t) * strike / (critical_infinity - strike), 0)
+    critical_price = critical_infinity - (critical_infinity - strike) * numpy.exp(h)
+    for _ in range(_BAW_MAX_ITERATIONS):
+        d1 = (numpy.log(critical_price/strike) + (risk_free_rate - yield_rate + variance/2)*time_to_expiration) / sig_sqrt_t
+        exercise_weight = 1 - yield_discount * ndtr(phi*d1)
+        critical_value = euro_black_scholes_merton_batch(critical_price, strike, time_to_expiration, risk_free_rate, yield_rate, sigma, is_call)
+        residual = phi*(critical_price - strike) - critical_value - phi*exercise_weight*critical_price/exponent
+        slope = phi*exercise_weight*(1 - 1/exponent) + yield_discount*norm.pdf(d1)/(exponent*sig_sqrt_t)
+        step = residual / slope
+        critical_price = numpy.where(critical_price > step, critical_price - step, critical_price/2)
+        if numpy.all(numpy.abs(step) <= _BAW_TOLERANCE*critical_price):
+            break
+
+    d1 = (numpy.log(critical_price/strike) + (risk_free_rate - yield_rate + variance/2)*time_to_expiration) / sig_sqrt_t
+    early_exercise_premium = phi * critical_price/exponent * (1 - yield_discount*ndtr(phi*d1))
+    with numpy.errstate(over='ignore', invalid='ignore'):  # overflows only in the exercise region, which is replaced
+        premium_prices = european_prices[american] + early_exercise_premium * (spot_price/critical_price)**exponent
+    american_prices = numpy.where(phi*(spot_price - critical_price) >= 0, phi*(spot_price - strike), premium_prices)
+
+    final_option_prices = european_prices.copy()
+    final_option_prices[american] = american_prices
+
+    return final_option_prices[()]
+
+
 # Binomial tree method for evaluating European and American options
+# model.tree_method selects the plain Cox-Ross-Rubinstein tree (CRR), the Black-Scholes smoothed tree (BBS), which
+#   uses the closed form at the last step before expiration, or BBS with two-point Richardson extrapolation
+#   from n_time_steps and n_time_steps/2 steps (BBSR)
 def gbm_binomial_tree(model: Model, option: Option):
+    _, option_prices, _, _ = _gbm_binomial_lattice(model, option, 0)
+    final_option_price = option_prices[0]
+    if model.tree_method == TreeMethod.BBSR:
+        _, coarse_option_prices, _, _ = _gbm_binomial_lattice(model, option, 0, model.n_time_steps // 2)
+        final_option_price = 2 * final_option_price - coarse_option_prices[0]
+
+    return final_option_price
+
+
+# Binomial tree method, returning a GridResult: the price interpolated at any spot on a ladder of tree nodes,
+#   plus delta, gamma and theta read from the first tree nodes
+# The tree is extended n_ladder_steps (even) steps before time zero, so the time zero level holds n_ladder_steps+1
+#   nodes centred on the spot, and theta compares the centre node with the root, n_ladder_steps steps earlier
+# The ladder nodes of trees with different step counts do not line up, so TreeMethod.BBSR is priced here as BBS
+def gbm_binomial_tree_result(model: Model, option: Option, n_ladder_steps: int = 2):
+    assert n_ladder_steps > 0 and n_ladder_steps % 2 == 0, f'Error: in gbm_binomial_tree_result, n_ladder_steps={n_ladder_steps} should be a positive even number.'
+    underlying_values, option_prices, root_option_price, dt = _gbm_binomial_lattice(model, option, n_ladder_steps)
+    spot_idx = n_ladder_steps // 2
+    theta = (option_prices[spot_idx] - root_option_price) / (n_ladder_steps * dt)
+
+    return GridResult(underlying_values, option_prices, spot_idx, theta)
+
+
+# Binomial tree method for a chain of strikes on one lattice: the spot, expiration and option type come from option,
+#   the rates, volatility, steps and tree method from model
+# strikes is an array-like, and put_or_call holds PutOrCall members (or their values) broadcasting against it,
+#   defaulting to option.put_or_call for every strike
+# The strikes share one lattice: its step sizes, probabilities, discounting and node spot values are computed once
+# European strikes are priced against the Arrow-Debreu state prices of the last lattice level, found by one forward
+#   induction, so each strike adds only one pass over the nodes; American strikes need their own backward induction,
+#   run together as one (nodes x strikes) matrix, so their cost still grows with the number of strikes
+def gbm_binomial_tree_strikes(model: Model, option: Option, strikes, put_or_call=None):
+    model_type = model.model_type
+    assert model_type == ModelType.GBM, f'Error: in gbm_binomial_tree_strikes, model_type={model_type} should be ModelType.GBM.'
+    option_type = option.option_type
+    assert option_type in (OptionType.EUROPEAN, OptionType.AMERICAN), f'Error: in gbm_binomial_tree_strikes, option_type={option_type} should be European or American.'
+    assert option.spot_value > 0, f'Error: in gbm_binomial_tree_strikes, spot_price={option.spot_value} should be positive.'
+    if put_or_call is None:
+        put_or_call = option.put_or_call
+    strikes, is_call = numpy.broadcast_arrays(numpy.asarray(strikes, dtype=float), enum_mask(put_or_call, PutOrCall.CALL))
+    assert numpy.all(strikes > 0), 'Error: in gbm_binomial_tree_strikes, strike should be positive.'
+
+    lattice_inputs = (option.spot_value, strikes.ravel(), option.time_to_expiration, model.risk_free_rate, model.yield_rate,
+        model.sigma, is_call.ravel(), option_type == OptionType.AMERICAN)
+    n_time_steps = model.n_time_steps
+    final_option_prices = _binomial_lattice_strikes(*lattice_inputs, n_time_steps, model.tree_method != TreeMethod.CRR)
+    if model.tree_method == TreeMethod.BBSR:
+        coarse_option_prices = _binomial_lattice_strikes(*lattice_inputs, n_time_steps // 2, True)
+        final_option_prices = 2 * final_option_prices - coarse_option_prices
+
+    return final_option_prices.reshape(strikes.shape)
+
+
+# One binomial lattice for a chain of strikes (1-d strike and is_call arrays) on one underlying
+# With smoothed, the last step before expiration takes the Black-Scholes-Merton value, as in _binomial_lattice_batch
+def _binomial_lattice_strikes(spot_price: float, strikes, time_to_expiration: float, risk_free_rate: float, yield_rate: float, sigma: float, is_call, is_american: bool, n_time_steps: int, smoothed: bool):
+    dt = time_to_expiration / n_time_steps
+    u = exp(sigma*sqrt(dt))
+    d = 1/u
+    disc = exp(-risk_free_rate*dt)
+    p_up = (exp((risk_free_rate-yield_rate)*dt) - d)/(u-d)
+    disc_up = disc * p_up
+    disc_dn = disc * (1-p_up)
+
+    # Underlying values at level k are spot_price * u**net_moves for net_moves = -k, -k+2, ..., k, so American exercise
+    #   values are tabulated once by net moves, and each level reads every other row
+    phi = numpy.where(is_call, 1.0, -1.0)
+    n_value_levels = n_time_steps - 1 if smoothed else n_time_steps
+    net_moves = numpy.arange(-n_time_steps, n_time_steps+1)
+    if smoothed:
+        option_prices = euro_black_scholes_merton_batch((spot_price * u ** net_moves[1:-1:2])[:, numpy.newaxis], strikes, dt,
+            risk_free_rate, yield_rate, sigma, is_call)
+    else:
+        option_prices = numpy.maximum(phi * ((spot_price * u ** net_moves[::2])[:, numpy.newaxis] - strikes), 0)
+
+    if not is_american:
+        # State prices of the nodes of the last valued level, moving forward from the root
+        state_prices = numpy.ones(1)
+        for n_states in range(2, n_value_levels+2):
+            next_state_prices = numpy.empty(n_states)
+            next_state_prices[:-1] = state_prices * disc_dn
+            next_state_prices[-1] = 0
+            next_state_prices[1:] += state_prices * disc_up
+            state_prices = next_state_prices
+        return state_prices @ option_prices
+
+    exercise_values = phi * ((spot_price * u ** net_moves)[:, numpy.newaxis] - strikes)
+    if smoothed:
+        numpy.maximum(option_prices, exercise_values[1:-1:2], out=option_prices)
+    for level in range(n_value_levels-1, -1, -1):
+        option_prices = option_prices[:-1] * disc_dn + option_prices[1:] * disc_up
+        numpy.maximum(option_prices, exercise_values[n_time_steps-level:n_time_steps+level+1:2], out=option_prices)
+
+    return option_prices[0]
+
+
+# Binomial tree method for arrays of European and American options, priced in one vectorized pass
+# Inputs are array-likes (or scalars) that broadcast against each other; every option uses n_time_steps steps
+# put_or_call holds PutOrCall members or their values (so a boolean array of "is call" also works), and
+#   option_type holds OptionType members or their values (European or American)
+# tree_method is as in gbm_binomial_tree
+def gbm_binomial_tree_batch(spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, sigma, put_or_call, option_type, n_time_steps: int, tree_method: TreeMethod = TreeMethod.CRR):
+    spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, sigma, is_call, is_american = numpy.broadcast_arrays(
+        numpy.asarray(spot_price, dtype=float),
+        numpy.asarray(strike, dtype=float),
+        numpy.asarray(time_to_expiration, dtype=float),
+        numpy.asarray(risk_free_rate, dtype=float),
+        numpy.asarray(yield_rate, dtype=float),
+        numpy.asarray(sigma, dtype=float),
+        enum_mask(put_or_call, PutOrCall.CALL),
+        enum_mask(option_type, OptionType.AMERICAN) )
+    assert not numpy.any(enum_mask(option_type, OptionType.BARRIER)), 'Error: in gbm_binomial_tree_batch, option_type should be European or American.'
+    assert numpy.all(spot_price > 0), 'Error: in gbm_binomial_tree_batch, spot_price should be positive.'
+    assert numpy.all(strike > 0), 'Error: in gbm_binomial_tree_batch, strike should be positive.'
+
+    # Options are priced in chunks whose lattices fit in cache
+    inputs = [values.ravel() for values in (spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, sigma, is_call, is_american)]
+    chunk_size = max(1, _TREE_BATCH_CHUNK_NODES // (n_time_steps+1))
+    final_option_prices = numpy.empty(spot_price.size)
+    for chunk_start in range(0, spot_price.size, chunk_size):
+        chunk = slice(chunk_start, chunk_start + chunk_size)
+        chunk_inputs = [values[chunk] for values in inputs]
+        _, _, final_option_prices[chunk], _ = _binomial_lattice_batch(*chunk_inputs, n_time_steps, 0, tree_method != TreeMethod.CRR)
+        if tree_method == TreeMethod.BBSR:
+            _, _, coarse_option_prices, _ = _binomial_lattice_batch(*chunk_inputs, n_time_steps // 2, 0, True)
+            final_option_prices[chunk] = 2 * final_option_prices[chunk] - coarse_option_prices
+
+    return final_option_prices.reshape(spot_price.shape)
+
+
+# Binomial lattice for gbm_binomial_tree, started n_ladder_steps steps before time zero, with n_time_steps
+#   (model.n_time_steps by default) steps to expiration
+# Returns the underlying values and option prices across the time zero level (bottom up), the option price at
+#   the root of the lattice, and the time step
+def _gbm_binomial_lattice(model: Model, option: Option, n_ladder_steps: int, n_time_steps: int = None):
     # Model inputs
     risk_free_rate = model.risk_free_rate
     yield_rate = model.yield_rate
     sigma = model.sigma
-    n_time_steps = model.n_time_steps
+    if n_time_steps is None:
+        n_time_steps = model.n_time_steps
+    smoothed = model.tree_method != TreeMethod.CRR
     model_type = model.model_type
     assert model_type == ModelType.GBM, f'Error: in gbm_binomial_tree, model_type={model_type} should be ModelType.GBM.'
 
@@ -56,40 +511,82 @@ def gbm_binomial_tree(model: Model, option: Option):
     assert spot_price > 0, f'Error: in gbm_binomial_tree, spot_price={spot_price} should be positive.'
     assert strike > 0, f'Error: in gbm_binomial_tree, strike={strike} should be positive.'
 
+    ladder_underlying_values, ladder_option_prices, root_option_prices, dt = _binomial_lattice_batch(
+        numpy.array([spot_price], dtype=float),
+        numpy.array([strike], dtype=float),
+        numpy.array([time_to_expiration], dtype=float),
+        numpy.array([risk_free_rate], dtype=float),
+        numpy.array([yield_rate], dtype=float),
+        numpy.array([sigma], dtype=float),
+        numpy.array([put_or_call != PutOrCall.PUT]),
+        numpy.array([option_type == OptionType.AMERICAN]),
+        n_time_steps, n_ladder_steps, smoothed)
+
+    return ladder_underlying_values[:, 0], ladder_option_prices[:, 0], root_option_prices[0], dt[0]
+
+
+# Binomial lattices for an array of options (1-d input arrays), started n_ladder_steps steps before time zero
+# The lattice is stored as an (nodes x options) matrix, so each time level is a contiguous block of leading rows
+# With smoothed, the last step before expiration takes the Black-Scholes-Merton value rather than the
+#   discounted payoff, which removes the odd-even oscillation of the tree
+# Returns the (n_ladder_steps+1 x options) underlying values and option prices across the time zero level
+#   (bottom up), the option prices at the roots of the lattices, and the time steps
+def _binomial_lattice_batch(spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, sigma, is_call, is_american, n_time_steps: int, n_ladder_steps: int, smoothed: bool = False):
+    # American options go first, so early exercise is applied to one block of columns
+    order = numpy.argsort(~is_american, kind='stable')
+    n_american = numpy.count_nonzero(is_american)
+    spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, sigma, is_call = (
+        values[order] for values in (spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, sigma, is_call))
+
     dt = time_to_expiration / n_time_steps
-    u = exp(sigma*sqrt(dt))
+    u = numpy.exp(sigma*numpy.sqrt(dt))
     u_2 = u * u
     d = 1/u
-    disc = exp(-risk_free_rate*dt)
-    p_up = (exp((risk_free_rate-yield_rate)*dt) - d)/(u-d)
+    disc = numpy.exp(-risk_free_rate*dt)
+    p_up = (numpy.exp((risk_free_rate-yield_rate)*dt) - d)/(u-d)
     p_dn = 1-p_up
 
-    # Generate vector of final underlying values and final option prices
-    final_underlying = spot_price * (d ** n_time_steps)
-    underlying_values = [None] * (n_time_steps+1)
-    option_prices = [None] * (n_time_steps+1)
-    for state_idx in range(n_time_steps+1):
-        underlying_values[state_idx] = final_underlying
-        if put_or_call == PutOrCall.PUT:
-            option_prices[state_idx] = max(strike-final_underlying, 0)
-        else:
-            option_prices[state_idx] = max(final_underlying-strike, 0)
-        final_underlying *= u_2
+    # Generate matrix of final underlying values and final option prices
+    # phi is +1 for calls and -1 for puts, so the payoff and exercise value are phi * (underlying - strike)
+    phi = numpy.where(is_call, 1.0, -1.0)
+    n_lattice_steps = n_time_steps + n_ladder_steps
+    underlying_values = spot_price * (d ** n_lattice_steps) * u_2 ** numpy.arange(n_lattice_steps+1)[:, numpy.newaxis]
+    option_prices = numpy.maximum(phi * (underlying_values - strike), 0)
+    # Underlying values depend only on the number of up moves net of down moves, from -n_lattice_steps to
+    #   n_lattice_steps, so American exercise values are tabulated once and each time level reads every other row
+    net_moves = numpy.arange(-n_lattice_steps, n_lattice_steps+1)[:, numpy.newaxis]
+    exercise_values = phi[:n_american] * (spot_price[:n_american] * u[:n_american] ** net_moves - strike[:n_american])
+    disc_up = disc * p_up
+    disc_dn = disc * p_dn
 
     # Moving backwards in time, discount european options from the bottom up
-    for time_idx in range(n_time_steps):
-        for state_idx in range(n_time_steps-time_idx):
-            underlying_values[state_idx] *= u
-            option_prices[state_idx] = disc * (p_up * option_prices[state_idx+1] + p_dn * option_prices[state_idx])
-            if option_type == OptionType.AMERICAN:
-                if put_or_call == PutOrCall.PUT:
-                    option_prices[state_idx] = max(option_prices[state_idx], strike-underlying_values[state_idx])
-                else:
-                    option_prices[state_idx] = max(option_prices[state_idx], underlying_values[state_idx]-strike)
-
-    final_option_price = option_prices[0]
+    # Each time level is a few in-place operations on the leading rows of the matrices, with one scratch
+    #   buffer, so memory stays O(n_time_steps) per option
+    scratch = numpy.empty((n_lattice_steps, len(order)))
+    for time_idx in range(n_lattice_steps):
+        if time_idx == n_time_steps:
+            # Reached time zero: keep the ladder of nodes across it
+            ladder_option_prices = option_prices[:n_ladder_steps+1].copy()
+        n_states = n_lattice_steps - time_idx
+        level_prices = option_prices[:n_states]
+        level_scratch = scratch[:n_states]
+        if smoothed and time_idx == 0:
+            level_prices[:] = euro_black_scholes_merton_batch(underlying_values[:n_states] * u, strike, dt, risk_free_rate, yield_rate, sigma, is_call)
+        else:
+            numpy.multiply(option_prices[1:n_states+1], disc_up, out=level_scratch)
+            level_prices *= disc_dn
+            level_prices += level_scratch
+        if n_american > 0:
+            level_exercise_values = exercise_values[n_lattice_steps-n_states+1:n_lattice_steps+n_states:2]
+            numpy.maximum(level_prices[:, :n_american], level_exercise_values, out=level_prices[:, :n_american])
+    if n_ladder_steps == 0:
+        ladder_option_prices = option_prices[:1]
+    ladder_underlying_values = spot_price * (d ** n_ladder_steps) * u_2 ** numpy.arange(n_ladder_steps+1)[:, numpy.newaxis]
 
-    return final_option_price
+    # Back to the input order
+    inverse = numpy.empty_like(order)
+    inverse[order] = numpy.arange(len(order))
+    return ladder_underlying_values[:, inverse], ladder_option_prices[:, inverse], option_prices[0, inverse], dt[inverse]
 
 
 # Helper class, internal only
@@ -262,3 +759,387 @@ def barrier_reiner_rubinstein(model: Model, option: Option):
 
     return option_price
 
+
+# Reiner and Rubinstein terms (A, B, C, D, E, F) making up each standard barrier price, as in
+#   barrier_reiner_rubinstein, indexed by [is_call, is_up, is_out, strike_above_barrier]
+# strike_above_barrier is strike >= barrier for calls and strike > barrier for puts
+_BARRIER_TERM_COEFFICIENTS = numpy.array([
+    # Put, down, in
+    [[[[ 1,  0,  0,  0,  1,  0], [ 0,  1, -1,  1,  1,  0]],
+    # Put, down, out
+      [[ 0,  0,  0,  0,  0,  1], [ 1, -1,  1, -1,  0,  1]]],
+    # Put, up, in
+     [[[ 0,  0,  1,  0,  1,  0], [ 1, -1,  0,  1,  1,  0]],
+    # Put, up, out
+      [[ 1,  0, -1,  0,  0,  1], [ 0,  1,  0, -1,  0,  1]]]],
+    # Call, down, in
+    [[[[ 1, -1,  0,  1,  1,  0], [ 0,  0,  1,  0,  1,  0]],
+    # Call, down, out
+      [[ 0,  1,  0, -1,  0,  1], [ 1,  0, -1,  0,  0,  1]]],
+    # Call, up, in
+     [[[ 0,  1, -1,  1,  1,  0], [ 1,  0,  0,  0,  1,  0]],
+    # Call, up, out
+      [[ 1, -1,  1, -1,  0,  1], [ 0,  0,  0,  0,  0,  1]]]],
+], dtype=float)
+
+
+# Reiner and Rubinstein standard barrier pricing for arrays of barrier options, priced in one vectorized pass
+# Inputs are array-likes (or scalars) that broadcast against each other
+# put_or_call, up_or_down and in_or_out hold PutOrCall, BarrierTypeUpOrDown and BarrierTypeInOrOut members
+#   or their values
+# All normal CDF terms are computed in one ndtr call, and each contract's case picks its A..F coefficients
+#   from _BARRIER_TERM_COEFFICIENTS
+def barrier_reiner_rubinstein_batch(spot_price, strike, barrier, cash_rebate, time_to_expiration, risk_free_rate, yield_rate, sigma, put_or_call, up_or_down, in_or_out):
+    spot_price, strike, barrier, cash_rebate, time_to_expiration, risk_free_rate, yield_rate, sigma, is_call, is_up, is_out = numpy.broadcast_arrays(
+        numpy.asarray(spot_price, dtype=float),
+        numpy.asarray(strike, dtype=float),
+        numpy.asarray(barrier, dtype=float),
+        numpy.asarray(cash_rebate, dtype=float),
+        numpy.asarray(time_to_expiration, dtype=float),
+        numpy.asarray(risk_free_rate, dtype=float),
+        numpy.asarray(yield_rate, dtype=float),
+        numpy.asarray(sigma, dtype=float),
+        enum_mask(put_or_call, PutOrCall.CALL),
+        enum_mask(up_or_down, BarrierTypeUpOrDown.UP),
+        enum_mask(in_or_out, BarrierTypeInOrOut.OUT) )
+    assert numpy.all(spot_price > 0), 'Error: in barrier_reiner_rubinstein_batch, spot_price should be positive.'
+    assert numpy.all(strike > 0), 'Error: in barrier_reiner_rubinstein_batch, strike should be positive.'
+    assert numpy.all(barrier > 0), 'Error: in barrier_reiner_rubinstein_batch, barrier should be positive.'
+
+    # phi is +1 for calls and -1 for puts, eta is +1 for down and -1 for up barriers
+    phi = numpy.where(is_call, 1.0, -1.0)
+    eta = numpy.where(is_up, -1.0, 1.0)
+    disc_factor = numpy.exp(-risk_free_rate * time_to_expiration)
+    barr_over_spot = barrier / spot_price
+    sigma_sq = sigma * sigma
+    sig_sqrt_t = sigma * numpy.sqrt(time_to_expiration)
+    mu = (risk_free_rate - yield_rate) / sigma_sq - 0.5
+    lambda_ = numpy.sqrt(mu * mu + 2.0 * risk_free_rate / sigma_sq)
+    z = numpy.log(barr_over_spot) / sig_sqrt_t + lambda_ * sig_sqrt_t
+    mu_addend = (1 + mu) * sig_sqrt_t
+
+    spot_term = spot_price * numpy.exp(-yield_rate * time_to_expiration)
+    strike_term = strike * disc_factor
+    log_barr_over_spot = numpy.log(barr_over_spot)
+    x1 = numpy.log(spot_price / strike) / sig_sqrt_t + mu_addend
+    x2 = -log_barr_over_spot / sig_sqrt_t + mu_addend
+    y1 = numpy.log(barr_over_spot * barrier / strike) / sig_sqrt_t + mu_addend
+    y2 = log_barr_over_spot / sig_sqrt_t + mu_addend
+
+    log_cdfs = log_ndtr(numpy.stack((
+        phi * x1, phi * (x1 - sig_sqrt_t),
+        phi * x2, phi * (x2 - sig_sqrt_t),
+        eta * y1, eta * (y1 - sig_sqrt_t),
+        eta * y2, eta * (y2 - sig_sqrt_t),
+        eta * (x2 - sig_sqrt_t),
+        eta * z, eta * (z - 2.0 * lambda_ * sig_sqrt_t) )))
+    cdfs = numpy.exp(log_cdfs)
+
+    # The powers of barr_over_spot overflow at small sigma (mu grows like 1/sigma^2) just where the probabilities
+    #   they multiply underflow, so those products are formed in log space
+    log_barrier_term_2 = 2.0 * mu * log_barr_over_spot
+    log_barrier_term_1 = log_barrier_term_2 + 2.0 * log_barr_over_spot
+    terms = numpy.stack((
+        phi * (spot_term * cdfs[0] - strike_term * cdfs[1]),
+        phi * (spot_term * cdfs[2] - strike_term * cdfs[3]),
+        phi * (spot_term * numpy.exp(log_barrier_term_1 + log_cdfs[4]) - strike_term * numpy.exp(log_barrier_term_2 + log_cdfs[5])),
+        phi * (spot_term * numpy.exp(log_barrier_term_1 + log_cdfs[6]) - strike_term * numpy.exp(log_barrier_term_2 + log_cdfs[7])),
+        cash_rebate * disc_factor * (cdfs[8] - numpy.exp(log_barrier_term_2 + log_cdfs[7])),
+        cash_rebate * (numpy.exp((mu + lambda_) * log_barr_over_spot + log_cdfs[9])
+            + numpy.exp((mu - lambda_) * log_barr_over_spot + log_cdfs[10])) ), axis=-1)
+
+    strike_above_barrier = numpy.where(is_call, strike >= barrier, strike > barrier)
+    coefficients = _BARRIER_TERM_COEFFICIENTS[is_call.astype(int), is_up.astype(int), is_out.astype(int), strike_above_barrier.astype(int)]
+    final_option_prices = numpy.sum(coefficients * terms, axis=-1)
+
+    # If we are currently across the barrier, out options are worth the rebate and in options are European
+    barrier_hit = numpy.where(is_up, spot_price >= barrier, spot_price <= barrier)
+    if numpy.any(barrier_hit):
+        euro_prices = euro_black_scholes_merton_batch(spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, sigma, is_call)
+        final_option_prices = numpy.where(barrier_hit, numpy.where(is_out, cash_rebate, euro_prices), final_option_prices)
+
+    return final_option_prices
+
+
+# Helper class, internal only
+# Forward-mode derivative arithmetic for barrier_reiner_rubinstein_greeks_batch: a value, its first derivatives
+#   with respect to each input (stacked on axis 0), and its second derivative with respect to the first input
+# Mixing with plain arrays and scalars treats them as constants
+class _Dual:
+    __array_ufunc__ = None  # so ndarray * _Dual defers to _Dual.__rmul__
+
+    def __init__(self, value, grad, curvature):
+        self.value = value
+        self.grad = grad
+        self.curvature = curvature
+
+    # One _Dual per input, each with unit derivative in its own direction
+    @staticmethod
+    def variables(*values):
+        values = numpy.broadcast_arrays(*(numpy.asarray(value, dtype=float) for value in values))
+        n_inputs = len(values)
+        return [_Dual(value, numpy.eye(n_inputs)[:, idx].reshape((n_inputs,) + (1,) * value.ndim) * numpy.ones_like(value), numpy.zeros_like(value))
+            for idx, value in enumerate(values)]
+
+    # Chain rule for a function of one argument, given its value and first two derivatives at self.value
+    def apply(self, value, slope, second_slope):
+        return _Dual(value, slope * self.grad, slope * self.curvature + second_slope * self.grad[0] * self.grad[0])
+
+    def __add__(self, other):
+        if isinstance(other, _Dual):
+            return _Dual(self.value + other.value, self.grad + other.grad, self.curvature + other.curvature)
+        return _Dual(self.value + other, self.grad, self.curvature)
+
+    __radd__ = __add__
+
+    def __neg__(self):
+        return _Dual(-self.value, -self.grad, -self.curvature)
+
+    def __sub__(self, other):
+        return self + (-other)
+
+    def __rsub__(self, other):
+        return (-self) + other
+
+    def __mul__(self, other):
+        if isinstance(other, _Dual):
+            return _Dual(self.value * other.value, self.grad * other.value + self.value * other.grad,
+                self.curvature * other.value + 2 * self.grad[0] * other.grad[0] + self.value * other.curvature)
+        return _Dual(self.value * other, self.grad * other, self.curvature * other)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        if isinstance(other, _Dual):
+            return self * other.reciprocal()
+        return self * (1.0 / other)
+
+    def __rtruediv__(self, other):
+        return self.reciprocal() * other
+
+    def reciprocal(self):
+        inverse = 1.0 / self.value
+        return self.apply(inverse, -inverse * inverse, 2 * inverse * inverse * inverse)
+
+    def exp(self):
+        value = numpy.exp(self.value)
+        return self.apply(value, value, value)
+
+    def log(self):
+        inverse = 1.0 / self.value
+        return self.apply(numpy.log(self.value), inverse, -inverse * inverse)
+
+    def sqrt(self):
+        value = numpy.sqrt(self.value)
+        return self.apply(value, 0.5 / value, -0.25 / (value * self.value))
+
+    def ndtr(self):
+        density = norm.pdf(self.value)
+        return self.apply(ndtr(self.value), density, -self.value * density)
+
+    def log_ndtr(self):
+        value = log_ndtr(self.value)
+        hazard = numpy.exp(norm.logpdf(self.value) - value)
+        return self.apply(value, hazard, -hazard * (self.value + hazard))
+
+
+# Reiner and Rubinstein price and Greeks for a standard barrier option
+def barrier_reiner_rubinstein_greeks(model: Model, option: Option):
+    model_type = model.model_type
+    assert model_type == ModelType.GBM, f'Error: in barrier_reiner_rubinstein_greeks, model_type={model_type} should be ModelType.GBM.'
+    up_or_down, in_or_out = option.barrier_type
+
+    greeks = barrier_reiner_rubinstein_greeks_batch(option.spot_value, option.strike, option.barrier, option.cash_rebate,
+        option.time_to_expiration, model.risk_free_rate, model.yield_rate, model.sigma, option.put_or_call, up_or_down, in_or_out)
+
+    return _greeks_to_float(greeks)
+
+
+# Reiner and Rubinstein price and Greeks for arrays of barrier options, in one vectorized pass
+# Inputs broadcast as in barrier_reiner_rubinstein_batch
+# The formula of barrier_reiner_rubinstein_batch is evaluated once in forward-mode derivative arithmetic (_Dual),
+#   so each helper term carries its exact derivatives along with its value; contracts already across the barrier
+#   take the European Greeks (in) or none (out, worth the rebate)
+def barrier_reiner_rubinstein_greeks_batch(spot_price, strike, barrier, cash_rebate, time_to_expiration, risk_free_rate, yield_rate, sigma, put_or_call, up_or_down, in_or_out):
+    spot_price, strike, barrier, cash_rebate, time_to_expiration, risk_free_rate, yield_rate, sigma, is_call, is_up, is_out = numpy.broadcast_arrays(
+        numpy.asarray(spot_price, dtype=float),
+        numpy.asarray(strike, dtype=float),
+        numpy.asarray(barrier, dtype=float),
+        numpy.asarray(cash_rebate, dtype=float),
+        numpy.asarray(time_to_expiration, dtype=float),
+        numpy.asarray(risk_free_rate, dtype=float),
+        numpy.asarray(yield_rate, dtype=float),
+        numpy.asarray(sigma, dtype=float),
+        enum_mask(put_or_call, PutOrCall.CALL),
+        enum_mask(up_or_down, BarrierTypeUpOrDown.UP),
+        enum_mask(in_or_out, BarrierTypeInOrOut.OUT) )
+    assert numpy.all(spot_price > 0), 'Error: in barrier_reiner_rubinstein_greeks_batch, spot_price should be positive.'
+    assert numpy.all(strike > 0), 'Error: in barrier_reiner_rubinstein_greeks_batch, strike should be positive.'
+    assert numpy.all(barrier > 0), 'Error: in barrier_reiner_rubinstein_greeks_batch, barrier should be positive.'
+
+    # Derivative directions, in order: spot (also carrying the second derivative), sigma, time, rate, yield
+    spot, vol, expiry, rate, dividend = _Dual.variables(spot_price, sigma, time_to_expiration, risk_free_rate, yield_rate)
+
+    phi = numpy.where(is_call, 1.0, -1.0)
+    eta = numpy.where(is_up, -1.0, 1.0)
+    disc_factor = (-rate * expiry).exp()
+    barr_over_spot = barrier / spot
+    log_barr_over_spot = barr_over_spot.log()
+    sigma_sq = vol * vol
+    sig_sqrt_t = vol * expiry.sqrt()
+    mu = (rate - dividend) / sigma_sq - 0.5
+    lambda_ = (mu * mu + 2.0 * rate / sigma_sq).sqrt()
+    z = log_barr_over_spot / sig_sqrt_t + lambda_ * sig_sqrt_t
+    mu_addend = (1 + mu) * sig_sqrt_t
+
+    spot_term = spot * (-dividend * expiry).exp()
+    strike_term = strike * disc_factor
+    log_barrier_term_2 = 2.0 * mu * log_barr_over_spot
+    log_barrier_term_1 = log_barrier_term_2 + 2.0 * log_barr_over_spot
+    x1 = (spot / strike).log() / sig_sqrt_t + mu_addend
+    x2 = -log_barr_over_spot / sig_sqrt_t + mu_addend
+    y1 = (log_barr_over_spot + numpy.log(barrier / strike)) / sig_sqrt_t + mu_addend
+    y2 = log_barr_over_spot / sig_sqrt_t + mu_addend
+
+    terms = (
+        phi * (spot_term * (phi * x1).ndtr() - strike_term * (phi * (x1 - sig_sqrt_t)).ndtr()),
+        phi * (spot_term * (phi * x2).ndtr() - strike_term * (phi * (x2 - sig_sqrt_t)).ndtr()),
+        phi * (spot_term * (log_barrier_term_1 + (eta * y1).log_ndtr()).exp() - strike_term * (log_barrier_term_2 + (eta * (y1 - sig_sqrt_t)).log_ndtr()).exp()),
+        phi * (spot_term * (log_barrier_term_1 + (eta * y2).log_ndtr()).exp() - strike_term * (log_barrier_term_2 + (eta * (y2 - sig_sqrt_t)).log_ndtr()).exp()),
+        cash_rebate * disc_factor * ((eta * (x2 - sig_sqrt_t)).ndtr() - (log_barrier_term_2 + (eta * (y2 - sig_sqrt_t)).log_ndtr()).exp()),
+        cash_rebate * (((mu + lambda_) * log_barr_over_spot + (eta * z).log_ndtr()).exp()
+            + ((mu - lambda_) * log_barr_over_spot + (eta * (z - 2.0 * lambda_ * sig_sqrt_t)).log_ndtr()).exp()) )
+
+    strike_above_barrier = numpy.where(is_call, strike >= barrier, strike > barrier)
+    coefficients = _BARRIER_TERM_COEFFICIENTS[is_call.astype(int), is_up.astype(int), is_out.astype(int), strike_above_barrier.astype(int)]
+    final_option_prices = sum(coefficients[..., idx] * term for idx, term in enumerate(terms))
+    greeks = [final_option_prices.value, final_option_prices.grad[0], final_option_prices.curvature, final_option_prices.grad[1],
+        -final_option_prices.grad[2], final_option_prices.grad[3], final_option_prices.grad[4]]
+
+    # If we are currently across the barrier, out options are worth the rebate and in options are European
+    barrier_hit = numpy.where(is_up, spot_price >= barrier, spot_price <= barrier)
+    if numpy.any(barrier_hit):
+        euro_greeks = euro_black_scholes_merton_greeks_batch(spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, sigma, is_call)
+        euro_greeks = [euro_greeks.price, euro_greeks.delta, euro_greeks.gamma, euro_greeks.vega, euro_greeks.theta, euro_greeks.rho, euro_greeks.dividend_rho]
+        hit_greeks = [cash_rebate] + [0.0] * 6
+        greeks = [numpy.where(barrier_hit, numpy.where(is_out, hit_value, euro_value), value)
+            for value, euro_value, hit_value in zip(greeks, euro_greeks, hit_greeks)]
+
+    return GreeksResult(*greeks)
+
+
+# Trinomial tree for standard barrier options, after Ritchken (1995)
+# The log-price step is stretched to lambda * sigma * sqrt(dt), with lambda >= 1, so that a layer of nodes lies
+#   exactly on the barrier; if the barrier is closer than one unstretched step, the time steps are refined until it is
+#   not, up to _BARRIER_TREE_MAX_REFINEMENT times model.n_time_steps
+# A barrier still closer than one step is priced by quadratic interpolation in the distance to the barrier, between
+#   the value at the barrier (the rebate for out options, the European value for in options) and two trees with
+#   the barrier layer one and two unstretched steps from the spot
+# Out options are worth the cash rebate on the barrier layer and beyond (paid at the hit); in options are priced as
+#   European - out (without rebate) + the cash rebate paid at expiration if the barrier is never hit,
+#   with all three values run through the tree together as columns
+def barrier_trinomial_tree(model: Model, option: Option):
+    # Model inputs
+    risk_free_rate = model.risk_free_rate
+    yield_rate = model.yield_rate
+    sigma = model.sigma
+    n_time_steps = model.n_time_steps
+    model_type = model.model_type
+    assert model_type == ModelType.GBM, f'Error: in barrier_trinomial_tree, model_type={model_type} should be ModelType.GBM.'
+
+    # Contract inputs
+    put_or_call = option.put_or_call
+    spot_price = option.spot_value
+    time_to_expiration = option.time_to_expiration
+    strike = option.strike
+    barrier = option.barrier
+    cash_rebate = option.cash_rebate
+    assert spot_price > 0, f'Error: in barrier_trinomial_tree, spot_price={spot_price} should be positive.'
+    assert strike > 0, f'Error: in barrier_trinomial_tree, strike={strike} should be positive.'
+    assert barrier > 0, f'Error: in barrier_trinomial_tree, barrier={barrier} should be positive.'
+    up_or_down, in_or_out = option.barrier_type
+    is_up = up_or_down == BarrierTypeUpOrDown.UP
+    is_in = in_or_out == BarrierTypeInOrOut.IN
+
+    # Check if we are currently across the barrier
+    if (is_up and spot_price >= barrier) or (not is_up and spot_price <= barrier):
+        if is_in:
+            return gbm_binomial_tree(model, option)
+        else:
+            return cash_rebate
+
+    # Stretch the step so the barrier is a whole number of steps from the spot
+    barrier_distance = abs(log(barrier / spot_price))
+    n_time_steps = min(max(n_time_steps, ceil(sigma * sigma * time_to_expiration / (barrier_distance * barrier_distance))),
+        _BARRIER_TREE_MAX_REFINEMENT * n_time_steps)
+    sig_sqrt_dt = sigma * sqrt(time_to_expiration / n_time_steps)
+    tree_inputs = (spot_price, strike, cash_rebate, time_to_expiration, risk_free_rate, yield_rate, sigma,
+        put_or_call == PutOrCall.CALL, is_up, is_in, n_time_steps)
+    if barrier_distance >= sig_sqrt_dt:
+        n_barrier_steps = floor(barrier_distance / sig_sqrt_dt)
+        root_prices = _trinomial_barrier_tree(*tree_inputs, n_barrier_steps, barrier_distance / n_barrier_steps)
+        return _trinomial_barrier_price(root_prices, is_in)
+
+    # Values with the barrier 0, 1 and 2 steps away; both trees share their grid, so their European columns agree
+    root_prices_1 = _trinomial_barrier_tree(*tree_inputs, 1, sig_sqrt_dt)
+    root_prices_2 = _trinomial_barrier_tree(*tree_inputs, 2, sig_sqrt_dt)
+    price_0 = root_prices_1[0] if is_in else cash_rebate
+    price_1 = _trinomial_barrier_price(root_prices_1, is_in)
+    price_2 = _trinomial_barrier_price(root_prices_2, is_in)
+    x = barrier_distance / sig_sqrt_dt
+    final_option_price = price_0 * (x - 1) * (x - 2) / 2 - price_1 * x * (x - 2) + price_2 * x * (x - 1) / 2
+
+    return final_option_price
+
+
+# Price from the root values of _trinomial_barrier_tree
+def _trinomial_barrier_price(root_prices: numpy.ndarray, is_in: bool):
+    if is_in:
+        return root_prices[0] - root_prices[1] + root_prices[2]
+    return root_prices[0]
+
+
+# Trinomial tree for barrier_trinomial_tree with log-price step dx and the barrier layer n_barrier_steps from the spot
+# Returns the root values of the claims run through the tree: the out option for out options, and the European
+#   option, the out option without rebate and the rebate paid at expiration if never hit, for in options
+def _trinomial_barrier_tree(spot_price: float, strike: float, cash_rebate: float, time_to_expiration: float, risk_free_rate: float,
+        yield_rate: float, sigma: float, is_call: bool, is_up: bool, is_in: bool, n_time_steps: int, n_barrier_steps: int, dx: float):
+    dt = time_to_expiration / n_time_steps
+    stretch = dx / (sigma * sqrt(dt))
+    drift = (risk_free_rate - yield_rate - sigma * sigma / 2) * sqrt(dt) / (2 * stretch * sigma)
+    disc = exp(-risk_free_rate*dt)
+    p_up = disc * (1 / (2 * stretch * stretch) + drift)
+    p_mid = disc * (1 - 1 / (stretch * stretch))
+    p_dn = disc * (1 / (2 * stretch * stretch) - drift)
+
+    # Final values on nodes -n_time_steps..n_time_steps steps from the spot, one column per claim
+    # The barrier layer and beyond hold each barrier column's value at the hit
+    node_steps = numpy.arange(-n_time_steps, n_time_steps+1)
+    underlying_values = spot_price * numpy.exp(dx * node_steps)
+    if is_up:
+        barrier_hit = node_steps >= n_barrier_steps
+    else:
+        barrier_hit = node_steps <= -n_barrier_steps
+    phi = 1.0 if is_call else -1.0
+    payoff = numpy.maximum(phi * (underlying_values - strike), 0)
+    if is_in:
+        option_prices = numpy.column_stack((payoff, payoff, numpy.full(len(payoff), float(cash_rebate))))
+        hit_values = numpy.array([numpy.nan, 0.0, 0.0])
+    else:
+        option_prices = payoff[:, numpy.newaxis].copy()
+        hit_values = numpy.array([float(cash_rebate)])
+    is_barrier_column = ~numpy.isnan(hit_values)
+    hit_mask = barrier_hit[:, numpy.newaxis] & is_barrier_column
+    option_prices[hit_mask] = numpy.broadcast_to(hit_values, option_prices.shape)[hit_mask]
+
+    # Moving backwards in time, each level only needs the nodes within reach of the spot
+    for time_idx in range(n_time_steps-1, -1, -1):
+        level = slice(n_time_steps-time_idx, n_time_steps+time_idx+1)
+        level_prices = p_mid * option_prices[level]
+        level_prices += p_up * option_prices[n_time_steps-time_idx+1:n_time_steps+time_idx+2]
+        level_prices += p_dn * option_prices[n_time_steps-time_idx-1:n_time_steps+time_idx]
+        level_hit = hit_mask[level]
+        level_prices[level_hit] = numpy.broadcast_to(hit_values, level_prices.shape)[level_hit]
+        option_prices[level] = level_prices
+
+    return option_prices[n_time_steps]
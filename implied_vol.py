@@ -0,0 +1,274 @@
+import numpy
+from scipy.special import ndtr
+from scipy.stats import norm
+from model import AmericanApproximation, TreeMethod
+from option_enum import OptionType, PutOrCall
+from gbm import american_bjerksund_stensland_batch, american_barone_adesi_whaley_batch, gbm_binomial_tree_batch, barrier_reiner_rubinstein_batch
+from util import enum_mask
+
+
+# Volatility bracket searched by the implied volatility solvers
+_SIGMA_LOWER = 1e-4
+_SIGMA_UPPER = 5.0
+
+
+# Result of an implied volatility solve: the volatilities, whether each one converged, and the iterations it took
+# Volatilities that did not converge (including prices outside the no-arbitrage bounds) are nan
+class ImpliedVolResult:
+    def __init__(self, sigma: numpy.ndarray, converged: numpy.ndarray, n_iterations: numpy.ndarray):
+        self._sigma = sigma
+        self._converged = converged
+        self._n_iterations = n_iterations
+
+    @property
+    def sigma(self):
+        return self._sigma
+
+    @property
+    def converged(self):
+        return self._converged
+
+    @property
+    def n_iterations(self):
+        return self._n_iterations
+
+
+# Black-Scholes-Merton implied volatility for arrays of European option prices, solved in one vectorized pass
+# Inputs broadcast as in euro_black_scholes_merton_batch
+# In-the-money prices are mapped to the out-of-the-money option through put-call parity, so no precision is lost
+#   to the intrinsic value; Newton steps with the analytic vega start from the inflection point of the price in
+#   sigma (Manaster-Koehler), and any step that leaves the bracket kept around each root becomes a bisection
+# Prices too close to the no-arbitrage bounds to carry a volatility in double precision are reported as not converged,
+#   as are prices so insensitive to sigma (deep in the money) that rounding the price to double precision alone
+#   moves the volatility by more than tolerance
+def implied_vol_black_scholes_merton(option_price, spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, put_or_call,
+        tolerance: float = 1e-10, max_iterations: int = 100):
+    option_price, spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, is_call = numpy.broadcast_arrays(
+        numpy.asarray(option_price, dtype=float),
+        numpy.asarray(spot_price, dtype=float),
+        numpy.asarray(strike, dtype=float),
+        numpy.asarray(time_to_expiration, dtype=float),
+        numpy.asarray(risk_free_rate, dtype=float),
+        numpy.asarray(yield_rate, dtype=float),
+        enum_mask(put_or_call, PutOrCall.CALL) )
+    shape = option_price.shape
+    option_price, spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, is_call = (
+        values.ravel() for values in (option_price, spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, is_call))
+    assert numpy.all(spot_price > 0), 'Error: in implied_vol_black_scholes_merton, spot_price should be positive.'
+    assert numpy.all(strike > 0), 'Error: in implied_vol_black_scholes_merton, strike should be positive.'
+    assert numpy.all(time_to_expiration > 0), 'Error: in implied_vol_black_scholes_merton, time_to_expiration should be positive.'
+
+    # Switch to the out-of-the-money side, then check the no-arbitrage bounds 0 < price < discounted forward (or strike)
+    discounted_spot = spot_price * numpy.exp(-yield_rate*time_to_expiration)
+    discounted_strike = strike * numpy.exp(-risk_free_rate*time_to_expiration)
+    phi = numpy.where(is_call, 1.0, -1.0)
+    in_the_money = phi * (discounted_spot - discounted_strike) > 0
+    target_price = numpy.where(in_the_money, option_price - phi*(discounted_spot - discounted_strike), option_price)
+    phi = numpy.where(in_the_money, -phi, phi)
+    upper_bound = numpy.where(phi > 0, discounted_spot, discounted_strike)
+    valid = (target_price > 0) & (target_price < upper_bound)
+
+    sigma = numpy.full(option_price.size, numpy.nan)
+    converged = numpy.zeros(option_price.size, dtype=bool)
+    n_iterations = numpy.zeros(option_price.size, dtype=int)
+
+    log_moneyness = numpy.log(discounted_spot/discounted_strike)
+    sqrt_t = numpy.sqrt(time_to_expiration)
+    sigma[valid] = numpy.maximum(numpy.sqrt(2*numpy.abs(log_moneyness[valid])/time_to_expiration[valid]), _SIGMA_LOWER)
+    sigma_lower = numpy.zeros(option_price.size)
+    sigma_upper = numpy.full(option_price.size, numpy.inf)
+
+    active = numpy.flatnonzero(valid)
+    for _ in range(max_iterations):
+        if active.size == 0:
+            break
+        n_iterations[active] += 1
+
+        # Price and vega of the remaining contracts at their current sigma
+        sig = sigma[active]
+        sig_sqrt_t = sig * sqrt_t[active]
+        d1 = log_moneyness[active]/sig_sqrt_t + sig_sqrt_t/2
+        d2 = d1 - sig_sqrt_t
+        act_phi = phi[active]
+        price = act_phi * (discounted_spot[active]*ndtr(act_phi*d1) - discounted_strike[active]*ndtr(act_phi*d2))
+        vega = discounted_spot[active] * norm.pdf(d1) * sqrt_t[active]
+
+        residual = price - target_price[active]
+        too_high = residual > 0
+        sigma_upper[active] = numpy.where(too_high, sig, sigma_upper[active])
+        sigma_lower[active] = numpy.where(too_high, sigma_lower[active], sig)
+
+        # Newton step on the log price, which is far closer to linear in sigma than the price for out-of-the-money
+        #   options; falls back to bisection (or doubling, with no upper bracket yet) when it leaves the bracket
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            step = numpy.log(price/target_price[active]) * price/vega
+        newton_sigma = sig - step
+        bisect_sigma = numpy.where(numpy.isfinite(sigma_upper[active]), (sigma_lower[active] + sigma_upper[active])/2, 2*sig)
+        in_bracket = (newton_sigma >= sigma_lower[active]) & (newton_sigma <= sigma_upper[active])
+        done = numpy.abs(step) <= tolerance*sig
+        sigma[active] = numpy.where(in_bracket, newton_sigma, bisect_sigma)
+
+        converged[active[done]] = True
+        active = active[~done]
+
+    # One ulp of the quoted price moves sigma by eps*price/vega
+    solved = numpy.flatnonzero(converged)
+    sig_sqrt_t = sigma[solved] * sqrt_t[solved]
+    d1 = log_moneyness[solved]/sig_sqrt_t + sig_sqrt_t/2
+    vega = discounted_spot[solved] * norm.pdf(d1) * sqrt_t[solved]
+    ill_conditioned = numpy.finfo(float).eps * option_price[solved] > tolerance * sigma[solved] * vega
+    converged[solved[ill_conditioned]] = False
+
+    sigma[~converged] = numpy.nan
+
+    return ImpliedVolResult(sigma.reshape(shape), converged.reshape(shape), n_iterations.reshape(shape))
+
+
+# Implied volatility for arrays of prices from any vectorized pricer, by batched bracketed root finding
+# pricer(sigma, idx) returns the prices of the contracts at flat indices idx for the volatilities sigma
+# lower_sigma and upper_sigma are scalars or arrays that broadcast against option_price
+# Each root is kept bracketed on [lower_sigma, upper_sigma] and refined by the Illinois variant of regula falsi,
+#   which converges superlinearly without derivatives; the price must be increasing in sigma on the bracket,
+#   and contracts whose price is not bracketed are reported as not converged
+def implied_vol_root(pricer, option_price, lower_sigma: float = _SIGMA_LOWER, upper_sigma: float = _SIGMA_UPPER,
+        tolerance: float = 1e-8, max_iterations: int = 100):
+    option_price = numpy.asarray(option_price, dtype=float)
+    shape = option_price.shape
+    target_price = option_price.ravel()
+
+    sigma_lower = numpy.broadcast_to(numpy.asarray(lower_sigma, dtype=float), shape).ravel().copy()
+    sigma_upper = numpy.broadcast_to(numpy.asarray(upper_sigma, dtype=float), shape).ravel().copy()
+    assert numpy.all((0 < sigma_lower) & (sigma_lower < sigma_upper)), 'Error: in implied_vol_root, lower_sigma should be positive and below upper_sigma.'
+
+    all_idx = numpy.arange(target_price.size)
+    residual_lower = pricer(sigma_lower, all_idx) - target_price
+    residual_upper = pricer(sigma_upper, all_idx) - target_price
+    # +1 when the upper end was the last one moved, -1 for the lower end, 0 for neither
+    last_moved = numpy.zeros(target_price.size, dtype=int)
+
+    sigma = numpy.full(target_price.size, numpy.nan)
+    converged = numpy.zeros(target_price.size, dtype=bool)
+    n_iterations = numpy.full(target_price.size, 2)
+
+    # Prices hit exactly at an end of the bracket are done already
+    at_lower = residual_lower == 0
+    at_upper = (residual_upper == 0) & ~at_lower
+    sigma[at_lower] = sigma_lower[at_lower]
+    sigma[at_upper] = sigma_upper[at_upper]
+    converged[at_lower | at_upper] = True
+
+    active = numpy.flatnonzero((residual_lower < 0) & (residual_upper > 0))
+    for _ in range(max_iterations):
+        if active.size == 0:
+            break
+        n_iterations[active] += 1
+
+        lo, hi = sigma_lower[active], sigma_upper[active]
+        f_lo, f_hi = residual_lower[active], residual_upper[active]
+        new_sigma = lo - f_lo * (hi - lo) / (f_hi - f_lo)
+        new_sigma = numpy.clip(new_sigma, lo, hi)
+        residual = pricer(new_sigma, active) - target_price[active]
+        sigma[active] = new_sigma
+
+        # Replace the end with the same sign; when the same end moves twice running, halve the other end's residual
+        too_high = residual > 0
+        moved = numpy.where(too_high, 1, -1)
+        stuck = moved == last_moved[active]
+        sigma_upper[active] = numpy.where(too_high, new_sigma, hi)
+        residual_upper[active] = numpy.where(too_high, residual, numpy.where(stuck, f_hi/2, f_hi))
+        sigma_lower[active] = numpy.where(too_high, lo, new_sigma)
+        residual_lower[active] = numpy.where(too_high, numpy.where(stuck, f_lo/2, f_lo), residual)
+        last_moved[active] = moved
+
+        done = (sigma_upper[active] - sigma_lower[active] <= tolerance*new_sigma) | (residual == 0)
+        converged[active[done]] = True
+        active = active[~done]
+
+    sigma[~converged] = numpy.nan
+
+    return ImpliedVolResult(sigma.reshape(shape), converged.reshape(shape), n_iterations.reshape(shape))
+
+
+# Implied volatility for arrays of American option prices
+# By default the prices are inverted through the closed-form approximation american_approximation; passing
+#   n_time_steps inverts gbm_binomial_tree_batch with tree_method instead, for prices marked on the lattice
+# Prices at or below the zero-volatility value, the most of the exercise value and the discounted forward payoff
+#   exercised at any time before expiration, carry no volatility (every small sigma prices there) and are reported
+#   as not converged
+def implied_vol_american(option_price, spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, put_or_call,
+        american_approximation: AmericanApproximation = AmericanApproximation.BJERKSUND_STENSLAND,
+        n_time_steps: int = None, tree_method: TreeMethod = TreeMethod.BBSR, tolerance: float = 1e-8, max_iterations: int = 100):
+    option_price, spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, is_call = numpy.broadcast_arrays(
+        numpy.asarray(option_price, dtype=float),
+        numpy.asarray(spot_price, dtype=float),
+        numpy.asarray(strike, dtype=float),
+        numpy.asarray(time_to_expiration, dtype=float),
+        numpy.asarray(risk_free_rate, dtype=float),
+        numpy.asarray(yield_rate, dtype=float),
+        enum_mask(put_or_call, PutOrCall.CALL) )
+    spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, is_call = (
+        values.ravel() for values in (spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, is_call))
+
+    # A nan target is never bracketed, so it comes back not converged
+    zero_vol_value = _american_zero_vol_value(spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, is_call).reshape(option_price.shape)
+    option_price = numpy.where(option_price > zero_vol_value, option_price, numpy.nan)
+
+    lower_sigma = numpy.full(spot_price.shape, _SIGMA_LOWER)
+    if n_time_steps is not None:
+        pricer = lambda sigma, idx: gbm_binomial_tree_batch(spot_price[idx], strike[idx], time_to_expiration[idx],
+            risk_free_rate[idx], yield_rate[idx], sigma, is_call[idx], OptionType.AMERICAN, n_time_steps, tree_method)
+        # The tree probabilities leave [0, 1] once sigma*sqrt(dt) falls below |r - q|*dt (BBSR also runs half the steps)
+        lower_sigma = numpy.maximum(lower_sigma, 2*numpy.abs(risk_free_rate - yield_rate)*numpy.sqrt(time_to_expiration/n_time_steps))
+    else:
+        if american_approximation == AmericanApproximation.BARONE_ADESI_WHALEY:
+            price_batch = american_barone_adesi_whaley_batch
+        else:
+            assert american_approximation == AmericanApproximation.BJERKSUND_STENSLAND, \
+                f'Error: in implied_vol_american, american_approximation={american_approximation} is not supported.'
+            price_batch = american_bjerksund_stensland_batch
+        pricer = lambda sigma, idx: price_batch(spot_price[idx], strike[idx], time_to_expiration[idx],
+            risk_free_rate[idx], yield_rate[idx], sigma, is_call[idx])
+
+    return implied_vol_root(pricer, option_price, lower_sigma.reshape(option_price.shape), tolerance=tolerance, max_iterations=max_iterations)
+
+
+# Value of American options at zero volatility, where the underlying grows at the carry and the holder exercises
+#   at the best time t in [0, T]: the most of 0 and phi*(S*exp(-q*t) - K*exp(-r*t)), which is at t = 0, at t = T or
+#   at its one stationary point, where r*K*exp(-r*t) = q*S*exp(-q*t)
+def _american_zero_vol_value(spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, is_call):
+    phi = numpy.where(is_call, 1.0, -1.0)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        stationary_time = numpy.log(risk_free_rate*strike / (yield_rate*spot_price)) / (risk_free_rate - yield_rate)
+    stationary_time = numpy.clip(numpy.nan_to_num(stationary_time, nan=0.0, posinf=0.0, neginf=0.0), 0, time_to_expiration)
+    zero_vol_value = numpy.zeros(spot_price.shape)
+    for exercise_time in (0, time_to_expiration, stationary_time):
+        exercise_value = phi * (spot_price*numpy.exp(-yield_rate*exercise_time) - strike*numpy.exp(-risk_free_rate*exercise_time))
+        zero_vol_value = numpy.maximum(zero_vol_value, exercise_value)
+    return zero_vol_value
+
+
+# Implied volatility for arrays of barrier option prices, inverting barrier_reiner_rubinstein_batch
+# Barrier prices need not be increasing in sigma (a knock-out can lose value as the volatility rises), so a bracket
+#   narrower than the default may be needed to isolate the root; unbracketed prices are reported as not converged
+def implied_vol_barrier(option_price, spot_price, strike, barrier, cash_rebate, time_to_expiration, risk_free_rate, yield_rate,
+        put_or_call, up_or_down, in_or_out, lower_sigma: float = _SIGMA_LOWER, upper_sigma: float = _SIGMA_UPPER,
+        tolerance: float = 1e-8, max_iterations: int = 100):
+    option_price, spot_price, strike, barrier, cash_rebate, time_to_expiration, risk_free_rate, yield_rate, \
+        put_or_call, up_or_down, in_or_out = numpy.broadcast_arrays(
+            numpy.asarray(option_price, dtype=float),
+            numpy.asarray(spot_price, dtype=float),
+            numpy.asarray(strike, dtype=float),
+            numpy.asarray(barrier, dtype=float),
+            numpy.asarray(cash_rebate, dtype=float),
+            numpy.asarray(time_to_expiration, dtype=float),
+            numpy.asarray(risk_free_rate, dtype=float),
+            numpy.asarray(yield_rate, dtype=float),
+            numpy.asarray(put_or_call),
+            numpy.asarray(up_or_down),
+            numpy.asarray(in_or_out) )
+    inputs = [values.ravel() for values in (spot_price, strike, barrier, cash_rebate, time_to_expiration, risk_free_rate, yield_rate)]
+    flags = [values.ravel() for values in (put_or_call, up_or_down, in_or_out)]
+
+    pricer = lambda sigma, idx: barrier_reiner_rubinstein_batch(*(values[idx] for values in inputs), sigma, *(values[idx] for values in flags))
+
+    return implied_vol_root(pricer, option_price, lower_sigma, upper_sigma, tolerance, max_iterations)
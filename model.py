@@ -13,6 +13,34 @@ class NumericalMethod(Enum):
     MONTE_CARLO = 3
 
 
+class VarianceReduction(Enum):
+    NONE = 0
+    ANTITHETIC = 1
+    CONTROL_VARIATE = 2
+    MOMENT_MATCHING = 3
+
+
+class DrawMethod(Enum):
+    PSEUDO_RANDOM = 0
+    SOBOL = 1
+
+
+class TreeMethod(Enum):
+    CRR = 0
+    BBS = 1
+    BBSR = 2
+
+
+class PDEGrid(Enum):
+    UNIFORM = 0
+    SINH = 1
+
+
+class AmericanApproximation(Enum):
+    BJERKSUND_STENSLAND = 0
+    BARONE_ADESI_WHALEY = 1
+
+
 class Model:
     def __init__( self,
             model_type=ModelType.GBM,
@@ -22,7 +50,22 @@ class Model:
             sigma = 0.0,
             n_time_steps = 100.0,
             n_value_steps = 100.0,
-            random_draws=None ):
+            random_draws=None,
+            n_paths=None,
+            seed=None,
+            chunk_size=10000,
+            variance_reduction=VarianceReduction.NONE,
+            draw_method=DrawMethod.PSEUDO_RANDOM,
+            n_qmc_replicates=8,
+            n_workers=1,
+            target_standard_error=None,
+            target_relative_error=None,
+            pde_grid=PDEGrid.UNIFORM,
+            grid_concentration=0.1,
+            n_rannacher_steps=0,
+            richardson_extrapolation=False,
+            tree_method=TreeMethod.CRR,
+            american_approximation=AmericanApproximation.BJERKSUND_STENSLAND ):
         self._model_type = model_type
         self._numerical_method = numerical_method
         self._risk_free_rate = risk_free_rate
@@ -31,6 +74,21 @@ class Model:
         self._n_time_steps = n_time_steps
         self._n_value_steps = n_value_steps
         self._random_draws = random_draws
+        self._n_paths = n_paths
+        self._seed = seed
+        self._chunk_size = chunk_size
+        self._variance_reduction = variance_reduction
+        self._draw_method = draw_method
+        self._n_qmc_replicates = n_qmc_replicates
+        self._n_workers = n_workers
+        self._target_standard_error = target_standard_error
+        self._target_relative_error = target_relative_error
+        self._pde_grid = pde_grid
+        self._grid_concentration = grid_concentration
+        self._n_rannacher_steps = n_rannacher_steps
+        self._richardson_extrapolation = richardson_extrapolation
+        self._tree_method = tree_method
+        self._american_approximation = american_approximation
 
     @property
     def model_type(self):
@@ -102,4 +160,130 @@ class Model:
         assert random_draws.ndim == 2, 'Error: in Model class, random_draws must be an ndarray with 2 dimensions (draws by time steps).'
         self._random_draws = random_draws
 
+    @property
+    def n_paths(self):
+        return self._n_paths
+
+    @n_paths.setter
+    def n_paths(self, n_paths: int):
+        assert n_paths is None or n_paths > 0, 'Error: in Model class, n_paths must be None or a positive integer.'
+        self._n_paths = n_paths
+
+    @property
+    def seed(self):
+        return self._seed
+
+    @seed.setter
+    def seed(self, seed: int):
+        self._seed = seed
+
+    @property
+    def chunk_size(self):
+        return self._chunk_size
+
+    @chunk_size.setter
+    def chunk_size(self, chunk_size: int):
+        assert chunk_size > 0, 'Error: in Model class, chunk_size must be a positive integer.'
+        self._chunk_size = chunk_size
+
+    @property
+    def variance_reduction(self):
+        return self._variance_reduction
+
+    @variance_reduction.setter
+    def variance_reduction(self, variance_reduction: VarianceReduction):
+        self._variance_reduction = variance_reduction
+
+    @property
+    def draw_method(self):
+        return self._draw_method
+
+    @draw_method.setter
+    def draw_method(self, draw_method: DrawMethod):
+        self._draw_method = draw_method
+
+    @property
+    def n_qmc_replicates(self):
+        return self._n_qmc_replicates
+
+    @n_qmc_replicates.setter
+    def n_qmc_replicates(self, n_qmc_replicates: int):
+        assert n_qmc_replicates > 1, 'Error: in Model class, n_qmc_replicates must be an integer greater than 1.'
+        self._n_qmc_replicates = n_qmc_replicates
+
+    @property
+    def n_workers(self):
+        return self._n_workers
+
+    @n_workers.setter
+    def n_workers(self, n_workers: int):
+        assert n_workers > 0, 'Error: in Model class, n_workers must be a positive integer.'
+        self._n_workers = n_workers
+
+    @property
+    def target_standard_error(self):
+        return self._target_standard_error
+
+    @target_standard_error.setter
+    def target_standard_error(self, target_standard_error: float):
+        assert target_standard_error is None or target_standard_error > 0, 'Error: in Model class, target_standard_error must be None or a positive number.'
+        self._target_standard_error = target_standard_error
+
+    @property
+    def target_relative_error(self):
+        return self._target_relative_error
+
+    @target_relative_error.setter
+    def target_relative_error(self, target_relative_error: float):
+        assert target_relative_error is None or target_relative_error > 0, 'Error: in Model class, target_relative_error must be None or a positive number.'
+        self._target_relative_error = target_relative_error
+
+    @property
+    def pde_grid(self):
+        return self._pde_grid
+
+    @pde_grid.setter
+    def pde_grid(self, pde_grid: PDEGrid):
+        self._pde_grid = pde_grid
+
+    @property
+    def grid_concentration(self):
+        return self._grid_concentration
+
+    @grid_concentration.setter
+    def grid_concentration(self, grid_concentration: float):
+        assert not numpy.isnan(grid_concentration) and grid_concentration > 0, 'Error: in Model class, grid_concentration must be a positive number.'
+        self._grid_concentration = grid_concentration
+
+    @property
+    def n_rannacher_steps(self):
+        return self._n_rannacher_steps
+
+    @n_rannacher_steps.setter
+    def n_rannacher_steps(self, n_rannacher_steps: int):
+        assert n_rannacher_steps >= 0, 'Error: in Model class, n_rannacher_steps must be a non-negative integer.'
+        self._n_rannacher_steps = n_rannacher_steps
+
+    @property
+    def richardson_extrapolation(self):
+        return self._richardson_extrapolation
+
+    @richardson_extrapolation.setter
+    def richardson_extrapolation(self, richardson_extrapolation: bool):
+        self._richardson_extrapolation = richardson_extrapolation
+
+    @property
+    def tree_method(self):
+        return self._tree_method
+
+    @tree_method.setter
+    def tree_method(self, tree_method: TreeMethod):
+        self._tree_method = tree_method
+
+    @property
+    def american_approximation(self):
+        return self._american_approximation
 
+    @american_approximation.setter
+    def american_approximation(self, american_approximation: AmericanApproximation):
+        self._american_approximation = american_approximation
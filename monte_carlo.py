@@ -1,83 +1,409 @@
 import numpy
-from math import sqrt, exp
-from model import Model, ModelType
+from copy import copy
+from concurrent.futures import ProcessPoolExecutor
+from math import sqrt, exp, log
+from scipy.stats import qmc
+from scipy.special import ndtri
+from model import Model, ModelType, VarianceReduction, DrawMethod
 from option import Option
 from option_enum import OptionType, PutOrCall, BarrierTypeInOrOut, BarrierTypeUpOrDown
+from gbm import euro_black_scholes_merton
+from util import brownian_bridge
 
 
-# Monte Carlo option pricing
-def monte_carlo(model: Model, option: Option):
-    # Model inputs
-    model_type = model.model_type
-    risk_free_rate = model.risk_free_rate
-    yield_rate = model.yield_rate
-    sigma = model.sigma
+# Result of a Monte Carlo valuation: the price along with its standard error and the number of paths used
+# delta and vega, with their standard errors, are None unless the Greeks were requested
+class MonteCarloResult:
+    def __init__(self, price: float, standard_error: float, n_paths: int, delta=None, delta_standard_error=None, vega=None, vega_standard_error=None):
+        self._price = price
+        self._standard_error = standard_error
+        self._n_paths = n_paths
+        self._delta = delta
+        self._delta_standard_error = delta_standard_error
+        self._vega = vega
+        self._vega_standard_error = vega_standard_error
+
+    @property
+    def price(self):
+        return self._price
+
+    @property
+    def standard_error(self):
+        return self._standard_error
+
+    @property
+    def n_paths(self):
+        return self._n_paths
+
+    @property
+    def delta(self):
+        return self._delta
+
+    @property
+    def delta_standard_error(self):
+        return self._delta_standard_error
+
+    @property
+    def vega(self):
+        return self._vega
+
+    @property
+    def vega_standard_error(self):
+        return self._vega_standard_error
+
+
+# Helper class, internal only
+# Contract and model inputs reduced to what is needed to turn a chunk of draws into discounted payoffs
+class _PathSpec:
+    def __init__(self, model: Model, option: Option):
+        # Model inputs
+        model_type = model.model_type
+        risk_free_rate = model.risk_free_rate
+        yield_rate = model.yield_rate
+        sigma = model.sigma
+        random_draws = model.random_draws
+        assert model_type == ModelType.GBM, f'Error: in monte_carlo, model_type={model_type} should be ModelType.GBM.'
+
+        # Contract inputs
+        self.option_type = option.option_type
+        self.put_or_call = option.put_or_call
+        self.spot_price = option.spot_value
+        self.strike = option.strike
+        # TODO: support cash_rebate
+        self.up_or_down, self.in_or_out = option.barrier_type
+        time_to_expiration = option.time_to_expiration
+        assert self.spot_price > 0, f'Error: in monte_carlo, spot_price={self.spot_price} should be positive.'
+        assert self.strike > 0, f'Error: in monte_carlo, strike={self.strike} should be positive.'
+
+        if self.option_type == OptionType.EUROPEAN:
+            self.n_time_steps = 1
+        elif self.option_type == OptionType.BARRIER:
+            self.n_time_steps = random_draws.shape[1] if random_draws is not None else int(model.n_time_steps)
+            assert self.n_time_steps > 0, f'Error: in monte_carlo, n_time_steps={self.n_time_steps} should be a positive number.'
+            self.log_barrier = log(option.barrier/self.spot_price)
+        else:
+            assert 1 == 0, f'Error: in monte_carlo, option_type={self.option_type} should be OptionType.EUROPEAN or OptionType.BARRIER.'
+        dt = time_to_expiration / self.n_time_steps
+
+        b = risk_free_rate - yield_rate
+        self.sigma = sigma
+        self.sqrt_dt = sqrt(dt)
+        self.vega_drift = (b + sigma * sigma / 2) * time_to_expiration
+        self.drift_term = (b-sigma * sigma / 2)*dt
+        self.sig_sqrt_t = sigma * sqrt(dt)
+        self.discount_factor = exp(-risk_free_rate*time_to_expiration)
+
+    # Discounted payoffs of the option and of the European option with the same strike, on the same paths
+    # With greeks, also per-path delta and vega samples of the option, whose means are unbiased estimates of them:
+    #   pathwise derivatives of the payoff for European options, and the payoff times the likelihood ratio score
+    #   of the draws for barrier options, whose payoff jumps at the barrier and cannot be differentiated path by path
+    def discounted_payoffs(self, draws: numpy.ndarray, greeks=False):
+        # Build every log-price path at once: cumulative sums of the per-step log returns
+        log_returns = draws * self.sig_sqrt_t
+        log_returns += self.drift_term
+        log_paths = numpy.cumsum(log_returns, axis=1)
+        underlying_values = self.spot_price * numpy.exp(log_paths[:, -1])
+
+        # Evaluate payout at maturity
+        if self.put_or_call == PutOrCall.PUT:
+            euro_prices = numpy.maximum(self.strike-underlying_values, 0)
+        else:
+            euro_prices = numpy.maximum(underlying_values-self.strike, 0)
+        euro_prices *= self.discount_factor
+        option_prices = euro_prices.copy()
+
+        # Knock paths in or out using the running extremum of each path (the spot itself included)
+        if self.option_type == OptionType.BARRIER:
+            if self.up_or_down == BarrierTypeUpOrDown.UP:
+                barrier_hit = numpy.maximum(log_paths.max(axis=1), 0) >= self.log_barrier
+            else:
+                barrier_hit = numpy.minimum(log_paths.min(axis=1), 0) <= self.log_barrier
+            if self.in_or_out == BarrierTypeInOrOut.OUT:
+                option_prices[barrier_hit] = 0
+            else:
+                option_prices[~barrier_hit] = 0
+
+        if not greeks:
+            return option_prices, euro_prices
+
+        if self.option_type == OptionType.BARRIER:
+            # Scores of the log-return densities: the spot only moves the first step, sigma moves every step
+            delta_score = draws[:, 0] / (self.spot_price * self.sig_sqrt_t)
+            vega_score = ((draws * draws - 1) / self.sigma - self.sqrt_dt * draws).sum(axis=1)
+            return option_prices, euro_prices, option_prices * delta_score, option_prices * vega_score
+
+        # d(S_T)/d(spot) = S_T/spot and d(S_T)/d(sigma) = S_T (W_T - sigma T), where the payoff is in the money
+        in_the_money = euro_prices > 0
+        payoff_slope = numpy.where(in_the_money, self.discount_factor, 0.0)
+        if self.put_or_call == PutOrCall.PUT:
+            payoff_slope = -payoff_slope
+        payoff_slope *= underlying_values
+        return option_prices, euro_prices, payoff_slope / self.spot_price, payoff_slope * (log_paths[:, -1] - self.vega_drift) / self.sigma
+
+
+# Helper class, internal only
+# Running sums and cross products of per-path samples (paths by columns), so paths never need to be held all at once
+class _MomentAccumulator:
+    def __init__(self, n_columns: int):
+        self.n_samples = 0
+        self.totals = numpy.zeros(n_columns)
+        self.cross_totals = numpy.zeros((n_columns, n_columns))
+
+    def add(self, samples: numpy.ndarray):
+        self.n_samples += samples.shape[0]
+        self.totals += samples.sum(axis=0)
+        self.cross_totals += samples.T @ samples
+
+    def merge(self, other):
+        self.n_samples += other.n_samples
+        self.totals += other.totals
+        self.cross_totals += other.cross_totals
+
+    def mean(self):
+        return self.totals / self.n_samples
+
+    def covariance(self):
+        mean = self.mean()
+        return (self.cross_totals - self.n_samples * numpy.outer(mean, mean)) / (self.n_samples - 1)
+
+    # Mean and standard error of a column (column 0 by default), optionally using column 1 as a control variate
+    #   with known mean
+    def estimate(self, control_mean=None, column=0):
+        if self.n_samples < 2:
+            return self.mean()[column], numpy.nan
+        mean = self.mean()
+        covariance = self.covariance()
+        if control_mean is None or covariance[1][1] <= 0:
+            return mean[column], sqrt(max(covariance[column][column], 0) / self.n_samples)
+        beta = covariance[column][1] / covariance[1][1]
+        estimate = mean[column] - beta * (mean[1] - control_mean)
+        variance = covariance[column][column] - beta * covariance[column][1]
+        return estimate, sqrt(max(variance, 0) / self.n_samples)
+
+
+# Chunks of standard normal draws (paths by time steps)
+# Uses model.random_draws if given; otherwise generates n_draws paths from seed, chunk_size paths at a time,
+#   so peak memory is set by the chunk size rather than the path count
+def _draw_chunks(model: Model, n_time_steps: int, n_draws: int, seed):
+    chunk_size = model.chunk_size
     random_draws = model.random_draws
-    assert model_type == ModelType.GBM, f'Error: in monte_carlo, model_type={model_type} should be ModelType.GBM.'
-
-    # Contract inputs
-    option_type = option.option_type
-    put_or_call = option.put_or_call
-    spot_price = option.spot_value
-    time_to_expiration = option.time_to_expiration
-    strike = option.strike
-    barrier = option.barrier
-    # TODO: support cash_rebate
-    up_or_down, in_or_out = option.barrier_type
-    assert spot_price > 0, f'Error: in monte_carlo, spot_price={spot_price} should be positive.'
-    assert strike > 0, f'Error: in monte_carlo, strike={strike} should be positive.'
-
-    if option_type == OptionType.EUROPEAN:
-        n_time_steps = 1
-    elif option_type == OptionType.BARRIER:
-        n_time_steps = random_draws.shape[1]
-        assert n_time_steps > 0, f'Error: in monte_carlo, n_time_steps={n_time_steps} should be a positive number.'
+    if random_draws is not None:
+        for start_idx in range(0, random_draws.shape[0], chunk_size):
+            yield random_draws[start_idx:start_idx+chunk_size]
     else:
-        assert 1 == 0, f'Error: in monte_carlo, option_type={option_type} should be OptionType.EUROPEAN or OptionType.BARRIER.'
-    dt = time_to_expiration / n_time_steps
-
-    n_draws = random_draws.shape[0]
-    b = risk_free_rate - yield_rate
-    drift_term = (b-sigma * sigma / 2)*dt
-    drift_coeff = exp(drift_term)
-    sig_sqrt_t = sigma * sqrt(dt)
-
-    # Moving forward through time, calculate underlying value path and evaluate portfolio
-    underlying_values = numpy.full(n_draws, float(spot_price))
-    option_prices = numpy.zeros(n_draws)
-    if option_type == OptionType.BARRIER:
-        underlying_extrema = underlying_values.copy()
-    for draw_idx in range(n_draws):
-        for time_idx in range(n_time_steps):
-            underlying_values[draw_idx] *= drift_coeff * exp(sig_sqrt_t * random_draws[draw_idx][time_idx])
-            if option_type == OptionType.BARRIER:
-                if up_or_down == BarrierTypeUpOrDown.UP:
-                    underlying_extrema[draw_idx] = max(underlying_extrema[draw_idx], underlying_values[draw_idx])
-                else:
-                    underlying_extrema[draw_idx] = min(underlying_extrema[draw_idx], underlying_values[draw_idx])
+        rng = numpy.random.default_rng(seed)
+        for start_idx in range(0, n_draws, chunk_size):
+            yield rng.standard_normal((min(chunk_size, n_draws-start_idx), n_time_steps))
+
+
+def _power_of_2_floor(n: int):
+    return 1 << (n.bit_length() - 1)
+
 
-            # At maturity, evaluate payout
-            if time_idx == n_time_steps-1:
-                if put_or_call == PutOrCall.PUT:
-                    option_prices[draw_idx] = max(strike-underlying_values[draw_idx], 0)
+# Chunks of quasi-random standard normal draws (paths by time steps) from one scrambled Sobol sequence,
+#   starting n_skip points into the sequence
+# Points are mapped through the inverse normal and ordered along each path with a Brownian bridge
+# n_draws and the chunk size are rounded down to powers of 2 to keep the balance properties of the sequence,
+#   so the draws never exceed the budget
+def _sobol_draw_chunks(model: Model, n_time_steps: int, n_draws: int, seed, n_skip=0):
+    chunk_size = _power_of_2_floor(model.chunk_size)
+    n_draws = _power_of_2_floor(n_draws)
+    sampler = qmc.Sobol(d=n_time_steps, scramble=True, seed=numpy.random.default_rng(seed))
+    if n_skip > 0:
+        sampler.fast_forward(n_skip)
+    eps = numpy.finfo(float).eps
+    for start_idx in range(0, n_draws, chunk_size):
+        uniforms = sampler.random(min(chunk_size, n_draws-start_idx))
+        yield brownian_bridge(ndtri(numpy.clip(uniforms, eps, 1-eps)))
+
+
+# Accumulate the payoff moments of one stream of draws, returning the moments and the number of paths used
+# Columns are the option and European payoffs, then with greeks the delta and vega samples
+def _accumulate(model: Model, path_spec: _PathSpec, draw_chunks, greeks=False):
+    variance_reduction = model.variance_reduction
+    moments = _MomentAccumulator(4 if greeks else 2)
+    n_paths_used = 0
+    for draws in draw_chunks:
+        draws = draws[:, :path_spec.n_time_steps]
+        if variance_reduction == VarianceReduction.MOMENT_MATCHING and draws.shape[0] > 1:
+            # Match the first two moments of each time step's draws exactly
+            draws = (draws - draws.mean(axis=0)) / draws.std(axis=0)
+        samples = numpy.column_stack(path_spec.discounted_payoffs(draws, greeks))
+        n_paths_used += draws.shape[0]
+        if variance_reduction == VarianceReduction.ANTITHETIC:
+            # Average each path with its mirror image, so each pair is one independent sample
+            samples = (samples + numpy.column_stack(path_spec.discounted_payoffs(-draws, greeks))) / 2
+            n_paths_used += draws.shape[0]
+        moments.add(samples)
+
+    return moments, n_paths_used
+
+
+# Accumulate the payoff moments of one independent stream of draws
+# Module level so that it can also run in a worker process
+def _simulate_stream(model: Model, option: Option, n_draws: int, seed, n_skip=0, greeks=False):
+    path_spec = _PathSpec(model, option)
+    if model.draw_method == DrawMethod.SOBOL:
+        draw_chunks = _sobol_draw_chunks(model, path_spec.n_time_steps, n_draws, seed, n_skip)
+    else:
+        draw_chunks = _draw_chunks(model, path_spec.n_time_steps, n_draws, seed)
+    return _accumulate(model, path_spec, draw_chunks, greeks)
+
+
+# Split the simulation into independent streams of (model, n_draws, seed, n_skip)
+# Sobol draws get one stream per replicate; pseudo-random draws get one stream per worker, each with a spawned seed
+#   (or a block of rows of model.random_draws), so results are reproducible for a given seed and worker count
+def _streams(model: Model, n_draws: int):
+    n_workers = model.n_workers
+    random_draws = model.random_draws
+    if model.draw_method == DrawMethod.SOBOL:
+        n_replicates = model.n_qmc_replicates
+        replicate_seeds = numpy.random.SeedSequence(model.seed).spawn(n_replicates)
+        return [(model, max(n_draws // n_replicates, 1), replicate_seed, 0) for replicate_seed in replicate_seeds]
+    if n_workers == 1:
+        return [(model, n_draws, model.seed, 0)]
+    if random_draws is not None:
+        return _random_draws_streams(model, random_draws)
+    worker_seeds = numpy.random.SeedSequence(model.seed).spawn(n_workers)
+    return [(model, n_draws // n_workers + (worker_idx < n_draws % n_workers), worker_seed, 0) for worker_idx, worker_seed in enumerate(worker_seeds)]
+
+
+# One stream per worker, each over a block of rows of random_draws
+def _random_draws_streams(model: Model, random_draws: numpy.ndarray):
+    streams = []
+    for worker_draws in numpy.array_split(random_draws, model.n_workers):
+        stream_model = copy(model)
+        stream_model.random_draws = worker_draws
+        streams.append((stream_model, None, None, 0))
+    return streams
+
+
+# Streams for one batch of an adaptive run, and their total number of draws:
+#   up to chunk_size more draws for each worker (or each Sobol replicate), within the n_draws budget
+# Pseudo-random batches spawn fresh seeds from root_seed; Sobol replicates continue their sequences where they stopped,
+#   a power of 2 draws at a time, and return no streams once the budget left is less than one draw per replicate
+def _batch_streams(model: Model, n_draws_done: int, n_draws: int, root_seed: numpy.random.SeedSequence):
+    n_workers = model.n_workers
+    random_draws = model.random_draws
+    if model.draw_method == DrawMethod.SOBOL:
+        n_replicates = model.n_qmc_replicates
+        replicate_seeds = numpy.random.SeedSequence(model.seed).spawn(n_replicates)
+        n_batch_draws = min(model.chunk_size, (n_draws - n_draws_done) // n_replicates)
+        if n_batch_draws == 0:
+            if n_draws_done > 0:
+                return [], 0
+            # A budget below one draw per replicate still gets one, as in _streams
+            n_batch_draws = 1
+        n_batch_draws = _power_of_2_floor(n_batch_draws)
+        n_skip = n_draws_done // n_replicates
+        streams = [(model, n_batch_draws, replicate_seed, n_skip) for replicate_seed in replicate_seeds]
+        return streams, n_replicates * n_batch_draws
+    n_batch_draws = min(n_workers * model.chunk_size, n_draws - n_draws_done)
+    if random_draws is not None:
+        return _random_draws_streams(model, random_draws[n_draws_done:n_draws_done+n_batch_draws]), n_batch_draws
+    worker_seeds = root_seed.spawn(n_workers)
+    streams = [(model, n_batch_draws // n_workers + (worker_idx < n_batch_draws % n_workers), worker_seed, 0) for worker_idx, worker_seed in enumerate(worker_seeds)]
+    return streams, n_batch_draws
+
+
+# Run streams, in the process pool if there is one, returning their (moments, n_paths_used) in stream order
+def _run_streams(pool, option: Option, streams: list, greeks=False):
+    stream_models, stream_n_draws, stream_seeds, stream_n_skips = zip(*streams)
+    stream_options = [option] * len(streams)
+    stream_greeks = [greeks] * len(streams)
+    if pool is not None and len(streams) > 1:
+        return list(pool.map(_simulate_stream, stream_models, stream_options, stream_n_draws, stream_seeds, stream_n_skips, stream_greeks))
+    return list(map(_simulate_stream, stream_models, stream_options, stream_n_draws, stream_seeds, stream_n_skips, stream_greeks))
+
+
+# Price (or another column's estimate) and standard error from per-stream moments
+# Sobol replicates are independent estimates, so the standard error comes from their spread
+def _estimate(model: Model, stream_moments: list, control_mean, column=0):
+    if model.draw_method == DrawMethod.SOBOL:
+        replicate_prices = numpy.array([moments.estimate(control_mean, column)[0] for moments in stream_moments])
+        return replicate_prices.mean(), replicate_prices.std(ddof=1) / sqrt(len(replicate_prices))
+    moments = _MomentAccumulator(len(stream_moments[0].totals))
+    for stream_moment in stream_moments:
+        moments.merge(stream_moment)
+    return moments.estimate(control_mean, column)
+
+
+# Monte Carlo option pricing, returning the price with its standard error and path count
+# model.variance_reduction selects antithetic draws, a European control variate, or moment matching of the draws
+# model.draw_method selects pseudo-random or scrambled Sobol draws; with Sobol draws, the paths are split over
+#   model.n_qmc_replicates independently scrambled sequences of a power of 2 draws each, rounded down within the
+#   path budget, and the standard error comes from the replicates
+# model.n_workers > 1 simulates the streams in a process pool and reduces their partial sums here, in stream order
+# If model.target_standard_error or model.target_relative_error is set, paths are simulated in batches until the
+#   standard error is within target, with model.n_paths (or every row of model.random_draws, a pair of paths each
+#   with antithetic draws) as the path budget
+# With greeks, delta and vega are estimated on the same paths as the price, with their standard errors: pathwise for
+#   European options and by likelihood ratio for barrier options
+def monte_carlo_result(model: Model, option: Option, greeks=False):
+    variance_reduction = model.variance_reduction
+    target_standard_error = model.target_standard_error
+    target_relative_error = model.target_relative_error
+
+    # The draw budget: every row of model.random_draws, or else enough draws for model.n_paths paths
+    if model.random_draws is None:
+        assert model.n_paths is not None, 'Error: in monte_carlo, either random_draws or n_paths must be set on the model.'
+        n_draws = model.n_paths
+        if variance_reduction == VarianceReduction.ANTITHETIC:
+            # Each draw makes a pair of paths
+            n_draws = max(n_draws // 2, 1)
+    else:
+        assert model.draw_method != DrawMethod.SOBOL, 'Error: in monte_carlo, random_draws cannot be used with DrawMethod.SOBOL.'
+        n_draws = model.random_draws.shape[0]
+
+    control_mean = None
+    if variance_reduction == VarianceReduction.CONTROL_VARIATE:
+        control_mean = euro_black_scholes_merton(model, option)
+
+    pool = ProcessPoolExecutor(max_workers=model.n_workers) if model.n_workers > 1 else None
+    try:
+        if target_standard_error is None and target_relative_error is None:
+            stream_results = _run_streams(pool, option, _streams(model, n_draws), greeks)
+            stream_moments = [moments for moments, _ in stream_results]
+            n_paths_used = sum(stream_n_paths for _, stream_n_paths in stream_results)
+            final_option_price, standard_error = _estimate(model, stream_moments, control_mean)
+        else:
+            root_seed = numpy.random.SeedSequence(model.seed)
+            stream_moments = None
+            n_draws_done = 0
+            n_paths_used = 0
+            while n_draws_done < n_draws:
+                batch_streams, n_batch_draws = _batch_streams(model, n_draws_done, n_draws, root_seed)
+                if n_batch_draws == 0:
+                    break
+                batch_results = _run_streams(pool, option, batch_streams, greeks)
+                n_draws_done += n_batch_draws
+                n_paths_used += sum(stream_n_paths for _, stream_n_paths in batch_results)
+                if stream_moments is None:
+                    stream_moments = [moments for moments, _ in batch_results]
                 else:
-                    option_prices[draw_idx] = max(underlying_values[draw_idx]-strike, 0)
-                if option_type == OptionType.BARRIER:
-                    if up_or_down == BarrierTypeUpOrDown.UP and underlying_extrema[draw_idx] >= barrier:
-                        barrier_hit = True
-                    elif up_or_down == BarrierTypeUpOrDown.DOWN and underlying_extrema[draw_idx] <= barrier:
-                        barrier_hit = True
-                    else:
-                        barrier_hit = False
-                    if in_or_out == BarrierTypeInOrOut.OUT and barrier_hit:
-                        option_prices[draw_idx] = 0
-                    elif in_or_out == BarrierTypeInOrOut.IN and not barrier_hit:
-                        option_prices[draw_idx] = 0
-
-
-    # Take mean of payouts and discount to time zero
-    final_option_price = sum(option_prices) / n_draws
-    final_option_price *= exp(-risk_free_rate*time_to_expiration)
+                    for moments, (batch_moments, _) in zip(stream_moments, batch_results):
+                        moments.merge(batch_moments)
+
+                # Stop once the standard error is within target
+                final_option_price, standard_error = _estimate(model, stream_moments, control_mean)
+                if target_standard_error is not None and standard_error <= target_standard_error:
+                    break
+                if target_relative_error is not None and standard_error <= target_relative_error * abs(final_option_price):
+                    break
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if not greeks:
+        return MonteCarloResult(final_option_price, standard_error, n_paths_used)
+
+    delta, delta_standard_error = _estimate(model, stream_moments, control_mean, 2)
+    vega, vega_standard_error = _estimate(model, stream_moments, control_mean, 3)
+    return MonteCarloResult(final_option_price, standard_error, n_paths_used, delta, delta_standard_error, vega, vega_standard_error)
 
-    return final_option_price
 
+# Monte Carlo option pricing
+def monte_carlo(model: Model, option: Option):
+    final_option_price = monte_carlo_result(model, option).price
+
+    return final_option_price
@@ -1,7 +1,7 @@
 from option_enum import OptionType
 from model import ModelType, NumericalMethod
 from option import Option
-from gbm import euro_black_scholes_merton, gbm_binomial_tree, barrier_reiner_rubinstein
+from gbm import euro_black_scholes_merton, american_closed_form, gbm_binomial_tree, barrier_reiner_rubinstein, barrier_trinomial_tree
 from pde import pde
 from monte_carlo import monte_carlo
 
@@ -15,13 +15,13 @@ def add_all_evaluation_methods(option: Option):
         (ModelType.GBM, OptionType.EUROPEAN, NumericalMethod.PDE): pde,
         (ModelType.GBM, OptionType.EUROPEAN, NumericalMethod.MONTE_CARLO): monte_carlo,
         
-        (ModelType.GBM, OptionType.AMERICAN, NumericalMethod.CLOSED_FORM): None,
+        (ModelType.GBM, OptionType.AMERICAN, NumericalMethod.CLOSED_FORM): american_closed_form,
         (ModelType.GBM, OptionType.AMERICAN, NumericalMethod.TREE): gbm_binomial_tree,
         (ModelType.GBM, OptionType.AMERICAN, NumericalMethod.PDE): pde,
         (ModelType.GBM, OptionType.AMERICAN, NumericalMethod.MONTE_CARLO): monte_carlo,
         
         (ModelType.GBM, OptionType.BARRIER, NumericalMethod.CLOSED_FORM): barrier_reiner_rubinstein,
-        (ModelType.GBM, OptionType.BARRIER, NumericalMethod.TREE): None,
+        (ModelType.GBM, OptionType.BARRIER, NumericalMethod.TREE): barrier_trinomial_tree,
         (ModelType.GBM, OptionType.BARRIER, NumericalMethod.PDE): pde,
         (ModelType.GBM, OptionType.BARRIER, NumericalMethod.MONTE_CARLO): monte_carlo
     }
@@ -1,129 +1,339 @@
 import numpy
-from math import sqrt, exp
-from model import Model, ModelType
+from math import sqrt, log
+from scipy.interpolate import CubicSpline
+from model import Model, ModelType, PDEGrid
 from option import Option
 from option_enum import OptionType, PutOrCall, BarrierTypeUpOrDown, BarrierTypeInOrOut
-from util import tridiag_solve
+from util import TridiagonalSolver, ProjectedTridiagonalSolver, GridResult
+
+
+# Half-width of the sinh grid beyond the spot and strike, in standard deviations of the log price at expiration
+_SINH_GRID_WIDTH = 6.0
 
 
 # Numerical solution to PDE pricing for various options
 # Uses Crank-Nicolson method
 def pde(model: Model, option: Option):
+    final_option_price = pde_batch(model, [option])[0]
+
+    return final_option_price
+
+
+# Numerical solution to PDE pricing, returning the whole time zero grid as a GridResult: the price
+#   interpolated at any spot on the grid, plus delta, gamma and theta read from the grid
+# With model.richardson_extrapolation on the sinh grid, the values on this grid and theta are extrapolated as in
+#   pde_batch, with the finer grid's values interpolated onto this grid's nodes (the spot is a node of both)
+def pde_result(model: Model, option: Option):
+    S, spot_idx, option_values, option_values_dt, dt = _pde_grid(model, [option])
+    values = option_values[:, 0]
+    theta = (option_values_dt[spot_idx, 0] - values[spot_idx]) / dt
+
+    if _richardson_extrapolates(model):
+        _, _, fine_option_values, fine_option_values_dt, fine_dt = _pde_grid(model, [option], refinement=2, S=S)
+        fine_values = fine_option_values[:, 0]
+        fine_theta = (fine_option_values_dt[spot_idx, 0] - fine_values[spot_idx]) / fine_dt
+        values = _richardson_extrapolation(values, fine_values)
+        theta = _richardson_extrapolation(theta, fine_theta)
+
+    return GridResult(S, values, spot_idx, theta)
+
+
+# Numerical solution to PDE pricing for many options on one grid, in a single sweep
+# The options must share spot value and time to expiration; they may differ in strike, put/call,
+#   option type (European, American or barrier) and barrier terms
+# Option values are stored as an (n_price_steps x n_options) matrix, and every time step solves all columns
+#   together with one factorization of the Crank-Nicolson left-hand side
+# The grid, factorization and per-step overhead are paid once, but the solve, stencil and early exercise projection
+#   still grow with the number of columns: a chain of 50 American puts costs about 6x one option with 100 time and
+#   price steps (10x faster than pricing them one at a time), rising to about 25x with 500 steps (2x faster)
+# With model.richardson_extrapolation on the sinh grid, the prices are extrapolated from this grid and one with
+#   twice the time and price steps
+def pde_batch(model: Model, options: list):
+    S, spot_idx, option_values, _, _ = _pde_grid(model, options)
+    final_option_prices = option_values[spot_idx].copy()
+
+    if _richardson_extrapolates(model):
+        S, spot_idx, option_values, _, _ = _pde_grid(model, options, refinement=2)
+        final_option_prices = _richardson_extrapolation(final_option_prices, option_values[spot_idx])
+
+    return final_option_prices
+
+
+# Whether model.richardson_extrapolation applies: only on the sinh grid, whose strikes sit midway between nodes
+#   at every refinement, so the error is a smooth second order term in the steps
+# The uniform grid's spacing is tied to the time step, so refining it moves an off-node strike relative to the
+#   nodes and the error changes erratically; there the flag is ignored
+def _richardson_extrapolates(model: Model):
+    return model.richardson_extrapolation and model.pde_grid == PDEGrid.SINH
+
+
+# Richardson extrapolation of second order values from a grid and one with twice the time and price steps
+def _richardson_extrapolation(values, fine_values):
+    return (4 * fine_values - values) / 3
+
+
+# Solve the PDE grid for pde_batch, with the time steps and price step intervals multiplied by refinement
+# Returns the price grid S, the index of the spot in it, the (n_price_steps x n_options) option values at time zero
+#   and one time step later, and the time step; with S given, the values are interpolated onto those nodes instead,
+#   which must include the spot
+# European and American columns share one grid; "out" barrier columns sharing a barrier and direction are solved
+#   on their own grid, bounded by the barrier where the value is held at zero, and "in" barriers are the European
+#   minus the "out"; the result grid is the first grid unless the batch is one group of "out" barriers
+def _pde_grid(model: Model, options: list, refinement: int = 1, S: numpy.ndarray = None):
     # Model inputs
     model_type = model.model_type
-    risk_free_rate = model.risk_free_rate
-    yield_rate = model.yield_rate
     sigma = model.sigma
-    n_time_steps = model.n_time_steps
-    n_price_steps = model.n_price_steps
+    n_time_steps = model.n_time_steps * refinement
+    n_price_steps = (model.n_price_steps - 1) * refinement + 1
     assert model_type == ModelType.GBM, f'Error: in pde, model_type={model_type} should be ModelType.GBM.'
 
     # Contract inputs
-    option_type = option.option_type
-    put_or_call = option.put_or_call
-    spot_price = option.spot_value
-    time_to_expiration = option.time_to_expiration
-    strike = option.strike
-    barrier = option.barrier
+    n_options = len(options)
+    assert n_options > 0, 'Error: in pde_batch, options should not be empty.'
+    spot_price = options[0].spot_value
+    time_to_expiration = options[0].time_to_expiration
+    option_types = [option.option_type for option in options]
+    is_call = numpy.array([option.put_or_call != PutOrCall.PUT for option in options])
+    strikes = numpy.array([option.strike for option in options], dtype=float)
+    barriers = numpy.array([option.barrier for option in options], dtype=float)
     # TODO: support cash rebate
-    up_or_down, in_or_out = option.barrier_type
+    is_up = numpy.array([option.barrier_type[0] == BarrierTypeUpOrDown.UP for option in options])
+    is_in = numpy.array([option.barrier_type[1] == BarrierTypeInOrOut.IN for option in options])
+    is_american = numpy.array([option_type == OptionType.AMERICAN for option_type in option_types])
+    is_barrier = numpy.array([option_type == OptionType.BARRIER for option_type in option_types])
     assert spot_price > 0, f'Error: in pde, spot_price={spot_price} should be positive.'
-    assert strike > 0, f'Error: in pde, strike={strike} should be positive.'
+    assert numpy.all(strikes > 0), 'Error: in pde, strike should be positive.'
+    for option in options:
+        assert option.spot_value == spot_price, 'Error: in pde_batch, all options should share the same spot_value.'
+        assert option.time_to_expiration == time_to_expiration, 'Error: in pde_batch, all options should share the same time_to_expiration.'
+
+    # Barriers that the spot has already crossed are "out" from the start
+    knocked_out = is_barrier & numpy.where(is_up, spot_price >= barriers, spot_price <= barriers)
+    barrier_groups = sorted(set(zip(barriers[is_barrier & ~knocked_out], is_up[is_barrier & ~knocked_out])))
+    vanilla_columns = numpy.flatnonzero(~is_barrier | is_in)
 
-    if  n_price_steps % 2 == 0:
-        n_price_steps += 1
     dt = time_to_expiration / n_time_steps
-    dx = sigma * sqrt(3 * dt)
-    b = risk_free_rate - yield_rate
-    sigma_sq = sigma * sigma
-    dx_sq = dx * dx
-    matrix_1 = (b - sigma_sq / 2) / (4 * dx)
-    matrix_2 = sigma_sq / (4 * dx_sq)
-    matrix_3 = 1 / dt
-    matrix_4 = (sigma_sq / dx_sq + risk_free_rate) / 2
-
-    S = numpy.zeros(n_price_steps)
-    f = numpy.zeros(n_price_steps)
-    lhs_a = numpy.zeros(n_price_steps) # index 0 is ingnored
-    lhs_b = numpy.zeros(n_price_steps)
-    lhs_c = numpy.zeros(n_price_steps-1)
-    rhs = numpy.zeros((n_price_steps, n_price_steps))
-
-    # Set up boundary conditions
-    half_n_price_steps = int(n_price_steps / 2)
-    temp = exp(dx * half_n_price_steps) # from Haug p.342-343
-    S[0] = spot_price / temp
-    S[n_price_steps-1] = spot_price * temp
-    lhs_b[0] = lhs_b[n_price_steps-1] = 1
-    rhs[0][0] = rhs[n_price_steps-1][n_price_steps-1] = 1
-    if put_or_call == PutOrCall.PUT:
-        f[0] = max(strike - S[0], 0)
-        f[n_price_steps-1] = max(strike - S[n_price_steps-1], 0)
+    if model.pde_grid == PDEGrid.SINH:
+        # The sinh grids are clustered at the median strike and span the same width about the spot and strike
+        x_centre = numpy.median(numpy.log(strikes))
+        half_width = _SINH_GRID_WIDTH * sigma * sqrt(time_to_expiration)
+        x_range = (min(log(spot_price), x_centre) - half_width, max(log(spot_price), x_centre) + half_width)
     else:
-        f[0] = max(S[0] - strike, 0)
-        f[n_price_steps-1] = max(S[n_price_steps-1] - strike, 0)
-
-
-    # Set up body of calculations (i.e. body of matrices) and maturity exercise value
-    S_coeff = exp(dx)
-    for i in range(1, n_price_steps-1):
-        S[i] = S[i-1] * S_coeff
-        lhs_a[i] = -matrix_1 + matrix_2
-        lhs_b[i] = -matrix_3 - matrix_4
-        lhs_c[i] = matrix_1 + matrix_2
-        rhs[i][i-1] = matrix_1 - matrix_2
-        rhs[i][i] = -matrix_3 + matrix_4
-        rhs[i][i+1] = -matrix_1 - matrix_2
-        if put_or_call == PutOrCall.PUT:
-            f[i] = max(strike - S[i], 0)
+        # Log-spaced price grid centred on spot, from Haug p.342-343
+        if  n_price_steps % 2 == 0:
+            n_price_steps += 1
+        x_centre = log(spot_price)
+        dx = sigma * sqrt(3 * dt)
+        x_range = (x_centre - dx * (n_price_steps // 2), x_centre + dx * (n_price_steps // 2))
+
+    # European and American columns, and the European leg of each "in" barrier, share one grid
+    grid_x = None
+    if len(vanilla_columns) > 0 or len(barrier_groups) != 1:
+        # In barriers are interior nodes, where their value has a kink
+        x_knots = numpy.log(barriers[is_barrier & is_in & ~knocked_out])
+        grid_x, grid_spot_idx = _price_grid(model, spot_price, strikes[vanilla_columns], x_knots, x_centre, x_range, n_price_steps)
+        if len(vanilla_columns) > 0:
+            grid_values, grid_values_dt = _solve_grid(model, grid_x, dt, n_time_steps,
+                is_call[vanilla_columns], strikes[vanilla_columns], is_american[vanilla_columns])
+
+    # Each group of "out" columns on its own grid, bounded by the barrier; a batch that is one such group
+    #   takes it as the result grid
+    barrier_grids = []
+    for barrier, barrier_is_up in barrier_groups:
+        columns = numpy.flatnonzero(is_barrier & (barriers == barrier) & (is_up == barrier_is_up))
+        if barrier_is_up:
+            barrier_range = (x_range[0], log(barrier))
         else:
-            f[i] = max(S[i] - strike, 0)
-
-    if option_type == OptionType.BARRIER:
-        if in_or_out == BarrierTypeInOrOut.IN:
-            euro_price = f.copy()
-        for i in range(n_price_steps):
-            if up_or_down == BarrierTypeUpOrDown.UP and S[i] >= barrier:
-                barrier_hit = True
-            elif up_or_down == BarrierTypeUpOrDown.DOWN and S[i] <= barrier:
-                barrier_hit = True
-            else:
-                barrier_hit = False
-            if barrier_hit:
-                f[i] = 0
+            barrier_range = (log(barrier), x_range[1])
+        barrier_x, barrier_spot_idx = _price_grid(model, spot_price, strikes[columns], numpy.array([]), x_centre, barrier_range, n_price_steps)
+        out_values, out_values_dt = _solve_grid(model, barrier_x, dt, n_time_steps,
+            is_call[columns], strikes[columns], numpy.zeros(len(columns), dtype=bool), knock_out_at_top=barrier_is_up)
+        barrier_grids.append((columns, barrier_x, barrier_spot_idx, out_values, out_values_dt))
+        if grid_x is None:
+            grid_x, grid_spot_idx = barrier_x, barrier_spot_idx
 
+    # Results on the nodes S when given, else on the grid
+    if S is None:
+        S = numpy.exp(grid_x)
+        S[grid_spot_idx] = spot_price
+        for barrier in barriers[is_barrier & ~knocked_out]:
+            S[grid_x == log(barrier)] = barrier
+    spot_idx = int(numpy.flatnonzero(S == spot_price)[0])
+    x = numpy.log(S)
+    x[spot_idx] = log(spot_price)
+    option_values = numpy.zeros((len(S), n_options))
+    option_values_dt = numpy.zeros((len(S), n_options))
+    if len(vanilla_columns) > 0:
+        option_values[:, vanilla_columns] = _grid_on_nodes(grid_x, grid_spot_idx, grid_values, x, spot_idx, extrapolate=True)
+        option_values_dt[:, vanilla_columns] = _grid_on_nodes(grid_x, grid_spot_idx, grid_values_dt, x, spot_idx, extrapolate=True)
+    # Interpolate each "out" group separately, as its values are smooth up to the barrier, where they are zero
+    for columns, barrier_x, barrier_spot_idx, out_values, out_values_dt in barrier_grids:
+        for values, option_grid_values in ((out_values, option_values), (out_values_dt, option_values_dt)):
+            out_on_nodes = _grid_on_nodes(barrier_x, barrier_spot_idx, values, x, spot_idx, extrapolate=False)
+            # "in" plus "out" is just European
+            option_grid_values[:, columns] = numpy.where(is_in[columns], option_grid_values[:, columns] - out_on_nodes, out_on_nodes)
+
+    return S, spot_idx, option_values, option_values_dt, dt
+
+
+# Values on the log-price grid x interpolated onto the nodes x_nodes, with the spot (spot_idx in x, node_spot_idx
+#   in x_nodes) copied exactly; unless extrapolate, nodes beyond the grid are zero
+def _grid_on_nodes(x: numpy.ndarray, spot_idx: int, values: numpy.ndarray, x_nodes: numpy.ndarray, node_spot_idx: int, extrapolate: bool):
+    node_values = numpy.zeros((len(x_nodes), values.shape[1]))
+    on_grid = numpy.full(len(x_nodes), True) if extrapolate else (x_nodes >= x[0]) & (x_nodes <= x[-1])
+    node_values[on_grid] = CubicSpline(x, values)(x_nodes[on_grid])
+    node_values[node_spot_idx] = values[spot_idx]
+    return node_values
+
+
+# Log-price nodes on [x_range[0], x_range[1]] for the PDE grid, and the index of the spot among them
+# The sinh grid is clustered at x_centre, with nodes exactly on the spot and the x_knots, and each strike midway
+#   between two nodes, where the payoff kink does least harm to Crank-Nicolson
+# The uniform grid spaces the nodes evenly over the range, on either side of the spot so the spot is a node
+def _price_grid(model: Model, spot_price: float, strikes: numpy.ndarray, x_knots: numpy.ndarray, x_centre: float, x_range: tuple, n_price_steps: int):
+    x_spot = log(spot_price)
+    x_min, x_max = x_range
+    if model.pde_grid == PDEGrid.SINH:
+        x_nodes = numpy.unique(numpy.append(x_knots, x_spot))
+        x_midways = numpy.setdiff1d(numpy.log(strikes), x_nodes)
+        x_knots = numpy.concatenate((x_nodes, x_midways))
+        knot_offsets = numpy.concatenate((numpy.zeros(len(x_nodes)), numpy.full(len(x_midways), 0.5)))
+        in_domain = (x_knots > x_min) & (x_knots < x_max)
+        order = numpy.argsort(x_knots[in_domain])
+        x = _sinh_grid(x_min, x_max, x_centre, model.grid_concentration * (x_max - x_min), n_price_steps,
+            x_knots[in_domain][order], knot_offsets[in_domain][order])
+        spot_idx = int(numpy.flatnonzero(x == x_spot)[0])
+    else:
+        dx = (x_max - x_min) / (n_price_steps - 1)
+        n_below = max(1, int(numpy.ceil((x_spot - x_min) / dx - 1e-9)))
+        n_above = max(1, int(numpy.ceil((x_max - x_spot) / dx - 1e-9)))
+        x = numpy.concatenate((numpy.linspace(x_min, x_spot, n_below + 1), numpy.linspace(x_spot, x_max, n_above + 1)[1:]))
+        spot_idx = n_below
+    return x, spot_idx
+
+
+# Solve the Crank-Nicolson grid on log prices x for columns of European or American calls and puts, returning
+#   their values at time zero and one time step later
+# The boundary nodes hold their payoff, except the one on a knock-out barrier (the top with knock_out_at_top,
+#   else the bottom, when given), which holds zero
+def _solve_grid(model: Model, x: numpy.ndarray, dt: float, n_time_steps: int, is_call: numpy.ndarray, strikes: numpy.ndarray,
+        is_american: numpy.ndarray, knock_out_at_top: bool = None):
+    n_price_steps = len(x)
+    n_rannacher_steps = min(model.n_rannacher_steps, n_time_steps)
+    S_column = numpy.exp(x)[:, numpy.newaxis]
+    exercise_value = numpy.where(is_call, S_column - strikes, strikes - S_column)
+    exercise_value = numpy.maximum(exercise_value, 0)
+    # Values are kept column-major, so each option's column is contiguous for the stencil and the solver
+    f = numpy.asfortranarray(exercise_value)
+    if knock_out_at_top is not None:
+        f[-1 if knock_out_at_top else 0] = 0
+
+    # Crank-Nicolson: (I/dt - L/2) f[t] = (I/dt + L/2) f[t+1], where L is the spatial operator on the interior nodes
+    # Boundary rows (first and last) just hold their value
+    op_a, op_b, op_c = _spatial_operator(x, model.risk_free_rate, model.yield_rate, model.sigma)
+    lhs_a = numpy.zeros(n_price_steps) # index 0 is ingnored
+    lhs_b = numpy.ones(n_price_steps)
+    lhs_c = numpy.zeros(n_price_steps-1)
+    lhs_a[1:-1] = -op_a / 2
+    lhs_b[1:-1] = 1 / dt - op_b / 2
+    lhs_c[1:] = -op_c / 2
+    rhs_a = (op_a / 2)[:, numpy.newaxis]
+    rhs_b = (1 / dt + op_b / 2)[:, numpy.newaxis]
+    rhs_c = (op_c / 2)[:, numpy.newaxis]
+    # American columns are solved as a linear complementarity problem against their exercise value, with
+    #   calls exercised at the top of the grid and puts at the bottom
+    american_columns = numpy.flatnonzero(is_american)
+    has_american = len(american_columns) > 0
+    exercise_floor = exercise_value[:, american_columns]
+    exercise_at_top = is_call[american_columns]
+    Solver = ProjectedTridiagonalSolver if has_american else TridiagonalSolver
+
+    lhs_solver = Solver(lhs_a, lhs_b, lhs_c)
+    if n_rannacher_steps > 0:
+        # Rannacher start-up: the first time steps are each two implicit Euler half steps,
+        #   (2I/dt - L) f[t+dt/2] = 2I/dt f[t+dt], which damp the payoff kink that Crank-Nicolson would carry as oscillations
+        euler_b = numpy.ones(n_price_steps)
+        euler_b[1:-1] = 2 / dt - op_b
+        euler_solver = Solver(2 * lhs_a, euler_b, 2 * lhs_c)
+        euler_rhs_b = numpy.full(n_price_steps, 2 / dt)
+        euler_rhs_b[[0, -1]] = 1
+        euler_rhs_b = euler_rhs_b[:, numpy.newaxis]
 
     # Step through time, solving for f[t] using f[t+1]
+    # The solver overwrites the right-hand side in place, so two buffers are swapped each step
+    f_next = numpy.empty_like(f)
     for time_idx in range(n_time_steps):
-        new_rhs = numpy.matmul(rhs, f)
-        f = tridiag_solve(lhs_a, lhs_b, lhs_c, new_rhs)
-        if option_type == OptionType.AMERICAN:
-            # Update f[t] for early exercise
-            for i in range(1, n_price_steps-1):
-                if put_or_call == PutOrCall.PUT:
-                    f[i] = max(strike - S[i], f[i])
-                else:
-                    f[i] = max(S[i] - strike, f[i])
-        elif option_type == OptionType.BARRIER:
-            # If "in", then also price the European
-            if in_or_out == BarrierTypeInOrOut.IN:
-                new_rhs = numpy.matmul(rhs, euro_price)
-                euro_price = tridiag_solve(lhs_a, lhs_b, lhs_c, new_rhs)
-            # Update f[t] if we hit the "out" barrier
-            for i in range(n_price_steps):
-                if up_or_down == BarrierTypeUpOrDown.UP and S[i] >= barrier:
-                    barrier_hit = True
-                elif up_or_down == BarrierTypeUpOrDown.DOWN and S[i] <= barrier:
-                    barrier_hit = True
-                else:
-                    barrier_hit = False
-                if barrier_hit:
-                    f[i] = 0
-
-    if option_type == OptionType.BARRIER and in_or_out == BarrierTypeInOrOut.IN:
-        # "in" plus "out" is just European
-        return euro_price[half_n_price_steps] - f[half_n_price_steps]
-    else:
-        return f[half_n_price_steps]
+        if time_idx == n_time_steps - 1:
+            f_dt = f.copy()
+        if time_idx < n_rannacher_steps:
+            n_sub_steps = 2
+        else:
+            n_sub_steps = 1
+        for _ in range(n_sub_steps):
+            if time_idx < n_rannacher_steps:
+                solver = euler_solver
+                numpy.multiply(f, euler_rhs_b, out=f_next)
+            else:
+                solver = lhs_solver
+                _apply_stencil(rhs_a, rhs_b, rhs_c, f, f_next)
+            f_next = solver.solve(f_next, overwrite=True)
+            f, f_next = f_next, f
+            if has_american:
+                # Solve f[t] for early exercise
+                f[:, american_columns] = solver.project(f[:, american_columns], exercise_floor, exercise_at_top)
+
+    return f, f_dt
+
+
+# Sinh-stretched log-price grid on [x_min, x_max] with n_nodes nodes, clustered around x_centre with width alpha
+# Each of the (sorted) x_knots lands exactly on a node (knot_offsets 0) or midway between two nodes (knot_offsets 0.5):
+#   the stretching coordinate is adjusted piecewise linearly between the knots, so the grid stays smooth away from them
+def _sinh_grid(x_min: float, x_max: float, x_centre: float, alpha: float, n_nodes: int, x_knots: numpy.ndarray, knot_offsets: numpy.ndarray):
+    c_min = numpy.arcsinh((x_min - x_centre) / alpha)
+    c_max = numpy.arcsinh((x_max - x_centre) / alpha)
+    knot_coords = (numpy.arcsinh((x_knots - x_centre) / alpha) - c_min) / (c_max - c_min)
+
+    # Snap each knot to its nearest interior position, keeping the knots at distinct positions
+    knot_positions = numpy.rint(knot_coords * (n_nodes - 1) - knot_offsets) + knot_offsets
+    gaps = numpy.where(knot_offsets[1:] == knot_offsets[:-1], 1, 0.5)
+    for idx in range(len(knot_positions)):
+        knot_positions[idx] = max(knot_positions[idx], knot_positions[idx-1] + gaps[idx-1] if idx > 0 else 1)
+    for idx in range(len(knot_positions)-1, -1, -1):
+        knot_positions[idx] = min(knot_positions[idx], knot_positions[idx+1] - gaps[idx] if idx < len(knot_positions) - 1 else n_nodes - 2)
+    assert len(knot_positions) == 0 or knot_positions[0] >= 1, f'Error: in pde, n_price_steps={n_nodes} is too small to place every spot, strike and barrier node.'
+
+    node_coords = numpy.interp(numpy.arange(n_nodes), numpy.concatenate(([0], knot_positions, [n_nodes - 1])), numpy.concatenate(([0], knot_coords, [1])))
+    x = x_centre + alpha * numpy.sinh(c_min + node_coords * (c_max - c_min))
+    x[0] = x_min
+    x[-1] = x_max
+    on_node = knot_offsets == 0
+    x[knot_positions[on_node].astype(int)] = x_knots[on_node]
+    return x
+
+
+# Tridiagonal coefficients (a, b, c) on the interior nodes of the spatial operator
+#   L f = sigma^2/2 f'' + (r - q - sigma^2/2) f' - r f
+# using three-point differences on the (possibly non-uniform) log-price grid x
+def _spatial_operator(x: numpy.ndarray, risk_free_rate: float, yield_rate: float, sigma: float):
+    h_dn = x[1:-1] - x[:-2]
+    h_up = x[2:] - x[1:-1]
+    h_sum = h_dn + h_up
+    diffusion = sigma * sigma / 2
+    drift = risk_free_rate - yield_rate - diffusion
+
+    op_a = (2 * diffusion - drift * h_up) / (h_dn * h_sum)
+    op_b = -(2 * diffusion - drift * (h_up - h_dn)) / (h_dn * h_up) - risk_free_rate
+    op_c = (2 * diffusion + drift * h_dn) / (h_up * h_sum)
+    return op_a, op_b, op_c
 
 
+# Multiply f by the Crank-Nicolson right-hand side into new_rhs: a three-diagonal stencil (a, b, c)
+#   on the interior rows, with the boundary rows held at their value
+def _apply_stencil(a: numpy.ndarray, b: numpy.ndarray, c: numpy.ndarray, f: numpy.ndarray, new_rhs: numpy.ndarray):
+    new_rhs[0] = f[0]
+    new_rhs[-1] = f[-1]
+    interior = new_rhs[1:-1]
+    numpy.multiply(f[1:-1], b, out=interior)
+    interior += a * f[:-2]
+    interior += c * f[2:]
+    return new_rhs
@@ -0,0 +1,73 @@
+import numpy
+from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor
+from model import Model, NumericalMethod
+from option import Option
+from util import GreeksResult
+
+
+# Scenario order: the base, then a down and an up bump in each of spot, sigma, time, rate and yield
+_BUMPED_INPUTS = ('spot_value', 'sigma', 'time_to_expiration', 'risk_free_rate', 'yield_rate')
+
+
+# Price of one scenario snapshot; module level so a process pool can run it
+def _price_scenario(option: Option):
+    return option.price()
+
+
+# Snapshot of (model, option) with one input moved by bump, leaving the caller's objects untouched
+# The model and option are copied together so the copied option still prices off the copied model
+def _bumped_scenario(model: Model, option: Option, bumped_input: str, bump: float):
+    model, option = deepcopy((model, option))
+    if bumped_input in ('spot_value', 'time_to_expiration'):
+        setattr(option, bumped_input, getattr(option, bumped_input) + bump)
+    elif bumped_input is not None:
+        setattr(model, bumped_input, getattr(model, bumped_input) + bump)
+    return option
+
+
+# Greeks of any evaluation method by bump and reprice, with central differences in spot, sigma, time, rate and yield
+# Every scenario is an independent deep copy of (model, option), so the caller's objects are never mutated and the
+#   scenarios can be priced in any order, or in a process pool of n_workers
+# spot_bump is relative to the spot value; the others are absolute
+# For Monte Carlo, every scenario simulates the same draws (common random numbers): an unseeded model gets one
+#   fixed seed for all scenarios, and adaptive path targets are switched off so every scenario uses the full
+#   path budget; the Greeks then measure the change in the payoffs rather than the noise between runs
+def bump_and_reprice_greeks(model: Model, option: Option, spot_bump=0.01, sigma_bump=1e-3, time_bump=1/365, rate_bump=1e-4, yield_bump=1e-4, n_workers=1):
+    assert option.model is model, 'Error: in bump_and_reprice_greeks, option must be priced with model.'
+    assert 0 < sigma_bump < model.sigma, f'Error: in bump_and_reprice_greeks, sigma_bump={sigma_bump} should be positive and less than sigma.'
+    assert 0 < time_bump < option.time_to_expiration, f'Error: in bump_and_reprice_greeks, time_bump={time_bump} should be positive and less than time_to_expiration.'
+    assert spot_bump > 0 and rate_bump > 0 and yield_bump > 0, 'Error: in bump_and_reprice_greeks, bumps should be positive.'
+    assert n_workers > 0, 'Error: in bump_and_reprice_greeks, n_workers must be a positive integer.'
+
+    base_model, base_option = deepcopy((model, option))
+    if base_model.numerical_method == NumericalMethod.MONTE_CARLO:
+        if base_model.seed is None and base_model.random_draws is None:
+            base_model.seed = numpy.random.SeedSequence().entropy
+        base_model.target_standard_error = None
+        base_model.target_relative_error = None
+
+    spot_bump = spot_bump * option.spot_value
+    bumps = (spot_bump, sigma_bump, time_bump, rate_bump, yield_bump)
+    scenarios = [_bumped_scenario(base_model, base_option, None, 0.0)]
+    for bumped_input, bump in zip(_BUMPED_INPUTS, bumps):
+        scenarios += [_bumped_scenario(base_model, base_option, bumped_input, -bump), _bumped_scenario(base_model, base_option, bumped_input, bump)]
+
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            scenario_prices = list(pool.map(_price_scenario, scenarios))
+    else:
+        scenario_prices = list(map(_price_scenario, scenarios))
+
+    price = scenario_prices[0]
+    (spot_down, spot_up), (sigma_down, sigma_up), (time_down, time_up), (rate_down, rate_up), (yield_down, yield_up) = \
+        zip(scenario_prices[1::2], scenario_prices[2::2])
+
+    return GreeksResult(
+        price,
+        (spot_up - spot_down) / (2 * spot_bump),
+        (spot_up - 2 * price + spot_down) / (spot_bump * spot_bump),
+        (sigma_up - sigma_down) / (2 * sigma_bump),
+        -(time_up - time_down) / (2 * time_bump),
+        (rate_up - rate_down) / (2 * rate_bump),
+        (yield_up - yield_down) / (2 * yield_bump) )
@@ -1,10 +1,16 @@
 import pytest, numpy
+import gbm
 from random import seed, gauss
-from math import exp
-from model import Model, ModelType, NumericalMethod
+from math import exp, log, sqrt
+from scipy.stats import norm
+from model import Model, ModelType, NumericalMethod, VarianceReduction, DrawMethod, PDEGrid, TreeMethod, AmericanApproximation
 from option_enum import OptionType, PutOrCall, BarrierTypeUpOrDown, BarrierTypeInOrOut
 from option import Option
 from option_util import add_all_evaluation_methods
+from gbm import euro_black_scholes_merton_batch, euro_black_scholes_merton_greeks, euro_black_scholes_merton_greeks_batch, barrier_reiner_rubinstein_greeks, barrier_reiner_rubinstein_greeks_batch, american_bjerksund_stensland_batch, american_barone_adesi_whaley_batch, barrier_reiner_rubinstein_batch, gbm_binomial_tree_batch, gbm_binomial_tree_result, gbm_binomial_tree_strikes
+from monte_carlo import monte_carlo_result
+from sensitivity import bump_and_reprice_greeks
+from pde import pde_batch, pde_result
 
 
 # Verify closed form against book
@@ -39,6 +45,73 @@ def test_gbm_euro_closed_form(spot_price, strike, risk_free_rate, yield_rate, si
     assert abs(test_put_price - put_price) / put_price < 1e-4
 
 
+# Verify vectorized closed form against the single-contract closed form
+def test_gbm_euro_closed_form_batch():
+    spot_prices = numpy.array([60, 100, 100, 60, 100, 100])
+    strikes = numpy.array([65, 120, 80, 65, 120, 80])
+    risk_free_rates = numpy.array([0.08, 0.08, 0.08, 0.08, 0.08, 0.08])
+    yield_rates = numpy.array([0.01, 0.01, 0.02, 0.01, 0.01, 0.02])
+    sigmas = numpy.array([0.2, 0.3, 0.33, 0.2, 0.3, 0.33])
+    times_to_expiration = numpy.array([0.25, 1, 2, 0.25, 1, 2])
+    put_or_calls = [PutOrCall.PUT, PutOrCall.PUT, PutOrCall.PUT, PutOrCall.CALL, PutOrCall.CALL, PutOrCall.CALL]
+
+    test_batch = euro_black_scholes_merton_batch(spot_prices, strikes, times_to_expiration, risk_free_rates, yield_rates, sigmas, put_or_calls)
+
+    for idx in range(len(spot_prices)):
+        model = Model(
+            model_type = ModelType.GBM,
+            numerical_method = NumericalMethod.CLOSED_FORM,
+            risk_free_rate = risk_free_rates[idx],
+            yield_rate = yield_rates[idx],
+            sigma = sigmas[idx] )
+
+        option = Option(
+            model=model,
+            option_type = OptionType.EUROPEAN,
+            put_or_call = put_or_calls[idx],
+            spot_value = spot_prices[idx],
+            strike = strikes[idx],
+            time_to_expiration = times_to_expiration[idx] )
+        add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+        assert abs(test_batch[idx] - option.price()) < 1e-10
+
+
+# Verify the batched binomial tree against single-contract trees, for a mix of European and American options
+def test_gbm_binomial_tree_batch():
+    spot_prices = numpy.array([60, 100, 100, 60, 100, 100])
+    strikes = numpy.array([65, 120, 80, 65, 120, 80])
+    risk_free_rates = numpy.array([0.08, 0.08, 0.08, 0.08, 0.08, 0.08])
+    yield_rates = numpy.array([0.01, 0.01, 0.02, 0.01, 0.01, 0.02])
+    sigmas = numpy.array([0.2, 0.3, 0.33, 0.2, 0.3, 0.33])
+    times_to_expiration = numpy.array([0.25, 1, 2, 0.25, 1, 2])
+    put_or_calls = [PutOrCall.PUT, PutOrCall.PUT, PutOrCall.CALL, PutOrCall.CALL, PutOrCall.CALL, PutOrCall.PUT]
+    option_types = [OptionType.AMERICAN, OptionType.EUROPEAN, OptionType.AMERICAN, OptionType.EUROPEAN, OptionType.AMERICAN, OptionType.AMERICAN]
+    n_time_steps = 200
+
+    test_batch = gbm_binomial_tree_batch(spot_prices, strikes, times_to_expiration, risk_free_rates, yield_rates, sigmas, put_or_calls, option_types, n_time_steps)
+
+    for idx in range(len(spot_prices)):
+        model = Model(
+            model_type = ModelType.GBM,
+            numerical_method = NumericalMethod.TREE,
+            risk_free_rate = risk_free_rates[idx],
+            yield_rate = yield_rates[idx],
+            sigma = sigmas[idx] )
+        model.n_time_steps = n_time_steps
+
+        option = Option(
+            model=model,
+            option_type = option_types[idx],
+            put_or_call = put_or_calls[idx],
+            spot_value = spot_prices[idx],
+            strike = strikes[idx],
+            time_to_expiration = times_to_expiration[idx] )
+        add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+        assert abs(test_batch[idx] - option.price()) < 1e-10
+
+
 # Use closed form to verify binomial
 @pytest.mark.parametrize(('put_or_call', 'spot_price', 'strike', 'risk_free_rate', 'yield_rate', 'sigma', 'time_to_expiration'), (
     ('put', 60, 65, 0.08, 0.01, 0.2, 0.25),
@@ -116,6 +189,289 @@ def test_gbm_euro_monte_carlo(put_or_call, spot_price, strike, risk_free_rate, y
     assert abs(test_monte_carlo-test_closed_form)/test_closed_form < 2e-3
 
 
+# On the same draws, "in" plus "out" barrier Monte Carlo prices must equal the European Monte Carlo price
+@pytest.mark.parametrize(('put_or_call', 'up_or_down', 'barrier'), (
+    (PutOrCall.PUT, BarrierTypeUpOrDown.UP, 65),
+    (PutOrCall.PUT, BarrierTypeUpOrDown.DOWN, 55),
+    (PutOrCall.CALL, BarrierTypeUpOrDown.UP, 65),
+    (PutOrCall.CALL, BarrierTypeUpOrDown.DOWN, 55),
+))
+def test_gbm_barrier_monte_carlo_in_out_parity(put_or_call, up_or_down, barrier):
+    model = Model(
+        model_type = ModelType.GBM,
+        numerical_method = NumericalMethod.MONTE_CARLO,
+        risk_free_rate = 0.08,
+        yield_rate = 0.01,
+        sigma = 0.2 )
+    model.random_draws = numpy.random.default_rng(12345).standard_normal((20000, 50))
+
+    option = Option(
+        model=model,
+        option_type = OptionType.BARRIER,
+        put_or_call = put_or_call,
+        spot_value = 60,
+        strike = 60,
+        time_to_expiration = 0.25,
+        barrier = barrier )
+    add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+    option.barrier_type = (up_or_down, BarrierTypeInOrOut.IN)
+    test_in = option.price()
+    option.barrier_type = (up_or_down, BarrierTypeInOrOut.OUT)
+    test_out = option.price()
+
+    # The European payoff only depends on the terminal value, i.e. the sum of all the draws of a path
+    model.random_draws = model.random_draws.sum(axis=1, keepdims=True) / numpy.sqrt(model.random_draws.shape[1])
+    option.option_type = OptionType.EUROPEAN
+    test_euro = option.price()
+
+    assert abs(test_in + test_out - test_euro) < 1e-10
+
+
+# Verify seeded, chunked Monte Carlo against closed form, and that it is reproducible and independent of chunk size
+@pytest.mark.parametrize(('put_or_call', 'spot_price', 'strike', 'risk_free_rate', 'yield_rate', 'sigma', 'time_to_expiration'), (
+    (PutOrCall.PUT, 100, 120, 0.08, 0.01, 0.3, 1),
+    (PutOrCall.CALL, 100, 80, 0.08, 0.02, 0.33, 2),
+))
+def test_gbm_euro_monte_carlo_seeded(put_or_call, spot_price, strike, risk_free_rate, yield_rate, sigma, time_to_expiration):
+    model = Model(
+        model_type = ModelType.GBM,
+        risk_free_rate = risk_free_rate,
+        yield_rate = yield_rate,
+        sigma = sigma )
+
+    option = Option(
+        model=model,
+        option_type = OptionType.EUROPEAN,
+        put_or_call = put_or_call,
+        spot_value = spot_price,
+        strike = strike,
+        time_to_expiration = time_to_expiration )
+    add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+    model.numerical_method = NumericalMethod.CLOSED_FORM
+    test_closed_form = option.price()
+
+    model.numerical_method = NumericalMethod.MONTE_CARLO
+    model.n_paths = 200000
+    model.seed = 2024
+    model.chunk_size = 30000
+    test_result = monte_carlo_result(model, option)
+    assert test_result.n_paths == 200000
+    assert abs(test_result.price - test_closed_form) < 4 * test_result.standard_error
+    assert option.price() == test_result.price
+
+    model.chunk_size = 70000
+    assert abs(option.price() - test_result.price) < 1e-10
+
+
+# Verify variance reduction modes: prices agree with plain Monte Carlo, and the standard error does not get worse
+@pytest.mark.parametrize(('option_type', 'variance_reduction'), (
+    (OptionType.EUROPEAN, VarianceReduction.ANTITHETIC),
+    (OptionType.EUROPEAN, VarianceReduction.CONTROL_VARIATE),
+    (OptionType.EUROPEAN, VarianceReduction.MOMENT_MATCHING),
+    (OptionType.BARRIER, VarianceReduction.ANTITHETIC),
+    (OptionType.BARRIER, VarianceReduction.CONTROL_VARIATE),
+    (OptionType.BARRIER, VarianceReduction.MOMENT_MATCHING),
+))
+def test_gbm_monte_carlo_variance_reduction(option_type, variance_reduction):
+    model = Model(
+        model_type = ModelType.GBM,
+        numerical_method = NumericalMethod.MONTE_CARLO,
+        risk_free_rate = 0.08,
+        yield_rate = 0.01,
+        sigma = 0.3,
+        n_time_steps = 50,
+        n_paths = 100000,
+        seed = 777 )
+
+    option = Option(
+        model=model,
+        option_type = option_type,
+        put_or_call = PutOrCall.CALL,
+        spot_value = 100,
+        strike = 100,
+        time_to_expiration = 1,
+        barrier = 80,
+        barrier_type = (BarrierTypeUpOrDown.DOWN, BarrierTypeInOrOut.OUT) )
+    add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+    plain_result = monte_carlo_result(model, option)
+    model.variance_reduction = variance_reduction
+    test_result = monte_carlo_result(model, option)
+
+    assert test_result.n_paths == plain_result.n_paths
+    assert test_result.standard_error <= 1.01 * plain_result.standard_error
+    assert abs(test_result.price - plain_result.price) < 4 * plain_result.standard_error
+    if option_type == OptionType.EUROPEAN and variance_reduction == VarianceReduction.CONTROL_VARIATE:
+        # The European payoff is its own control, so the closed form comes back exactly
+        model.numerical_method = NumericalMethod.CLOSED_FORM
+        assert abs(test_result.price - option.price()) < 1e-8
+
+
+# Verify Sobol quasi-Monte Carlo against closed form, with a smaller standard error than pseudo-random draws
+@pytest.mark.parametrize(('option_type', 'put_or_call'), (
+    (OptionType.EUROPEAN, PutOrCall.PUT),
+    (OptionType.EUROPEAN, PutOrCall.CALL),
+    (OptionType.BARRIER, PutOrCall.PUT),
+    (OptionType.BARRIER, PutOrCall.CALL),
+))
+def test_gbm_monte_carlo_sobol(option_type, put_or_call):
+    model = Model(
+        model_type = ModelType.GBM,
+        numerical_method = NumericalMethod.MONTE_CARLO,
+        risk_free_rate = 0.08,
+        yield_rate = 0.01,
+        sigma = 0.3,
+        n_time_steps = 32,
+        n_paths = 2**15,
+        seed = 99 )
+
+    option = Option(
+        model=model,
+        option_type = option_type,
+        put_or_call = put_or_call,
+        spot_value = 100,
+        strike = 100,
+        time_to_expiration = 1,
+        barrier = 120,
+        barrier_type = (BarrierTypeUpOrDown.UP, BarrierTypeInOrOut.IN) )
+    add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+    pseudo_random_result = monte_carlo_result(model, option)
+    model.draw_method = DrawMethod.SOBOL
+    test_result = monte_carlo_result(model, option)
+
+    assert test_result.n_paths == 2**15
+    assert test_result.standard_error < pseudo_random_result.standard_error / 3
+    assert abs(test_result.price - pseudo_random_result.price) < 4 * pseudo_random_result.standard_error
+    if option_type == OptionType.EUROPEAN:
+        model.numerical_method = NumericalMethod.CLOSED_FORM
+        assert abs(test_result.price - option.price()) < 4 * test_result.standard_error
+
+    # Each replicate rounds its share of the path budget down to a power of 2, so the budget is never exceeded
+    model.n_paths = 10000
+    assert monte_carlo_result(model, option).n_paths == 8 * 1024
+
+
+# Verify multi-process Monte Carlo is reproducible for a seed and worker count, and splits given draws exactly
+def test_gbm_monte_carlo_workers():
+    model = Model(
+        model_type = ModelType.GBM,
+        numerical_method = NumericalMethod.MONTE_CARLO,
+        risk_free_rate = 0.08,
+        yield_rate = 0.01,
+        sigma = 0.3,
+        n_time_steps = 20,
+        n_paths = 50000,
+        seed = 4321 )
+
+    option = Option(
+        model=model,
+        option_type = OptionType.BARRIER,
+        put_or_call = PutOrCall.PUT,
+        spot_value = 100,
+        strike = 100,
+        time_to_expiration = 1,
+        barrier = 120,
+        barrier_type = (BarrierTypeUpOrDown.UP, BarrierTypeInOrOut.OUT) )
+    add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+    single_result = monte_carlo_result(model, option)
+    model.n_workers = 2
+    test_result = monte_carlo_result(model, option)
+    assert test_result.n_paths == 50000
+    assert monte_carlo_result(model, option).price == test_result.price
+    assert abs(test_result.price - single_result.price) < 4 * single_result.standard_error
+
+    model.random_draws = numpy.random.default_rng(4321).standard_normal((10000, 20))
+    split_price = option.price()
+    model.n_workers = 1
+    assert abs(option.price() - split_price) < 1e-10
+
+
+# Verify adaptive Monte Carlo stops once the target standard error is reached, and otherwise uses the path budget
+@pytest.mark.parametrize(('draw_method', 'n_workers'), (
+    (DrawMethod.PSEUDO_RANDOM, 1),
+    (DrawMethod.PSEUDO_RANDOM, 2),
+    (DrawMethod.SOBOL, 1),
+))
+def test_gbm_monte_carlo_adaptive(draw_method, n_workers):
+    model = Model(
+        model_type = ModelType.GBM,
+        numerical_method = NumericalMethod.MONTE_CARLO,
+        risk_free_rate = 0.08,
+        yield_rate = 0.01,
+        sigma = 0.3,
+        n_paths = 1000000,
+        seed = 2468,
+        chunk_size = 4096,
+        draw_method = draw_method,
+        n_workers = n_workers )
+
+    option = Option(
+        model=model,
+        option_type = OptionType.EUROPEAN,
+        put_or_call = PutOrCall.CALL,
+        spot_value = 100,
+        strike = 110,
+        time_to_expiration = 1 )
+    add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+    model.numerical_method = NumericalMethod.CLOSED_FORM
+    test_closed_form = option.price()
+
+    model.target_standard_error = 0.05
+    test_result = monte_carlo_result(model, option)
+    assert test_result.standard_error <= 0.05
+    assert test_result.n_paths < 1000000
+    assert abs(test_result.price - test_closed_form) < 4 * test_result.standard_error
+
+    model.target_standard_error = None
+    model.target_relative_error = 1e-6
+    model.n_paths = 20000
+    test_result = monte_carlo_result(model, option)
+    assert 20000 - model.n_qmc_replicates < test_result.n_paths <= 20000
+    assert test_result.standard_error > 1e-6 * test_result.price
+
+    # A budget below one chunk per worker (or replicate) is still respected
+    model.n_paths = 1000
+    test_result = monte_carlo_result(model, option)
+    assert 1000 - model.n_qmc_replicates < test_result.n_paths <= 1000
+
+
+# Verify adaptive Monte Carlo with antithetic draws spends every row of random_draws, a pair of paths each,
+#   as the fixed path budget does
+@pytest.mark.parametrize('n_workers', (1, 2))
+def test_gbm_monte_carlo_adaptive_antithetic_draws(n_workers):
+    model = Model(
+        model_type = ModelType.GBM,
+        numerical_method = NumericalMethod.MONTE_CARLO,
+        risk_free_rate = 0.08,
+        yield_rate = 0.01,
+        sigma = 0.3,
+        random_draws = numpy.random.default_rng(1357).standard_normal((10000, 1)),
+        chunk_size = 4096,
+        variance_reduction = VarianceReduction.ANTITHETIC,
+        n_workers = n_workers )
+
+    option = Option(
+        model=model,
+        option_type = OptionType.EUROPEAN,
+        put_or_call = PutOrCall.CALL,
+        spot_value = 100,
+        strike = 110,
+        time_to_expiration = 1 )
+    add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+    fixed_result = monte_carlo_result(model, option)
+    model.target_relative_error = 1e-6
+    test_result = monte_carlo_result(model, option)
+    assert fixed_result.n_paths == 20000
+    assert test_result.n_paths == 20000
+    assert abs(test_result.price - fixed_result.price) < 1e-10
+
+
 # Use closed form to verify PDE
 @pytest.mark.parametrize(('put_or_call', 'spot_price', 'strike', 'risk_free_rate', 'yield_rate', 'sigma', 'time_to_expiration'), (
     ('put', 60, 65, 0.08, 0.01, 0.2, 0.25),
@@ -152,6 +508,94 @@ def test_gbm_euro_pde(put_or_call, spot_price, strike, risk_free_rate, yield_rat
     assert abs(test_pde-test_closed_form)/test_closed_form < 1e-3
 
 
+# Verify batched PDE over a mixed chain against pricing each option on its own
+def test_gbm_pde_batch():
+    model = Model(
+        model_type = ModelType.GBM,
+        numerical_method = NumericalMethod.PDE,
+        risk_free_rate = 0.08,
+        yield_rate = 0.01,
+        sigma = 0.2 )
+    model.n_time_steps = 200
+    model.n_price_steps = 201
+
+    options = []
+    for option_type in OptionType:
+        for put_or_call in PutOrCall:
+            for strike in (55, 60, 66):
+                for barrier_type, barrier in (((BarrierTypeUpOrDown.UP, BarrierTypeInOrOut.IN), 65), ((BarrierTypeUpOrDown.DOWN, BarrierTypeInOrOut.OUT), 55)):
+                    option = Option(
+                        model=model,
+                        option_type = option_type,
+                        put_or_call = put_or_call,
+                        spot_value = 60,
+                        strike = strike,
+                        time_to_expiration = 0.25,
+                        barrier = barrier,
+                        barrier_type = barrier_type )
+                    add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+                    options.append(option)
+
+    test_batch = pde_batch(model, options)
+
+    assert len(test_batch) == len(options)
+    for option, test_price in zip(options, test_batch):
+        assert abs(test_price - option.price()) < 1e-10
+
+
+# Verify the spot ladder and grid Greeks from one tree or PDE solve against the Black-Scholes-Merton Greeks
+@pytest.mark.parametrize(('numerical_method', 'put_or_call'), (
+    (NumericalMethod.TREE, PutOrCall.PUT),
+    (NumericalMethod.TREE, PutOrCall.CALL),
+    (NumericalMethod.PDE, PutOrCall.PUT),
+    (NumericalMethod.PDE, PutOrCall.CALL),
+))
+def test_gbm_euro_grid_greeks(numerical_method, put_or_call):
+    spot_price, strike, risk_free_rate, yield_rate, sigma, time_to_expiration = 100, 100, 0.08, 0.01, 0.3, 1
+    model = Model(
+        model_type = ModelType.GBM,
+        risk_free_rate = risk_free_rate,
+        yield_rate = yield_rate,
+        sigma = sigma )
+    model.n_time_steps = 500
+    model.n_price_steps = 501
+
+    option = Option(
+        model=model,
+        option_type = OptionType.EUROPEAN,
+        put_or_call = put_or_call,
+        spot_value = spot_price,
+        strike = strike,
+        time_to_expiration = time_to_expiration )
+    add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+    phi = 1 if put_or_call == PutOrCall.CALL else -1
+    sig_sqrt_t = sigma * sqrt(time_to_expiration)
+    d1 = (log(spot_price/strike) + (risk_free_rate-yield_rate+sigma*sigma/2)*time_to_expiration) / sig_sqrt_t
+    d2 = d1 - sig_sqrt_t
+    delta = phi * exp(-yield_rate*time_to_expiration) * norm.cdf(phi*d1)
+    gamma = exp(-yield_rate*time_to_expiration) * norm.pdf(d1) / (spot_price * sig_sqrt_t)
+    theta = -spot_price * exp(-yield_rate*time_to_expiration) * norm.pdf(d1) * sigma / (2 * sqrt(time_to_expiration))
+    theta += phi * yield_rate * spot_price * exp(-yield_rate*time_to_expiration) * norm.cdf(phi*d1)
+    theta -= phi * risk_free_rate * strike * exp(-risk_free_rate*time_to_expiration) * norm.cdf(phi*d2)
+
+    if numerical_method == NumericalMethod.TREE:
+        test_result = gbm_binomial_tree_result(model, option)
+        model.numerical_method = NumericalMethod.TREE
+    else:
+        test_result = pde_result(model, option)
+        model.numerical_method = NumericalMethod.PDE
+    assert abs(test_result.price - option.price()) < 1e-10
+    assert abs(test_result.delta - delta) < 1e-3
+    assert abs(test_result.gamma - gamma) / gamma < 1e-2
+    assert abs(test_result.theta - theta) / abs(theta) < 1e-2
+
+    model.numerical_method = NumericalMethod.CLOSED_FORM
+    for ladder_spot in (99, 101):
+        option.spot_value = ladder_spot
+        assert abs(test_result.price_at(ladder_spot) - option.price()) / option.price() < 2e-3
+
+
 # Verify American binomial and pde against each other
 @pytest.mark.parametrize(('put_or_call', 'spot_price', 'strike', 'risk_free_rate', 'yield_rate', 'sigma', 'time_to_expiration'), (
     ('put', 60, 65, 0.08, 0.01, 0.2, 0.25),
@@ -306,8 +750,7 @@ def __test_gbm_barrier_monte_carlo(put_or_call, spot_price, strike, risk_free_ra
     assert abs(test_monte_carlo-test_closed_form)/test_closed_form < 1e-3
 
 
-# Verify barrier PDE against closed form
-# TODO: figure out what's wrong with barrier PDE pricing and then re-enable
+# Verify barrier PDE against closed form; the "in" prices are small, so the tolerance is absolute
 @pytest.mark.parametrize(('put_or_call', 'spot_price', 'strike', 'risk_free_rate', 'yield_rate', 'sigma', 'time_to_expiration', 'barrier_type', 'barrier'), (
     (PutOrCall.PUT, 60, 60, 0.08, 0.01, 0.2, 0.25, (BarrierTypeUpOrDown.UP,BarrierTypeInOrOut.IN), 65),
     (PutOrCall.PUT, 60, 60, 0.08, 0.01, 0.2, 0.25, (BarrierTypeUpOrDown.UP,BarrierTypeInOrOut.OUT), 65),
@@ -318,7 +761,7 @@ def __test_gbm_barrier_monte_carlo(put_or_call, spot_price, strike, risk_free_ra
     (PutOrCall.CALL, 60, 60, 0.08, 0.01, 0.2, 0.25, (BarrierTypeUpOrDown.DOWN,BarrierTypeInOrOut.IN), 55),
     (PutOrCall.CALL, 60, 60, 0.08, 0.01, 0.2, 0.25, (BarrierTypeUpOrDown.DOWN,BarrierTypeInOrOut.OUT), 55),
 ))
-def __test_gbm_barrier_pde(put_or_call, spot_price, strike, risk_free_rate, yield_rate, sigma, time_to_expiration, barrier_type, barrier):
+def test_gbm_barrier_pde(put_or_call, spot_price, strike, risk_free_rate, yield_rate, sigma, time_to_expiration, barrier_type, barrier):
     model = Model(
         model_type = ModelType.GBM,
         risk_free_rate = risk_free_rate,
@@ -344,5 +787,668 @@ def __test_gbm_barrier_pde(put_or_call, spot_price, strike, risk_free_rate, yiel
     model.n_price_steps = 501
     test_pde = option.price()
 
-    assert abs(test_pde-test_closed_form)/test_closed_form < 1e-3
+    assert abs(test_pde-test_closed_form) < 1e-3
+
+
+
+# Verify the sinh-stretched PDE grid against closed form with few price nodes, including a node on the barrier
+# An "out" barrier is the boundary of its own grid, an "in" barrier an interior node of the European grid
+@pytest.mark.parametrize(('option_type', 'put_or_call', 'barrier_type', 'barrier', 'tolerance'), (
+    (OptionType.EUROPEAN, PutOrCall.CALL, (BarrierTypeUpOrDown.UP, BarrierTypeInOrOut.IN), 0, 5e-3),
+    (OptionType.EUROPEAN, PutOrCall.PUT, (BarrierTypeUpOrDown.UP, BarrierTypeInOrOut.IN), 0, 5e-3),
+    (OptionType.BARRIER, PutOrCall.CALL, (BarrierTypeUpOrDown.UP, BarrierTypeInOrOut.OUT), 120, 5e-3),
+    (OptionType.BARRIER, PutOrCall.PUT, (BarrierTypeUpOrDown.DOWN, BarrierTypeInOrOut.OUT), 90, 5e-3),
+    (OptionType.BARRIER, PutOrCall.CALL, (BarrierTypeUpOrDown.UP, BarrierTypeInOrOut.IN), 120, 5e-3),
+    (OptionType.BARRIER, PutOrCall.PUT, (BarrierTypeUpOrDown.DOWN, BarrierTypeInOrOut.IN), 90, 5e-3),
+))
+def test_gbm_pde_sinh_grid(option_type, put_or_call, barrier_type, barrier, tolerance):
+    model = Model(
+        model_type = ModelType.GBM,
+        risk_free_rate = 0.05,
+        yield_rate = 0.02,
+        sigma = 0.25 )
+    model.n_time_steps = 500
+    model.n_price_steps = 100
+
+    option = Option(
+        model=model,
+        option_type = option_type,
+        put_or_call = put_or_call,
+        spot_value = 100,
+        strike = 105,
+        time_to_expiration = 1,
+        barrier = barrier,
+        barrier_type = barrier_type )
+    add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+    model.numerical_method = NumericalMethod.CLOSED_FORM
+    test_closed_form = option.price()
+    model.numerical_method = NumericalMethod.PDE
+    model.pde_grid = PDEGrid.SINH
+    test_pde = option.price()
+    assert abs(test_pde - test_closed_form) < tolerance
+
+
+# Verify barrier PDE prices converge under grid refinement on both grids, for "in" barriers and for barriers
+#   sharing a batch with European and American options and with other barriers
+@pytest.mark.parametrize('pde_grid', (PDEGrid.UNIFORM, PDEGrid.SINH))
+def test_gbm_pde_barrier_batch_convergence(pde_grid):
+    model = Model(
+        model_type = ModelType.GBM,
+        risk_free_rate = 0.08,
+        yield_rate = 0.04,
+        sigma = 0.25,
+        pde_grid = pde_grid,
+        n_rannacher_steps = 2 )
+
+    options = []
+    for option_type, put_or_call, strike, barrier_type, barrier in (
+            (OptionType.BARRIER, PutOrCall.CALL, 100, (BarrierTypeUpOrDown.DOWN, BarrierTypeInOrOut.IN), 95),
+            (OptionType.BARRIER, PutOrCall.CALL, 100, (BarrierTypeUpOrDown.DOWN, BarrierTypeInOrOut.OUT), 95),
+            (OptionType.BARRIER, PutOrCall.PUT, 100, (BarrierTypeUpOrDown.UP, BarrierTypeInOrOut.IN), 105),
+            (OptionType.BARRIER, PutOrCall.PUT, 90, (BarrierTypeUpOrDown.UP, BarrierTypeInOrOut.OUT), 110),
+            (OptionType.EUROPEAN, PutOrCall.PUT, 100, (BarrierTypeUpOrDown.UP, BarrierTypeInOrOut.IN), 0),
+            (OptionType.AMERICAN, PutOrCall.PUT, 100, (BarrierTypeUpOrDown.UP, BarrierTypeInOrOut.IN), 0)):
+        option = Option(
+            model=model,
+            option_type = option_type,
+            put_or_call = put_or_call,
+            spot_value = 100,
+            strike = strike,
+            time_to_expiration = 0.5,
+            barrier = barrier,
+            barrier_type = barrier_type )
+        add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+        options.append(option)
+
+    model.numerical_method = NumericalMethod.PDE
+    errors = []
+    for n_steps in (101, 201, 401):
+        model.n_time_steps = n_steps
+        model.n_price_steps = n_steps
+        test_batch = pde_batch(model, options)
+        # Each option prices alone as in the batch, up to the sinh grid clustering at the batch's median strike
+        for option, test_price in zip(options, test_batch):
+            assert abs(option.price() - test_price) < 1e-3
+        model.numerical_method = NumericalMethod.CLOSED_FORM
+        errors.append([abs(test_price - option.price()) for option, test_price in zip(options[:-1], test_batch)])
+        model.numerical_method = NumericalMethod.PDE
+
+    errors = numpy.array(errors)
+    assert numpy.all(errors[1:] < errors[:-1] + 1e-5)
+    assert numpy.all(errors[-1] < (1e-2 if pde_grid == PDEGrid.UNIFORM else 5e-4))
+
+    # The grid result of an "in" barrier is extrapolated as its price, with the delta of the closed form
+    model.richardson_extrapolation = True
+    test_result = pde_result(model, options[0])
+    assert abs(test_result.price - options[0].price()) < 1e-12
+    model.numerical_method = NumericalMethod.CLOSED_FORM
+    options[0].spot_value = 100.01
+    closed_form_up = options[0].price()
+    options[0].spot_value = 99.99
+    closed_form_down = options[0].price()
+    options[0].spot_value = 100
+    assert abs(test_result.delta - (closed_form_up - closed_form_down) / 0.02) < 1e-3
+
+
+# Verify Rannacher start-up and Richardson extrapolation reach 1e-4 against closed form with few time steps
+@pytest.mark.parametrize(('put_or_call', 'strike'), (
+    (PutOrCall.PUT, 100),
+    (PutOrCall.CALL, 100),
+    (PutOrCall.CALL, 110),
+))
+def test_gbm_pde_rannacher_richardson(put_or_call, strike):
+    model = Model(
+        model_type = ModelType.GBM,
+        risk_free_rate = 0.05,
+        yield_rate = 0.02,
+        sigma = 0.25,
+        pde_grid = PDEGrid.SINH,
+        n_rannacher_steps = 2,
+        richardson_extrapolation = True )
+    model.n_time_steps = 25
+    model.n_price_steps = 101
+
+    option = Option(
+        model=model,
+        option_type = OptionType.EUROPEAN,
+        put_or_call = put_or_call,
+        spot_value = 100,
+        strike = strike,
+        time_to_expiration = 1 )
+    add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+    model.numerical_method = NumericalMethod.CLOSED_FORM
+    test_closed_form = option.price()
+    model.numerical_method = NumericalMethod.PDE
+    test_pde = option.price()
+    assert abs(test_pde - test_closed_form) < 1e-4
+
+    # The grid result is extrapolated too, so it agrees with the price
+    test_result = pde_result(model, option)
+    model.richardson_extrapolation = False
+    plain_result = pde_result(model, option)
+    analytic_greeks = euro_black_scholes_merton_greeks(model, option)
+    assert abs(test_result.price - test_pde) < 1e-12
+    assert abs(test_result.delta - analytic_greeks.delta) < 2e-4
+    assert abs(test_result.theta - analytic_greeks.theta) < abs(plain_result.theta - analytic_greeks.theta)
+
+
+# Verify Richardson extrapolation leaves the uniform grid alone: refining it moves an off-node strike relative
+#   to the nodes, so extrapolating would make the price worse, not better
+@pytest.mark.parametrize(('strike', 'n_time_steps', 'tolerance'), (
+    (95, 50, 5e-2),
+    (107, 50, 5e-2),
+    (95, 100, 2e-2),
+    (107, 100, 2e-2),
+))
+def test_gbm_pde_uniform_richardson(strike, n_time_steps, tolerance):
+    model = Model(
+        model_type = ModelType.GBM,
+        risk_free_rate = 0.05,
+        yield_rate = 0.02,
+        sigma = 0.25,
+        n_rannacher_steps = 2 )
+    model.n_time_steps = n_time_steps
+    model.n_price_steps = n_time_steps + 1
+
+    option = Option(
+        model=model,
+        option_type = OptionType.EUROPEAN,
+        put_or_call = PutOrCall.CALL,
+        spot_value = 100,
+        strike = strike,
+        time_to_expiration = 1 )
+    add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+    model.numerical_method = NumericalMethod.CLOSED_FORM
+    test_closed_form = option.price()
+    model.numerical_method = NumericalMethod.PDE
+    plain_pde = option.price()
+    model.richardson_extrapolation = True
+    test_pde = option.price()
+    assert test_pde == plain_pde
+    assert abs(test_pde - test_closed_form) < tolerance
+    assert pde_result(model, option).price == plain_pde
+
+
+# Verify the projected (Brennan-Schwartz) American PDE converges with few time steps on the sinh grid with
+#   Rannacher start-up; the uniform grid ties its spacing to the time step and needs several hundred steps
+@pytest.mark.parametrize(('put_or_call', 'strike', 'yield_rate'), (
+    (PutOrCall.PUT, 100, 0.0),
+    (PutOrCall.PUT, 110, 0.02),
+    (PutOrCall.CALL, 100, 0.08),
+))
+def test_gbm_amer_pde_projected(put_or_call, strike, yield_rate):
+    model = Model(
+        model_type = ModelType.GBM,
+        risk_free_rate = 0.06,
+        yield_rate = yield_rate,
+        sigma = 0.3,
+        pde_grid = PDEGrid.SINH,
+        n_rannacher_steps = 2 )
+
+    option = Option(
+        model=model,
+        option_type = OptionType.AMERICAN,
+        put_or_call = put_or_call,
+        spot_value = 100,
+        strike = strike,
+        time_to_expiration = 1 )
+    add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+    model.numerical_method = NumericalMethod.TREE
+    model.n_time_steps = 2000
+    test_binomial = option.price()
+
+    model.numerical_method = NumericalMethod.PDE
+    model.n_price_steps = 201
+    for pde_grid, n_rannacher_steps, n_time_steps, tolerance in (
+            (PDEGrid.SINH, 2, 50, 1e-3),
+            (PDEGrid.SINH, 2, 100, 5e-4),
+            (PDEGrid.UNIFORM, 0, 400, 2e-3)):
+        model.pde_grid = pde_grid
+        model.n_rannacher_steps = n_rannacher_steps
+        model.n_time_steps = n_time_steps
+        test_pde = option.price()
+        assert abs(test_pde-test_binomial)/test_binomial < tolerance
+
+
+# Verify the smoothed trees (BBS and BBSR) against a long CRR tree, and the batch tree against the single tree
+@pytest.mark.parametrize(('put_or_call', 'strike', 'yield_rate'), (
+    (PutOrCall.PUT, 100, 0.0),
+    (PutOrCall.PUT, 110, 0.02),
+    (PutOrCall.CALL, 100, 0.08),
+))
+def test_gbm_amer_binomial_smoothed(put_or_call, strike, yield_rate):
+    model = Model(
+        model_type = ModelType.GBM,
+        numerical_method = NumericalMethod.TREE,
+        risk_free_rate = 0.06,
+        yield_rate = yield_rate,
+        sigma = 0.3 )
+
+    option = Option(
+        model=model,
+        option_type = OptionType.AMERICAN,
+        put_or_call = put_or_call,
+        spot_value = 100,
+        strike = strike,
+        time_to_expiration = 1 )
+    add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+    # Average two consecutive step counts to damp the CRR odd-even oscillation
+    model.n_time_steps = 5000
+    test_crr = option.price()
+    model.n_time_steps = 5001
+    test_crr = (test_crr + option.price()) / 2
+
+    model.n_time_steps = 200
+    for tree_method, tolerance in ((TreeMethod.BBS, 1e-3), (TreeMethod.BBSR, 2e-4)):
+        model.tree_method = tree_method
+        test_smoothed = option.price()
+        assert abs(test_smoothed-test_crr)/test_crr < tolerance
+
+        test_batch = gbm_binomial_tree_batch(100, strike, 1, 0.06, yield_rate, 0.3, put_or_call, OptionType.AMERICAN, 200, tree_method)
+        assert abs(test_batch - test_smoothed) < 1e-10
+
+
+# Verify a strike chain priced on one shared lattice against single-contract trees
+@pytest.mark.parametrize('option_type', (OptionType.EUROPEAN, OptionType.AMERICAN))
+def test_gbm_binomial_tree_strikes(option_type):
+    model = Model(
+        model_type = ModelType.GBM,
+        numerical_method = NumericalMethod.TREE,
+        risk_free_rate = 0.06,
+        yield_rate = 0.02,
+        sigma = 0.3 )
+    model.n_time_steps = 300
+
+    option = Option(
+        model=model,
+        option_type = option_type,
+        put_or_call = PutOrCall.PUT,
+        spot_value = 100,
+        time_to_expiration = 1 )
+    add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+    strikes = numpy.array([80, 90, 100, 110, 120, 80, 100, 120])
+    put_or_calls = [PutOrCall.PUT] * 5 + [PutOrCall.CALL] * 3
+    for tree_method in TreeMethod:
+        model.tree_method = tree_method
+        test_chain = gbm_binomial_tree_strikes(model, option, strikes, put_or_calls)
+
+        assert len(test_chain) == len(strikes)
+        for strike, put_or_call, test_price in zip(strikes, put_or_calls, test_chain):
+            option.strike = strike
+            option.put_or_call = put_or_call
+            assert abs(test_price - option.price()) < 1e-10
+
+
+# Verify the trinomial barrier tree against Haug p. 154, with a node layer on the barrier and a cash rebate
+@pytest.mark.parametrize(('put_or_call', 'barrier_type', 'strike', 'barrier', 'haug_price'), (
+    (PutOrCall.CALL, (BarrierTypeUpOrDown.DOWN,BarrierTypeInOrOut.OUT), 100, 95, 6.7924),
+    (PutOrCall.CALL, (BarrierTypeUpOrDown.UP,BarrierTypeInOrOut.OUT), 90, 105, 2.6789),
+    (PutOrCall.CALL, (BarrierTypeUpOrDown.DOWN,BarrierTypeInOrOut.IN), 110, 95, 2.0576),
+    (PutOrCall.CALL, (BarrierTypeUpOrDown.UP,BarrierTypeInOrOut.IN), 100, 105, 8.4482),
+    (PutOrCall.PUT, (BarrierTypeUpOrDown.DOWN,BarrierTypeInOrOut.OUT), 110, 95, 2.6252),
+    (PutOrCall.PUT, (BarrierTypeUpOrDown.UP,BarrierTypeInOrOut.OUT), 100, 105, 5.4932),
+    (PutOrCall.PUT, (BarrierTypeUpOrDown.DOWN,BarrierTypeInOrOut.IN), 90, 95, 2.9586),
+    (PutOrCall.PUT, (BarrierTypeUpOrDown.UP,BarrierTypeInOrOut.IN), 110, 105, 7.0846),
+    (PutOrCall.PUT, (BarrierTypeUpOrDown.DOWN,BarrierTypeInOrOut.OUT), 100, 100, 3.0),
+))
+def test_gbm_barrier_trinomial_tree(put_or_call, barrier_type, strike, barrier, haug_price):
+    model = Model(
+        model_type = ModelType.GBM,
+        numerical_method = NumericalMethod.TREE,
+        risk_free_rate = 0.08,
+        yield_rate = 0.04,
+        sigma = 0.25 )
+    model.n_time_steps = 300
+
+    option = Option(
+        model=model,
+        option_type = OptionType.BARRIER,
+        put_or_call = put_or_call,
+        spot_value = 100,
+        strike = strike,
+        time_to_expiration = 0.5,
+        barrier = barrier,
+        barrier_type = barrier_type,
+        cash_rebate = 3 )
+    add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+    test_tree = option.price()
+    assert abs(test_tree-haug_price) < 5e-3
+
+
+# Verify the trinomial barrier tree stays accurate within its capped step count, with the barrier a fraction of a step
+#   from the spot, where a node layer on the barrier would need tens of thousands of time steps
+@pytest.mark.parametrize(('put_or_call', 'barrier_type', 'barrier'), (
+    (PutOrCall.CALL, (BarrierTypeUpOrDown.DOWN,BarrierTypeInOrOut.OUT), 99.9),
+    (PutOrCall.CALL, (BarrierTypeUpOrDown.DOWN,BarrierTypeInOrOut.IN), 99.9),
+    (PutOrCall.PUT, (BarrierTypeUpOrDown.UP,BarrierTypeInOrOut.OUT), 100.05),
+    (PutOrCall.PUT, (BarrierTypeUpOrDown.UP,BarrierTypeInOrOut.IN), 100.5),
+))
+def test_gbm_barrier_trinomial_tree_near_barrier(put_or_call, barrier_type, barrier, monkeypatch):
+    model = Model(
+        model_type = ModelType.GBM,
+        numerical_method = NumericalMethod.TREE,
+        risk_free_rate = 0.08,
+        yield_rate = 0.04,
+        sigma = 0.25 )
+    model.n_time_steps = 200
+
+    option = Option(
+        model=model,
+        option_type = OptionType.BARRIER,
+        put_or_call = put_or_call,
+        spot_value = 100,
+        strike = 100,
+        time_to_expiration = 0.5,
+        barrier = barrier,
+        barrier_type = barrier_type,
+        cash_rebate = 3 )
+    add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+    # Record the time steps of each tree, which the refinement cap bounds
+    tree_time_steps = []
+    trinomial_barrier_tree = gbm._trinomial_barrier_tree
+    def recorded_tree(*tree_inputs):
+        tree_time_steps.append(tree_inputs[10])
+        return trinomial_barrier_tree(*tree_inputs)
+    monkeypatch.setattr(gbm, '_trinomial_barrier_tree', recorded_tree)
+
+    test_tree = option.price()
+    assert 0 < len(tree_time_steps) <= 2
+    assert max(tree_time_steps) <= gbm._BARRIER_TREE_MAX_REFINEMENT * 200
+
+    model.numerical_method = NumericalMethod.CLOSED_FORM
+    assert abs(test_tree - option.price()) < 5e-3
+
+
+# Verify vectorized Reiner-Rubinstein against the single-contract closed form, over every barrier case,
+#   strikes on both sides of the barrier and spots already across it
+def test_gbm_barrier_closed_form_batch():
+    cases = [(put_or_call, up_or_down, in_or_out, strike, barrier, spot_price)
+        for put_or_call in PutOrCall
+        for up_or_down, barriers in ((BarrierTypeUpOrDown.DOWN, (95, 100)), (BarrierTypeUpOrDown.UP, (105, 100)))
+        for in_or_out in BarrierTypeInOrOut
+        for strike in (90, 100, 110)
+        for barrier in barriers
+        for spot_price in (100, 102)]
+    put_or_calls, up_or_downs, in_or_outs, strikes, barriers, spot_prices = zip(*cases)
+
+    test_batch = barrier_reiner_rubinstein_batch(spot_prices, strikes, barriers, 3, 0.5, 0.08, 0.04, 0.25, put_or_calls, up_or_downs, in_or_outs)
+
+    model = Model(
+        model_type = ModelType.GBM,
+        numerical_method = NumericalMethod.CLOSED_FORM,
+        risk_free_rate = 0.08,
+        yield_rate = 0.04,
+        sigma = 0.25 )
+    for idx, (put_or_call, up_or_down, in_or_out, strike, barrier, spot_price) in enumerate(cases):
+        option = Option(
+            model=model,
+            option_type = OptionType.BARRIER,
+            put_or_call = put_or_call,
+            spot_value = spot_price,
+            strike = strike,
+            time_to_expiration = 0.5,
+            barrier = barrier,
+            barrier_type = (up_or_down, in_or_out),
+            cash_rebate = 3 )
+        add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+        assert abs(test_batch[idx] - option.price()) < 1e-10
+
+
+# Verify the closed-form American approximations against a smoothed tree
+@pytest.mark.parametrize('american_approximation', AmericanApproximation)
+@pytest.mark.parametrize(('put_or_call', 'spot_price', 'strike', 'risk_free_rate', 'yield_rate', 'sigma', 'time_to_expiration'), (
+    (PutOrCall.CALL, 42, 40, 0.04, 0.08, 0.35, 0.75),
+    (PutOrCall.CALL, 100, 100, 0.0, 0.04, 0.2, 1),
+    (PutOrCall.CALL, 110, 100, 0.03, 0.0, 0.3, 2),
+    (PutOrCall.PUT, 100, 100, 0.08, 0.0, 0.3, 1),
+    (PutOrCall.PUT, 90, 100, 0.05, 0.02, 0.25, 0.5),
+))
+def test_gbm_amer_closed_form(american_approximation, put_or_call, spot_price, strike, risk_free_rate, yield_rate, sigma, time_to_expiration):
+    model = Model(
+        model_type = ModelType.GBM,
+        numerical_method = NumericalMethod.CLOSED_FORM,
+        risk_free_rate = risk_free_rate,
+        yield_rate = yield_rate,
+        sigma = sigma,
+        american_approximation = american_approximation )
+
+    option = Option(
+        model=model,
+        option_type = OptionType.AMERICAN,
+        put_or_call = put_or_call,
+        spot_value = spot_price,
+        strike = strike,
+        time_to_expiration = time_to_expiration )
+    add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+    test_closed_form = option.price()
+
+    model.numerical_method = NumericalMethod.TREE
+    model.tree_method = TreeMethod.BBSR
+    model.n_time_steps = 1000
+    test_tree = option.price()
+
+    assert abs(test_closed_form-test_tree)/test_tree < 2e-2
+
+    # Never worth less than the European option
+    test_euro = euro_black_scholes_merton_batch(spot_price, strike, time_to_expiration, risk_free_rate, yield_rate, sigma, put_or_call)
+    assert test_closed_form > test_euro - 1e-10
+
+
+# Verify the batch American approximations against the single-contract prices, including deep exercise-region contracts
+def test_gbm_amer_closed_form_batch():
+    cases = [(put_or_call, spot_price, yield_rate)
+        for put_or_call in PutOrCall
+        for spot_price in (60, 90, 100, 110, 160)
+        for yield_rate in (0.0, 0.03, 0.1)]
+    put_or_calls, spot_prices, yield_rates = zip(*cases)
+
+    for american_approximation, batch_method in (
+            (AmericanApproximation.BJERKSUND_STENSLAND, american_bjerksund_stensland_batch),
+            (AmericanApproximation.BARONE_ADESI_WHALEY, american_barone_adesi_whaley_batch)):
+        test_batch = batch_method(spot_prices, 100, 1, 0.06, yield_rates, 0.3, put_or_calls)
+
+        for idx, (put_or_call, spot_price, yield_rate) in enumerate(cases):
+            model = Model(
+                model_type = ModelType.GBM,
+                numerical_method = NumericalMethod.CLOSED_FORM,
+                risk_free_rate = 0.06,
+                yield_rate = yield_rate,
+                sigma = 0.3,
+                american_approximation = american_approximation )
+
+            option = Option(
+                model=model,
+                option_type = OptionType.AMERICAN,
+                put_or_call = put_or_call,
+                spot_value = spot_price,
+                strike = 100,
+                time_to_expiration = 1 )
+            add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+            test_price = option.price()
+            assert abs(test_batch[idx] - test_price) < 1e-10
+
+            # Never worth less than exercising now
+            exercise_value = spot_price - 100 if put_or_call == PutOrCall.CALL else 100 - spot_price
+            assert test_price > exercise_value - 1e-10
+
+
+# Central differences of a batch pricer in each of (spot_price, sigma, time_to_expiration, risk_free_rate, yield_rate)
+def _bumped_greeks(batch_method, spot_price, time_to_expiration, risk_free_rate, yield_rate, sigma):
+    bump = 1e-5
+    spot_bump = 1e-3 * spot_price
+    price = batch_method(spot_price, time_to_expiration, risk_free_rate, yield_rate, sigma)
+    return (
+        price,
+        (batch_method(spot_price + spot_bump, time_to_expiration, risk_free_rate, yield_rate, sigma)
+            - batch_method(spot_price - spot_bump, time_to_expiration, risk_free_rate, yield_rate, sigma)) / (2 * spot_bump),
+        (batch_method(spot_price + spot_bump, time_to_expiration, risk_free_rate, yield_rate, sigma) - 2 * price
+            + batch_method(spot_price - spot_bump, time_to_expiration, risk_free_rate, yield_rate, sigma)) / spot_bump**2,
+        (batch_method(spot_price, time_to_expiration, risk_free_rate, yield_rate, sigma + bump)
+            - batch_method(spot_price, time_to_expiration, risk_free_rate, yield_rate, sigma - bump)) / (2 * bump),
+        -(batch_method(spot_price, time_to_expiration + bump, risk_free_rate, yield_rate, sigma)
+            - batch_method(spot_price, time_to_expiration - bump, risk_free_rate, yield_rate, sigma)) / (2 * bump),
+        (batch_method(spot_price, time_to_expiration, risk_free_rate + bump, yield_rate, sigma)
+            - batch_method(spot_price, time_to_expiration, risk_free_rate - bump, yield_rate, sigma)) / (2 * bump),
+        (batch_method(spot_price, time_to_expiration, risk_free_rate, yield_rate + bump, sigma)
+            - batch_method(spot_price, time_to_expiration, risk_free_rate, yield_rate - bump, sigma)) / (2 * bump) )
+
+
+# Verify the analytic European Greeks against central differences of the price, and the scalar entry point
+@pytest.mark.parametrize('put_or_call', PutOrCall)
+def test_gbm_euro_closed_form_greeks(put_or_call):
+    spot_prices = numpy.array([70, 90, 100, 110, 140])
+    sigma = numpy.array([0.1, 0.2, 0.3, 0.4, 0.8])
+    test_greeks = euro_black_scholes_merton_greeks_batch(spot_prices, 100, 0.75, 0.05, 0.02, sigma, put_or_call)
+
+    bumped_greeks = _bumped_greeks(lambda spot_price, time_to_expiration, risk_free_rate, yield_rate, sigma:
+        euro_black_scholes_merton_batch(spot_price, 100, time_to_expiration, risk_free_rate, yield_rate, sigma, put_or_call),
+        spot_prices, 0.75, 0.05, 0.02, sigma)
+    for test_value, bumped_value in zip((test_greeks.price, test_greeks.delta, test_greeks.gamma, test_greeks.vega,
+            test_greeks.theta, test_greeks.rho, test_greeks.dividend_rho), bumped_greeks):
+        assert numpy.all(numpy.abs(test_value - bumped_value) < 1e-5)
+
+    model = Model(
+        model_type = ModelType.GBM,
+        numerical_method = NumericalMethod.CLOSED_FORM,
+        risk_free_rate = 0.05,
+        yield_rate = 0.02,
+        sigma = 0.2 )
+    option = Option(
+        model=model,
+        option_type = OptionType.EUROPEAN,
+        put_or_call = put_or_call,
+        spot_value = 90,
+        strike = 100,
+        time_to_expiration = 0.75 )
+    add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+    test_greeks = euro_black_scholes_merton_greeks(model, option)
+    assert abs(test_greeks.price - option.price()) < 1e-10
+    assert abs(test_greeks.delta - bumped_greeks[1][1]) < 1e-5
+
+
+# Verify the barrier Greeks against central differences of the price, including contracts already across the barrier
+def test_gbm_barrier_closed_form_greeks():
+    cases = [(put_or_call, up_or_down, in_or_out, strike, spot_price)
+        for put_or_call in PutOrCall
+        for up_or_down, spot_prices in ((BarrierTypeUpOrDown.DOWN, (93, 100)), (BarrierTypeUpOrDown.UP, (107, 100)))
+        for in_or_out in BarrierTypeInOrOut
+        for strike in (90, 100, 110)
+        for spot_price in spot_prices]
+    put_or_calls, up_or_downs, in_or_outs, strikes, spot_prices = (numpy.array(values) for values in zip(*cases))
+    barriers = numpy.where(up_or_downs == BarrierTypeUpOrDown.UP, 105, 95)
+
+    test_greeks = barrier_reiner_rubinstein_greeks_batch(spot_prices, strikes, barriers, 3, 0.5, 0.08, 0.04, 0.25, put_or_calls, up_or_downs, in_or_outs)
+
+    bumped_greeks = _bumped_greeks(lambda spot_price, time_to_expiration, risk_free_rate, yield_rate, sigma:
+        barrier_reiner_rubinstein_batch(spot_price, strikes, barriers, 3, time_to_expiration, risk_free_rate, yield_rate, sigma,
+            put_or_calls, up_or_downs, in_or_outs),
+        spot_prices.astype(float), 0.5, 0.08, 0.04, 0.25)
+    for test_value, bumped_value in zip((test_greeks.price, test_greeks.delta, test_greeks.gamma, test_greeks.vega,
+            test_greeks.theta, test_greeks.rho, test_greeks.dividend_rho), bumped_greeks):
+        assert numpy.all(numpy.abs(test_value - bumped_value) < 1e-5)
+
+    model = Model(
+        model_type = ModelType.GBM,
+        numerical_method = NumericalMethod.CLOSED_FORM,
+        risk_free_rate = 0.08,
+        yield_rate = 0.04,
+        sigma = 0.25 )
+    option = Option(
+        model=model,
+        option_type = OptionType.BARRIER,
+        put_or_call = PutOrCall.CALL,
+        spot_value = 100,
+        strike = 90,
+        time_to_expiration = 0.5,
+        barrier = 95,
+        barrier_type = (BarrierTypeUpOrDown.DOWN, BarrierTypeInOrOut.OUT),
+        cash_rebate = 3 )
+    add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+    test_greeks = barrier_reiner_rubinstein_greeks(model, option)
+    assert abs(test_greeks.price - option.price()) < 1e-10
+    assert isinstance(test_greeks.gamma, float)
+
+
+# Verify the Monte Carlo Greeks: pathwise for European options, likelihood ratio for barrier options
+@pytest.mark.parametrize('variance_reduction', (VarianceReduction.NONE, VarianceReduction.ANTITHETIC, VarianceReduction.CONTROL_VARIATE))
+@pytest.mark.parametrize('put_or_call', PutOrCall)
+def test_gbm_monte_carlo_greeks(variance_reduction, put_or_call):
+    model = Model(
+        model_type = ModelType.GBM,
+        numerical_method = NumericalMethod.MONTE_CARLO,
+        risk_free_rate = 0.05,
+        yield_rate = 0.02,
+        sigma = 0.25,
+        n_time_steps = 20,
+        n_paths = 100000,
+        seed = 2024,
+        variance_reduction = variance_reduction )
+
+    option = Option(
+        model=model,
+        option_type = OptionType.EUROPEAN,
+        put_or_call = put_or_call,
+        spot_value = 100,
+        strike = 100,
+        time_to_expiration = 1,
+        barrier = 20,
+        barrier_type = (BarrierTypeUpOrDown.DOWN, BarrierTypeInOrOut.OUT) )
+    add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+    assert monte_carlo_result(model, option).delta is None
+    analytic_greeks = euro_black_scholes_merton_greeks(model, option)
+
+    # A barrier that is never reached leaves the European Greeks, now through the likelihood ratio
+    for option_type in (OptionType.EUROPEAN, OptionType.BARRIER):
+        option.option_type = option_type
+        test_result = monte_carlo_result(model, option, greeks=True)
+        assert test_result.price == monte_carlo_result(model, option).price
+        assert abs(test_result.delta - analytic_greeks.delta) < 4 * test_result.delta_standard_error
+        assert abs(test_result.vega - analytic_greeks.vega) < 4 * test_result.vega_standard_error
+
+    # Pathwise estimates are far tighter where they apply
+    option.option_type = OptionType.EUROPEAN
+    assert monte_carlo_result(model, option, greeks=True).delta_standard_error < test_result.delta_standard_error / 4
+
+
+# Verify likelihood ratio Greeks of a live barrier against bumping and repricing on common random numbers
+def test_gbm_barrier_monte_carlo_greeks():
+    model = Model(
+        model_type = ModelType.GBM,
+        numerical_method = NumericalMethod.MONTE_CARLO,
+        risk_free_rate = 0.05,
+        yield_rate = 0.02,
+        sigma = 0.25,
+        n_time_steps = 20,
+        n_paths = 200000,
+        seed = 7 )
+
+    option = Option(
+        model=model,
+        option_type = OptionType.BARRIER,
+        put_or_call = PutOrCall.CALL,
+        spot_value = 100,
+        strike = 100,
+        time_to_expiration = 1,
+        barrier = 90,
+        barrier_type = (BarrierTypeUpOrDown.DOWN, BarrierTypeInOrOut.OUT) )
+    add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
 
+    test_result = monte_carlo_result(model, option, greeks=True)
+    model.seed = 99
+    bumped_greeks = bump_and_reprice_greeks(model, option, spot_bump=0.02, sigma_bump=0.01)
+    assert abs(test_result.delta - bumped_greeks.delta) < 4 * test_result.delta_standard_error
+    assert abs(test_result.vega - bumped_greeks.vega) < 4 * test_result.vega_standard_error
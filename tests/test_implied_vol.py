@@ -0,0 +1,118 @@
+import pytest, numpy
+from model import AmericanApproximation, TreeMethod
+from option_enum import OptionType, PutOrCall, BarrierTypeUpOrDown, BarrierTypeInOrOut
+from gbm import euro_black_scholes_merton_batch, american_bjerksund_stensland_batch, american_barone_adesi_whaley_batch, \
+    gbm_binomial_tree_batch, barrier_reiner_rubinstein_batch
+from implied_vol import implied_vol_black_scholes_merton, implied_vol_american, implied_vol_barrier
+
+
+# Verify the European solver recovers the volatilities of a whole chain, in and out of the money
+def test_implied_vol_black_scholes_merton():
+    strikes = numpy.linspace(60, 160, 21)
+    sigma = numpy.array([0.05, 0.2, 0.6, 1.5])[:, None, None]
+    put_or_call = numpy.array([PutOrCall.PUT, PutOrCall.CALL])[:, None]
+    option_prices = euro_black_scholes_merton_batch(100, strikes, 0.75, 0.05, 0.02, sigma, put_or_call)
+
+    test_result = implied_vol_black_scholes_merton(option_prices, 100, strikes, 0.75, 0.05, 0.02, put_or_call)
+
+    # Prices within rounding of the intrinsic value carry no volatility information; any that are reported as
+    #   converged still hold their volatility to the tolerance
+    intrinsic = numpy.abs(100*numpy.exp(-0.02*0.75) - strikes*numpy.exp(-0.05*0.75))
+    informative = option_prices - intrinsic > 1e-5
+    assert test_result.sigma.shape == option_prices.shape
+    assert numpy.all(test_result.converged[informative])
+    assert numpy.all(numpy.abs(test_result.sigma - sigma)[informative] < 1e-8)
+    assert numpy.all((numpy.abs(test_result.sigma - sigma) < 1e-9 * sigma)[test_result.converged])
+    assert numpy.max(test_result.n_iterations) < 20
+
+
+# Verify prices outside the no-arbitrage bounds are flagged rather than solved
+def test_implied_vol_black_scholes_merton_bounds():
+    option_prices = [0.0, 1.0, 99.0, 200.0]
+    test_result = implied_vol_black_scholes_merton(option_prices, 100, 100, 1, 0.05, 0.0, [PutOrCall.CALL, PutOrCall.CALL, PutOrCall.PUT, PutOrCall.CALL])
+
+    assert list(test_result.converged) == [False, False, False, False]
+    assert numpy.all(numpy.isnan(test_result.sigma))
+
+    test_result = implied_vol_black_scholes_merton(10.0, 100, 100, 1, 0.05, 0.0, PutOrCall.CALL)
+    assert test_result.converged
+    assert abs(euro_black_scholes_merton_batch(100, 100, 1, 0.05, 0.0, test_result.sigma, PutOrCall.CALL) - 10.0) < 1e-10
+
+
+# Verify the American solver inverts the closed-form approximations and the tree
+@pytest.mark.parametrize('put_or_call', PutOrCall)
+def test_implied_vol_american(put_or_call):
+    strikes = numpy.array([80, 90, 100, 110, 120])
+    sigma = numpy.array([0.15, 0.25, 0.35, 0.45, 0.55])
+
+    for american_approximation, batch_method in (
+            (AmericanApproximation.BJERKSUND_STENSLAND, american_bjerksund_stensland_batch),
+            (AmericanApproximation.BARONE_ADESI_WHALEY, american_barone_adesi_whaley_batch)):
+        option_prices = batch_method(100, strikes, 1, 0.06, 0.03, sigma, put_or_call)
+        test_result = implied_vol_american(option_prices, 100, strikes, 1, 0.06, 0.03, put_or_call, american_approximation)
+        assert numpy.all(test_result.converged)
+        assert numpy.all(numpy.abs(test_result.sigma - sigma) < 1e-6)
+
+    option_prices = gbm_binomial_tree_batch(100, strikes, 1, 0.06, 0.03, sigma, put_or_call, OptionType.AMERICAN, 200, TreeMethod.BBSR)
+    test_result = implied_vol_american(option_prices, 100, strikes, 1, 0.06, 0.03, put_or_call, n_time_steps=200)
+    assert numpy.all(test_result.converged)
+    assert numpy.all(numpy.abs(test_result.sigma - sigma) < 1e-6)
+
+    # Quotes at or below the exercise value carry no volatility
+    exercise_value = 20.0
+    strike = 120 if put_or_call == PutOrCall.PUT else 80
+    for n_time_steps in (None, 200):
+        test_result = implied_vol_american([exercise_value, exercise_value - 1], 100, strike, 1, 0.06, 0.03, put_or_call, n_time_steps=n_time_steps)
+        assert not numpy.any(test_result.converged)
+        assert numpy.all(numpy.isnan(test_result.sigma))
+
+    # Deep in the money with the carry favouring waiting, the zero-volatility value (exercise at expiration) is above
+    #   the exercise value; quotes above it still solve, and quotes at it carry no volatility
+    if put_or_call == PutOrCall.CALL:
+        spot_price, risk_free_rate, yield_rate = 75, 0.037, 0.013
+    else:
+        spot_price, risk_free_rate, yield_rate = 60, 0.013, 0.037
+    zero_vol_value = abs(spot_price*numpy.exp(-yield_rate*0.24) - 66.8*numpy.exp(-risk_free_rate*0.24))
+    assert zero_vol_value > abs(spot_price - 66.8)
+    option_price = american_bjerksund_stensland_batch(spot_price, 66.8, 0.24, risk_free_rate, yield_rate, 0.126, put_or_call)
+    test_result = implied_vol_american([option_price, zero_vol_value], spot_price, 66.8, 0.24, risk_free_rate, yield_rate, put_or_call)
+    assert list(test_result.converged) == [True, False]
+    assert abs(test_result.sigma[0] - 0.126) < 1e-6
+
+
+# Verify the barrier solver inverts the closed form, and flags prices with no root in the bracket
+def test_implied_vol_barrier():
+    strikes = numpy.array([90, 100, 110, 100])
+    sigma = numpy.array([0.1, 0.2, 0.3, 0.5])
+    option_prices = barrier_reiner_rubinstein_batch(100, strikes, 95, 0, 1, 0.05, 0.02, sigma,
+        PutOrCall.CALL, BarrierTypeUpOrDown.DOWN, BarrierTypeInOrOut.IN)
+
+    test_result = implied_vol_barrier(option_prices, 100, strikes, 95, 0, 1, 0.05, 0.02,
+        PutOrCall.CALL, BarrierTypeUpOrDown.DOWN, BarrierTypeInOrOut.IN)
+    assert numpy.all(test_result.converged)
+    assert numpy.all(numpy.abs(test_result.sigma - sigma) < 1e-6)
+
+    test_result = implied_vol_barrier(option_prices * 50, 100, strikes, 95, 0, 1, 0.05, 0.02,
+        PutOrCall.CALL, BarrierTypeUpOrDown.DOWN, BarrierTypeInOrOut.IN)
+    assert not numpy.any(test_result.converged)
+    assert numpy.all(numpy.isnan(test_result.sigma))
+
+
+# Verify the default bracket holds for barriers on either side and either sign of the carry, where the powers of
+#   the barrier ratio in the closed form overflow at the lower bracket
+@pytest.mark.parametrize(('put_or_call', 'up_or_down', 'in_or_out', 'barrier'), (
+    (PutOrCall.CALL, BarrierTypeUpOrDown.UP, BarrierTypeInOrOut.IN, 110),
+    (PutOrCall.PUT, BarrierTypeUpOrDown.UP, BarrierTypeInOrOut.IN, 110),
+    (PutOrCall.PUT, BarrierTypeUpOrDown.UP, BarrierTypeInOrOut.OUT, 110),
+    (PutOrCall.CALL, BarrierTypeUpOrDown.DOWN, BarrierTypeInOrOut.IN, 90),
+    (PutOrCall.PUT, BarrierTypeUpOrDown.DOWN, BarrierTypeInOrOut.IN, 90),
+    (PutOrCall.CALL, BarrierTypeUpOrDown.DOWN, BarrierTypeInOrOut.OUT, 90),
+))
+@pytest.mark.parametrize('yield_rate', (0.02, 0.08))
+def test_implied_vol_barrier_carry(put_or_call, up_or_down, in_or_out, barrier, yield_rate):
+    sigma = numpy.array([0.15, 0.25, 0.4])
+    option_prices = barrier_reiner_rubinstein_batch(100, 100, barrier, 0, 1, 0.05, yield_rate, sigma, put_or_call, up_or_down, in_or_out)
+
+    test_result = implied_vol_barrier(option_prices, 100, 100, barrier, 0, 1, 0.05, yield_rate, put_or_call, up_or_down, in_or_out)
+    assert numpy.all(test_result.converged)
+    assert numpy.all(numpy.abs(test_result.sigma - sigma) < 1e-6)
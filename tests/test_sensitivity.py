@@ -0,0 +1,81 @@
+import pytest
+from model import Model, ModelType, NumericalMethod, TreeMethod
+from option_enum import OptionType, PutOrCall
+from option import Option
+from option_util import add_all_evaluation_methods
+from gbm import euro_black_scholes_merton_greeks
+from sensitivity import bump_and_reprice_greeks
+
+
+def _greeks_tuple(greeks):
+    return (greeks.price, greeks.delta, greeks.gamma, greeks.vega, greeks.theta, greeks.rho, greeks.dividend_rho)
+
+
+# Verify the bumped Greeks of each numerical method against the analytic European Greeks, without touching the inputs
+@pytest.mark.parametrize(('numerical_method', 'tolerances'), (
+    (NumericalMethod.CLOSED_FORM, (1e-10, 1e-3, 1e-4, 1e-2, 1e-2, 1e-2, 1e-2)),
+    (NumericalMethod.TREE, (1e-2, 1e-2, 1e-3, 0.2, 0.1, 0.2, 0.2)),
+    (NumericalMethod.PDE, (5e-2, 1e-2, 1e-3, 0.5, 0.1, 0.2, 0.2)),
+))
+def test_bump_and_reprice_greeks(numerical_method, tolerances):
+    model = Model(
+        model_type = ModelType.GBM,
+        numerical_method = numerical_method,
+        risk_free_rate = 0.05,
+        yield_rate = 0.02,
+        sigma = 0.25,
+        n_time_steps = 500,
+        tree_method = TreeMethod.BBSR )
+    model.n_price_steps = 501
+
+    option = Option(
+        model=model,
+        option_type = OptionType.EUROPEAN,
+        put_or_call = PutOrCall.PUT,
+        spot_value = 100,
+        strike = 105,
+        time_to_expiration = 0.75 )
+    add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+    # The lattices move with the spot, so a wider spot bump keeps their grid noise out of gamma
+    test_greeks = bump_and_reprice_greeks(model, option, spot_bump=0.03)
+    analytic_greeks = euro_black_scholes_merton_greeks(model, option)
+    for test_value, analytic_value, tolerance in zip(_greeks_tuple(test_greeks), _greeks_tuple(analytic_greeks), tolerances):
+        assert abs(test_value - analytic_value) < tolerance
+
+    assert option.spot_value == 100 and option.time_to_expiration == 0.75
+    assert model.sigma == 0.25 and model.risk_free_rate == 0.05 and model.yield_rate == 0.02
+
+
+# Verify Monte Carlo bumps share their draws: the Greeks are stable, reproducible, and the same from a process pool
+def test_bump_and_reprice_greeks_monte_carlo():
+    model = Model(
+        model_type = ModelType.GBM,
+        numerical_method = NumericalMethod.MONTE_CARLO,
+        risk_free_rate = 0.05,
+        yield_rate = 0.02,
+        sigma = 0.25,
+        n_time_steps = 1,
+        n_paths = 100000 )
+
+    option = Option(
+        model=model,
+        option_type = OptionType.EUROPEAN,
+        put_or_call = PutOrCall.CALL,
+        spot_value = 100,
+        strike = 100,
+        time_to_expiration = 1 )
+    add_all_evaluation_methods(option) # always do this (or create your own eval methods and add them)
+
+    # With independent draws per bump the noise would be about 0.03 in delta and 0.1 in gamma, several times gamma itself
+    test_greeks = bump_and_reprice_greeks(model, option)
+    analytic_greeks = euro_black_scholes_merton_greeks(model, option)
+    assert model.seed is None
+    assert abs(test_greeks.delta - analytic_greeks.delta) < 1e-2
+    assert abs(test_greeks.gamma - analytic_greeks.gamma) < 2e-3
+    assert abs(test_greeks.vega - analytic_greeks.vega) < 1.0
+
+    model.seed = 1234
+    serial_greeks = bump_and_reprice_greeks(model, option)
+    pool_greeks = bump_and_reprice_greeks(model, option, n_workers=3)
+    assert _greeks_tuple(serial_greeks) == _greeks_tuple(pool_greeks)
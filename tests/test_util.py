@@ -1,6 +1,7 @@
 import pytest
 import numpy
-from util import tridiag_solve
+from util import tridiag_solve, TridiagonalSolver, ProjectedTridiagonalSolver, enum_mask, brownian_bridge
+from option_enum import PutOrCall
 
 
 # Test tridiag_solve
@@ -24,3 +25,70 @@ def test_util_tridiag_solve():
             sum += c[i] * x[i+1]
         assert abs(sum - d[i]) < 1e-8
 
+
+
+
+# Test TridiagonalSolver, factored once and reused for several right-hand sides at once
+def test_util_tridiagonal_solver():
+    n = 6
+    rng = numpy.random.default_rng(12345)
+    a = rng.uniform(-1, 1, n) # index 0 is ignored
+    b = rng.uniform(3, 4, n)
+    c = rng.uniform(-1, 1, n-1)
+    matrix = numpy.diag(b) + numpy.diag(a[1:], -1) + numpy.diag(c, 1)
+    solver = TridiagonalSolver(a, b, c)
+
+    d = rng.standard_normal((n, 3))
+    x = solver.solve(d)
+    assert numpy.abs(matrix @ x - d).max() < 1e-12
+    for col_idx in range(3):
+        assert numpy.abs(solver.solve(d[:, col_idx]) - x[:, col_idx]).max() < 1e-12
+
+
+# Test ProjectedTridiagonalSolver against a sequential Brennan-Schwartz sweep, with the exercise region at the top
+#   of the first column and at the bottom of the second
+def test_util_projected_tridiagonal_solver():
+    n = 40
+    a = numpy.full(n, -0.8) # index 0 is ignored
+    b = numpy.full(n, 2.6)
+    c = numpy.full(n-1, -0.7)
+    S = numpy.linspace(0.5, 1.5, n)
+    floor = numpy.column_stack((numpy.maximum(S - 1, 0), numpy.maximum(1 - S, 0)))
+    d = 0.9 * floor + 0.02
+    solver = ProjectedTridiagonalSolver(a, b, c)
+    x = solver.project(solver.solve(d), floor, numpy.array([True, False]))
+
+    for col_idx, (a_sweep, b_sweep, c_sweep, rows) in enumerate(((a, b, c, slice(None)), (numpy.append(0, c[::-1]), b[::-1], a[:0:-1], slice(None, None, -1)))):
+        d_sweep = d[rows, col_idx].copy()
+        floor_sweep = floor[rows, col_idx]
+        u = b_sweep.copy()
+        for i in range(1, n):
+            m = a_sweep[i] / u[i-1]
+            u[i] -= m * c_sweep[i-1]
+            d_sweep[i] -= m * d_sweep[i-1]
+        expected = numpy.empty(n)
+        expected[-1] = max(d_sweep[-1] / u[-1], floor_sweep[-1])
+        for i in range(n-2, -1, -1):
+            expected[i] = max((d_sweep[i] - c_sweep[i] * expected[i+1]) / u[i], floor_sweep[i])
+        assert numpy.sum(expected == floor_sweep) > 10
+        assert numpy.abs(x[rows, col_idx] - expected).max() < 1e-12
+
+
+# Test enum_mask
+def test_util_enum_mask():
+    expected = numpy.array([False, True, True])
+    assert numpy.array_equal(enum_mask([PutOrCall.PUT, PutOrCall.CALL, PutOrCall.CALL], PutOrCall.CALL), expected)
+    assert numpy.array_equal(enum_mask(numpy.array([0, 1, 1]), PutOrCall.CALL), expected)
+    assert numpy.array_equal(enum_mask(numpy.array([False, True, True]), PutOrCall.CALL), expected)
+    assert enum_mask(PutOrCall.PUT, PutOrCall.CALL) == False
+
+
+# Test brownian_bridge
+def test_util_brownian_bridge():
+    normals = numpy.random.default_rng(12345).standard_normal((100000, 7))
+    increments = brownian_bridge(normals)
+
+    # The increments are independent standard normals and the first draw sets the end point
+    assert increments.shape == normals.shape
+    assert numpy.allclose(increments.sum(axis=1), numpy.sqrt(7) * normals[:, 0])
+    assert numpy.abs(numpy.cov(increments.T) - numpy.eye(7)).max() < 0.02
@@ -1,27 +1,258 @@
 import numpy
+from enum import Enum
+from math import sqrt
+from collections import deque
+from scipy.linalg.lapack import dgttrf, dgttrs
+from scipy.special import ndtr
+from scipy.interpolate import CubicSpline
 
 
-# Thomas's algorithm for solving M * x = d, where M is a tridiagonal matrix
+# Relative tolerance for a value to count as on the floor in ProjectedTridiagonalSolver
+_PROJECTION_TOLERANCE = 1e-12
+
+# Gauss-Legendre rule for bivariate_normal_cdf, exact to double precision while |rho| < 0.925 (Genz 2004)
+_BIVARIATE_NODES, _BIVARIATE_WEIGHTS = numpy.polynomial.legendre.leggauss(20)
+
+
+# Tridiagonal solver for M * x = d, where M is a tridiagonal matrix
+# M is factored once (LAPACK gttrf), and each solve only does the forward/back substitution (LAPACK gttrs),
+#   so one factorization can be reused across time steps and right-hand sides
 # a is indexed 1 to n-1 (ignoring index zero)
 # b is indexed 0 to n-1
-# c is indexed 1 to n-2 (ignoring index n-1)
+# c is indexed 0 to n-2
+# d is a vector, or a matrix with one right-hand side per column
+class TridiagonalSolver:
+    def __init__(self, a, b, c):
+        n = len(b)
+        a = numpy.asarray(a, dtype=float)
+        b = numpy.asarray(b, dtype=float)
+        c = numpy.asarray(c, dtype=float)
+        self._dl, self._d, self._du, self._du2, self._ipiv, info = dgttrf(a[1:n], b, c[:n-1])
+        assert info == 0, f'Error: in TridiagonalSolver, factorization failed with info={info}.'
+
+    # With overwrite=True, a Fortran-ordered float d may be overwritten with the solution to avoid a copy
+    def solve(self, d, overwrite=False):
+        x, info = dgttrs(self._dl, self._d, self._du, self._du2, self._ipiv, numpy.asarray(d, dtype=float), overwrite_b=overwrite)
+        assert info == 0, f'Error: in TridiagonalSolver, solve failed with info={info}.'
+        return x
+
+
+# Tridiagonal solver for the linear complementarity problem M * x >= d, x >= floor, with equality in one of them
+#   in every row, as in early exercise
+# Brennan-Schwartz: eliminate away from the exercise region, then substitute towards it while projecting onto the floor
+#   The exercise region is assumed to be one block of rows at the top (upper=True) or bottom (upper=False) of each column
+# The projected substitution is vectorized: the unconstrained solution z gives each row's candidate value with the
+#   next row on the floor, the trailing run of rows at or under the floor is the exercise region, and the rows
+#   below it are z plus the homogeneous solution scaled to meet the floor at the region's first row
+# The interior entries of c (for upper) and a (for not upper) must be nonzero
+class ProjectedTridiagonalSolver(TridiagonalSolver):
+    def __init__(self, a, b, c):
+        super().__init__(a, b, c)
+        n = len(b)
+        a = numpy.asarray(a, dtype=float)
+        b = numpy.asarray(b, dtype=float)
+        c = numpy.asarray(c, dtype=float)
+        flipped_a = numpy.zeros(n)
+        flipped_a[1:] = c[n-2::-1]
+        self._upper_sweep = self._sweep(a, b, c[:n-1])
+        self._lower_sweep = self._sweep(flipped_a, b[::-1], a[n-1:0:-1])
+
+    # Unpivoted elimination from row zero, leaving U * x = d' with U upper bidiagonal
+    # Returns c / diag(U), and log |.| and sign of the products of -c / diag(U) from each row to the end
+    @staticmethod
+    def _sweep(a, b, c):
+        n = len(b)
+        u = numpy.empty(n)
+        u[0] = b[0]
+        for idx in range(1, n):
+            u[idx] = b[idx] - a[idx] * c[idx-1] / u[idx-1]
+        ratio = c / u[:n-1]
+        with numpy.errstate(divide='ignore'):
+            log_tail = numpy.append(numpy.cumsum(numpy.log(numpy.abs(ratio))[::-1])[::-1], 0)
+        sign_tail = numpy.append(numpy.cumprod(numpy.sign(-ratio)[::-1])[::-1], 1)
+        return ratio, log_tail, sign_tail
+
+    # Project the unconstrained solutions x = solve(d) onto the floor (both n x m), with upper a boolean per column
+    def project(self, x, floor, upper):
+        projected = numpy.array(x, dtype=float)
+        for columns, sweep, flip in ((numpy.flatnonzero(upper), self._upper_sweep, False),
+                                      (numpy.flatnonzero(~numpy.asarray(upper)), self._lower_sweep, True)):
+            if len(columns) == 0:
+                continue
+            rows = slice(None, None, -1) if flip else slice(None)
+            projected[rows, columns] = self._project(projected[rows, columns], floor[rows, columns], *sweep)
+        return projected
+
+    @staticmethod
+    def _project(x, floor, ratio, log_tail, sign_tail):
+        n = len(x)
+        candidate = x.copy()
+        candidate[:-1] += ratio[:, numpy.newaxis] * (x[1:] - floor[1:])
+        # Rows within rounding of the floor count as exercised, so rounding cannot split the exercise region
+        at_floor = candidate <= floor + _PROJECTION_TOLERANCE * (1 + numpy.abs(floor))
+        exercised = numpy.logical_and.accumulate(at_floor[::-1], axis=0)[::-1]
+        first_exercised = n - exercised.sum(axis=0)
+
+        columns = numpy.flatnonzero(first_exercised < n)
+        first = first_exercised[columns]
+        excess = floor[first, columns] - x[first, columns]
+        homogeneous = sign_tail[:, numpy.newaxis] * sign_tail[first] * numpy.exp(numpy.minimum(log_tail[:, numpy.newaxis] - log_tail[first], 0))
+        x[:, columns] = numpy.where(exercised[:, columns], floor[:, columns], x[:, columns] + excess * homogeneous)
+        return numpy.maximum(x, floor)
+
+
+# Solve M * x = d once, where M is a tridiagonal matrix (see TridiagonalSolver for indexing)
 def tridiag_solve(a, b, c, d):
-    n = len(b)
-    c_prime = numpy.zeros(n)
-    d_prime = numpy.zeros(n)
-    x = numpy.zeros(n)
+    return TridiagonalSolver(a, b, c).solve(d)
+
+
+# Option values across a ladder of spot values at time zero, from a single grid or tree solve
+# spots must be increasing, with spots[spot_idx] the current spot value
+# delta and gamma are read from the three nodes around the spot; theta is the change in value per unit of
+#   calendar time, supplied by the solver
+class GridResult:
+    def __init__(self, spots: numpy.ndarray, values: numpy.ndarray, spot_idx: int, theta: float):
+        assert 0 < spot_idx < len(spots) - 1, f'Error: in GridResult, spot_idx={spot_idx} should be an interior node.'
+        self._spots = spots
+        self._values = values
+        self._spot_idx = spot_idx
+        self._theta = theta
+        self._spline = None
+
+        # Three-point differences on a (possibly non-uniform) grid
+        h_dn = spots[spot_idx] - spots[spot_idx-1]
+        h_up = spots[spot_idx+1] - spots[spot_idx]
+        v_dn, v_mid, v_up = values[spot_idx-1:spot_idx+2]
+        self._delta = (h_dn * h_dn * (v_up - v_mid) + h_up * h_up * (v_mid - v_dn)) / (h_dn * h_up * (h_dn + h_up))
+        self._gamma = 2 * (h_dn * (v_up - v_mid) - h_up * (v_mid - v_dn)) / (h_dn * h_up * (h_dn + h_up))
+
+    @property
+    def spots(self):
+        return self._spots
+
+    @property
+    def values(self):
+        return self._values
+
+    @property
+    def price(self):
+        return self._values[self._spot_idx]
+
+    @property
+    def delta(self):
+        return self._delta
+
+    @property
+    def gamma(self):
+        return self._gamma
+
+    @property
+    def theta(self):
+        return self._theta
+
+    # Option values at any spot values inside the ladder, by cubic spline interpolation
+    def price_at(self, spots):
+        spots = numpy.asarray(spots, dtype=float)
+        assert numpy.all(spots >= self._spots[0]) and numpy.all(spots <= self._spots[-1]), 'Error: in GridResult, spots should lie inside the grid.'
+        if self._spline is None:
+            self._spline = CubicSpline(self._spots, self._values)
+        return self._spline(spots)
+
+
+# Price and sensitivities of one option, or arrays of them, from a closed-form engine
+# theta is the change in value per unit of calendar time (as in GridResult); vega, rho and dividend_rho are the
+#   derivatives with respect to sigma, risk_free_rate and yield_rate
+class GreeksResult:
+    def __init__(self, price, delta, gamma, vega, theta, rho, dividend_rho):
+        self._price = price
+        self._delta = delta
+        self._gamma = gamma
+        self._vega = vega
+        self._theta = theta
+        self._rho = rho
+        self._dividend_rho = dividend_rho
+
+    @property
+    def price(self):
+        return self._price
+
+    @property
+    def delta(self):
+        return self._delta
+
+    @property
+    def gamma(self):
+        return self._gamma
+
+    @property
+    def vega(self):
+        return self._vega
+
+    @property
+    def theta(self):
+        return self._theta
+
+    @property
+    def rho(self):
+        return self._rho
+
+    @property
+    def dividend_rho(self):
+        return self._dividend_rho
+
+
+# Boolean mask of where enum_values equals member
+# enum_values may be a single enum member, an array-like of members, or an array-like of member values
+def enum_mask(enum_values, member):
+    if isinstance(enum_values, Enum):
+        return numpy.asarray(enum_values == member)
+    enum_values = numpy.asarray(enum_values)
+    if enum_values.dtype == object:
+        mask = [value == member or value == member.value for value in enum_values.flat]
+        return numpy.array(mask, dtype=bool).reshape(enum_values.shape)
+    return enum_values == member.value
+
+
+# Brownian bridge construction of standard normal increments over equal time steps
+# normals is paths by time steps; column 0 sets the end point of each path and later columns fill in
+#   midpoints breadth-first, so the first columns carry most of the path variance
+def brownian_bridge(normals):
+    n_paths, n_time_steps = normals.shape
+    path = numpy.zeros((n_paths, n_time_steps+1))
+    path[:, n_time_steps] = sqrt(n_time_steps) * normals[:, 0]
+
+    draw_idx = 1
+    intervals = deque([(0, n_time_steps)])
+    while intervals:
+        left, right = intervals.popleft()
+        if right - left < 2:
+            continue
+        mid = (left + right) // 2
+        left_weight = (right - mid) / (right - left)
+        right_weight = (mid - left) / (right - left)
+        std_dev = sqrt((mid - left) * (right - mid) / (right - left))
+        path[:, mid] = left_weight * path[:, left] + right_weight * path[:, right] + std_dev * normals[:, draw_idx]
+        draw_idx += 1
+        intervals.append((left, mid))
+        intervals.append((mid, right))
+
+    return numpy.diff(path, axis=1)
 
-    c_prime[0] = c[0] / b[0]
-    d_prime[0] = d[0] / b[0]
-    for i in range(1, n):
-        denom = b[i] - a[i] * c_prime[i-1]
-        if i < n-1:
-            c_prime[i] = c[i] / denom
-        d_prime[i] = (d[i] - a[i] * d_prime[i-1]) / denom
 
-    x[n-1] = d_prime[n-1]
-    for i in range(n-2, -1, -1):
-        x[i] = d_prime[i] - c_prime[i] * x[i+1]
+# Standard bivariate normal cumulative distribution P(X < h, Y < k) with correlation rho, for arrays that broadcast
+# Integrates Plackett's identity over the angle asin(rho) with a 20-point Gauss-Legendre rule (Genz 2004),
+#   which is accurate to double precision for |rho| < 0.925
+def bivariate_normal_cdf(h, k, rho):
+    h = numpy.asarray(h, dtype=float)
+    k = numpy.asarray(k, dtype=float)
+    rho = numpy.asarray(rho, dtype=float)
+    assert numpy.all(numpy.abs(rho) < 0.925), 'Error: in bivariate_normal_cdf, |rho| should be below 0.925.'
 
-    return x
+    # The quadrature nodes depend only on rho, so a scalar rho shares one set across every (h, k)
+    half_sum_squares = (h*h + k*k) / 2
+    angle = numpy.arcsin(rho)
+    sin_nodes = numpy.sin(numpy.multiply.outer(angle, (_BIVARIATE_NODES + 1) / 2))
+    exponent = ((h*k)[..., None]*sin_nodes - half_sum_squares[..., None]) / (1 - sin_nodes*sin_nodes)
+    integral = angle / (4*numpy.pi) * (numpy.exp(exponent) @ _BIVARIATE_WEIGHTS)
 
+    return integral + ndtr(h) * ndtr(k)